@@ -0,0 +1,352 @@
+"""Benchmark de extremo a extremo de las descargas de DUKATOR, sin red.
+
+Levanta los sustitutos locales de stand_ins.py (MusicBrainz, Cover Art
+Archive y un origen de audio) y ejecuta los caminos reales de descarga
+(download_album_tracks, download_bulk y download_single_song) sin ventana:
+la aplicacion se construye con setup_services() y la carrera de fuentes
+solo conoce un resolvedor 'origin' que apunta al origen local.
+
+Cada escenario corre en un proceso propio (cache vacia y pico de memoria
+aislado) y se mide: pistas/minuto, MB/s servidos por el origen, segundos
+de CPU por pista (incluido FFmpeg) y pico de RSS del proceso. El
+resultado se guarda en JSON para comparar versiones con --compare. Solo
+Linux/macOS (usa resource).
+
+Uso:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --tracks 20 --seconds 240 --repeat 3
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/anterior.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stand_ins import BENCH_ALBUM, BENCH_ARTIST, StandInServer, make_fixtures  # noqa: E402
+
+SCENARIOS = ('album', 'bulk', 'single')
+RESULT_MARKER = "BENCH_RESULT "
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.opus', '.ogg', '.flac', '.wav', '.aac')
+# Metricas que se comparan entre versiones (True = mas es mejor)
+COMPARED_METRICS = {
+    'tracks_per_min': True,
+    'mb_per_s': True,
+    'cpu_s_per_track': False,
+    'peak_rss_mb': False,
+    'wall_s': False,
+}
+
+
+class NullWidget:
+    """Sustituto de widgets y variables de Tk: get() devuelve value y el resto no hace nada"""
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class NullBus:
+    """UIEventBus sin ventana: los repintados se descartan"""
+
+    def post(self, key, fn):
+        pass
+
+    def call(self, fn):
+        pass
+
+
+def build_app(dukator, app_dir, server_url, tracks):
+    """DUKATOR sin Tk, con la carrera de fuentes limitada al origen local"""
+    media = {t['title']: t for t in tracks}
+
+    def resolve_origin(track):
+        fixture = media.get(track.get('title'))
+        if fixture is None:
+            return []
+        return [{
+            'url': f"{server_url}/media/{fixture['file']}",
+            'title': f"{track.get('artist', '')} - {fixture['title']}",
+            'uploader': track.get('artist', ''),
+            'duration': fixture['length'] / 1000,
+        }]
+
+    app = dukator.DUKATOR.__new__(dukator.DUKATOR)
+    app.ui = NullBus()
+    app.root = NullWidget()
+    app.setup_services(app_dir)
+    app.quality_var = NullWidget(app.quality)
+    app.progress_overlay = NullWidget()
+    app.candidate_resolvers = {'origin': resolve_origin}
+    app.race_sources = ('origin',)
+    return app
+
+
+def audio_outputs(folder):
+    files = []
+    for dirpath, _, names in os.walk(folder):
+        files.extend(os.path.join(dirpath, n) for n in names if n.lower().endswith(AUDIO_EXTENSIONS))
+    return files
+
+
+def usage():
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss: KB en Linux, bytes en macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'cpu': me.ru_utime + me.ru_stime + children.ru_utime + children.ru_stime,
+        'rss_mb': me.ru_maxrss / scale,
+    }
+
+
+def run_worker(args):
+    """Proceso hijo: un escenario con una instalacion de DUKATOR recien creada"""
+    tracks = json.loads(args.tracks_json)
+    app_dir = tempfile.mkdtemp(prefix=f"{args.worker}-", dir=args.work_dir)
+    download_path = os.path.join(app_dir, "downloads")
+    with open(os.path.join(app_dir, "dukator_config.json"), 'w') as f:
+        json.dump({
+            'download_path': download_path,
+            'quality': args.quality,
+            'output_format': args.format,
+            'source_mode': 'race',
+            'album_workers': args.album_workers,
+        }, f)
+
+    sys.path.insert(0, REPO_DIR)
+    import dukator
+
+    app = build_app(dukator, app_dir, args.server, tracks)
+    before = usage()
+    start = time.perf_counter()
+
+    if args.worker == 'album':
+        # Lo mismo que load_tracks + "Descargar seleccionadas" en la interfaz
+        with app.metrics.stage('musicbrainz_search', 'MusicBrainz'):
+            found = app.musicbrainz.search_releases(f"{BENCH_ARTIST} {BENCH_ALBUM}")
+        release = found['releases'][0]
+        with app.metrics.stage('musicbrainz_release', 'MusicBrainz'):
+            data = app.musicbrainz.get_release(release['id'])
+        with app.metrics.stage('cover_art', 'CoverArtArchive'):
+            app.current_cover_art = dukator.CoverArtFetcher.get_cover(release['id'])
+        app.current_album_info, album_tracks = app.parse_release(release, data)
+        app.download_album_tracks(album_tracks)
+        attempted = len(album_tracks)
+    elif args.worker == 'bulk':
+        app.download_bulk([f"{args.server}/media/{t['file']}" for t in tracks])
+        attempted = len(tracks)
+    else:
+        singles = tracks[:args.singles]
+        for t in singles:
+            result = {'title': t['title'], 'url': f"{args.server}/media/{t['file']}", 'source': 'generic'}
+            app.download_single_song(result).join()
+        attempted = len(singles)
+
+    wall = time.perf_counter() - start
+    after = usage()
+    outputs = audio_outputs(download_path)
+    stages = {
+        f"{stage}/{source}" if source else stage: {
+            'n': len(group['seconds']),
+            'p50_s': dukator.StageMetrics.percentile(group['seconds'], 0.5),
+            'p95_s': dukator.StageMetrics.percentile(group['seconds'], 0.95),
+            'mb': round(group['bytes'] / (1024 * 1024), 3),
+            'outcomes': group['outcomes'],
+        }
+        for (stage, source), group in sorted(app.metrics.groups().items())
+    }
+    print(RESULT_MARKER + json.dumps({
+        'attempted': attempted,
+        'ok': len(outputs),
+        'wall_s': round(wall, 3),
+        'cpu_s': round(after['cpu'] - before['cpu'], 3),
+        'peak_rss_mb': round(after['rss_mb'], 1),
+        'output_mb': round(sum(os.path.getsize(f) for f in outputs) / (1024 * 1024), 3),
+        'stages': stages,
+    }), flush=True)
+    if not args.keep:
+        shutil.rmtree(app_dir, ignore_errors=True)
+    # Hilos de fondo de la app (pools, barridos): no esperar a que terminen
+    os._exit(0)
+
+
+def run_scenario(name, args, server, tracks, work_dir):
+    env = dict(
+        os.environ,
+        DUKATOR_MUSICBRAINZ_API=server.musicbrainz_url,
+        DUKATOR_COVER_ART_ARCHIVE=server.cover_art_url,
+        NO_PROXY='127.0.0.1,localhost',
+        no_proxy='127.0.0.1,localhost',
+    )
+    cmd = [
+        sys.executable, os.path.abspath(__file__),
+        '--worker', name,
+        '--server', server.base_url,
+        '--work-dir', work_dir,
+        '--tracks-json', json.dumps(tracks),
+        '--singles', str(args.singles),
+        '--quality', args.quality,
+        '--format', args.format,
+        '--album-workers', str(args.album_workers),
+    ] + (['--keep'] if args.keep else [])
+    served_before = server.media_bytes
+    proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    served_mb = (server.media_bytes - served_before) / (1024 * 1024)
+
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+        elif args.verbose:
+            print(f"    {line}")
+    if result is None:
+        print(proc.stdout[-4000:])
+        raise RuntimeError(f"el escenario {name} no devolvio resultados (codigo {proc.returncode})")
+
+    wall = max(result['wall_s'], 1e-6)
+    result['served_mb'] = round(served_mb, 3)
+    result['mb_per_s'] = round(served_mb / wall, 3)
+    result['tracks_per_min'] = round(result['ok'] * 60 / wall, 2)
+    result['cpu_s_per_track'] = round(result['cpu_s'] / result['ok'], 3) if result['ok'] else None
+    return result
+
+
+def summarize(runs):
+    """Mediana de cada metrica numerica entre repeticiones"""
+    summary = {}
+    for key in runs[0]:
+        values = [r[key] for r in runs if isinstance(r.get(key), (int, float))]
+        if values and len(values) == len(runs):
+            summary[key] = round(statistics.median(values), 3)
+    summary['stages'] = runs[-1]['stages']
+    return summary
+
+
+def git_version():
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\nComparacion con {baseline_path} ({baseline.get('version', '?')}):")
+    print(f"{'escenario':<10} {'metrica':<16} {'antes':>10} {'ahora':>10} {'cambio':>9}")
+    for name, summary in current['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if not old:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            a, b = old['summary'].get(metric), summary['summary'].get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a * 100
+            worse = change < 0 if higher_is_better else change > 0
+            flag = "  <-- peor" if worse and abs(change) >= 5 else ""
+            print(f"{name:<10} {metric:<16} {a:>10.2f} {b:>10.2f} {change:>+8.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline de las descargas de DUKATOR")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="lista separada por comas: album,bulk,single")
+    parser.add_argument('--tracks', type=int, default=12, help="pistas del album y enlaces del lote")
+    parser.add_argument('--seconds', type=int, default=180, help="duracion de cada pista de prueba")
+    parser.add_argument('--singles', type=int, default=3, help="descargas sueltas (una tras otra)")
+    parser.add_argument('--repeat', type=int, default=1, help="repeticiones por escenario (se guarda la mediana)")
+    parser.add_argument('--quality', default='320')
+    parser.add_argument('--format', default='mp3', choices=('mp3', 'original'))
+    parser.add_argument('--album-workers', type=int, default=4)
+    parser.add_argument('--out', help="JSON de resultados (por defecto benchmarks/results/<fecha>-<version>.json)")
+    parser.add_argument('--compare', help="JSON de una ejecucion anterior con el que comparar")
+    parser.add_argument('--work-dir', help="carpeta de trabajo (por defecto una temporal)")
+    parser.add_argument('--keep', action='store_true', help="no borrar las descargas de cada escenario")
+    parser.add_argument('--verbose', action='store_true', help="mostrar la salida de la aplicacion")
+    # Uso interno: proceso hijo de un escenario
+    parser.add_argument('--worker', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--server', help=argparse.SUPPRESS)
+    parser.add_argument('--tracks-json', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return run_worker(args)
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="dukator-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    fixtures_dir = os.path.join(work_dir, "fixtures")
+    print(f"Generando {args.tracks} pistas de {args.seconds} s en {fixtures_dir}...")
+    tracks = make_fixtures(fixtures_dir, args.tracks, args.seconds)
+    server = StandInServer(fixtures_dir, tracks).start()
+    print(f"Sustitutos en {server.base_url}")
+
+    version = git_version()
+    results = {
+        'version': version,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'tracks': args.tracks, 'seconds': args.seconds, 'singles': args.singles,
+            'repeat': args.repeat, 'quality': args.quality, 'format': args.format,
+            'album_workers': args.album_workers,
+        },
+        'scenarios': {},
+    }
+    try:
+        for name in scenarios:
+            runs = []
+            for n in range(args.repeat):
+                print(f"[{name}] ejecucion {n + 1}/{args.repeat}...")
+                run = run_scenario(name, args, server, tracks, work_dir)
+                print(f"    {run['ok']}/{run['attempted']} pistas en {run['wall_s']:.1f} s  •  "
+                      f"{run['tracks_per_min']:.1f} pistas/min  •  {run['mb_per_s']:.2f} MB/s  •  "
+                      f"{run['cpu_s_per_track'] or 0:.2f} s CPU/pista  •  pico {run['peak_rss_mb']:.0f} MB")
+                runs.append(run)
+            results['scenarios'][name] = {'summary': summarize(runs), 'runs': runs}
+    finally:
+        server.stop()
+        if not args.work_dir and not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    out = args.out or os.path.join(BENCH_DIR, "results", f"{time.strftime('%Y%m%d-%H%M%S')}-{version}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados en {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
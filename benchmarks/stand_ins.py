@@ -0,0 +1,217 @@
+"""Sustitutos locales de los servicios que usa DUKATOR, para medir sin red.
+
+Un unico servidor HTTP en 127.0.0.1 sirve:
+
+- /ws/2/...           MusicBrainz (busqueda y release con sus pistas)
+- /caa/release/<id>   Cover Art Archive (JSON de imagenes + la caratula)
+- /media/<archivo>    origen de audio con los fixtures (admite Range)
+
+Los fixtures se generan con FFmpeg (tonos AAC en .m4a con faststart y una
+caratula JPEG), asi que no hay binarios en el repositorio y cada maquina
+mide exactamente lo mismo.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BENCH_ARTIST = "Bench Artist"
+BENCH_ALBUM = "Bench Album"
+BENCH_RELEASE_ID = "00000000-0000-4000-8000-000000000001"
+
+
+def make_fixtures(folder, count, seconds, ffmpeg="ffmpeg"):
+    """Genera count pistas de seconds segundos y cover.jpg; devuelve la lista de pistas"""
+    os.makedirs(folder, exist_ok=True)
+    tracks = []
+    for n in range(1, count + 1):
+        name = f"track{n:02d}.m4a"
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            subprocess.run([
+                ffmpeg, '-v', 'error', '-y',
+                '-f', 'lavfi', '-i', f"sine=frequency={220 + 20 * n}:sample_rate=44100:duration={seconds}",
+                '-ac', '2', '-c:a', 'aac', '-b:a', '192k', '-movflags', '+faststart', path
+            ], check=True)
+        tracks.append({
+            'position': n,
+            'title': f"Bench Song {n:02d}",
+            'length': seconds * 1000,
+            'file': name,
+        })
+    cover = os.path.join(folder, "cover.jpg")
+    if not os.path.exists(cover):
+        subprocess.run([
+            ffmpeg, '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', 'testsrc=size=500x500:rate=1', '-frames:v', '1', cover
+        ], check=True)
+    return tracks
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    """Sin trazas por clientes que cortan la conexion (yt-dlp al sondear, o al salir)"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StandInServer:
+    """Servidor de los sustitutos en un hilo; cuenta los bytes de audio servidos"""
+
+    def __init__(self, fixtures_dir, tracks, host='127.0.0.1', port=0):
+        self.fixtures_dir = fixtures_dir
+        self.tracks = tracks
+        self.media_bytes = 0
+        self.requests = {}
+        self._lock = threading.Lock()
+        self.httpd = QuietHTTPServer((host, port), self._handler_class())
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="stand-ins", daemon=True)
+
+    @property
+    def musicbrainz_url(self):
+        return f"{self.base_url}/ws/2"
+
+    @property
+    def cover_art_url(self):
+        return f"{self.base_url}/caa"
+
+    def media_url(self, track):
+        return f"{self.base_url}/media/{track['file']}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, kind):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def count_bytes(self, media_bytes):
+        with self._lock:
+            self.media_bytes += media_bytes
+
+    def release_search(self):
+        return {'releases': [self.release_summary()]}
+
+    def release_summary(self):
+        return {
+            'id': BENCH_RELEASE_ID,
+            'title': BENCH_ALBUM,
+            'date': '2024-01-01',
+            'country': 'XW',
+            'artist-credit': [{'artist': {'name': BENCH_ARTIST}}],
+        }
+
+    def release(self):
+        data = self.release_summary()
+        data['media'] = [{
+            'position': 1,
+            'tracks': [
+                {'position': t['position'], 'title': t['title'], 'length': t['length'],
+                 'recording': {'title': t['title'], 'length': t['length']}}
+                for t in self.tracks
+            ],
+        }]
+        return data
+
+    def cover_index(self):
+        image = f"{self.cover_art_url}/img/cover.jpg"
+        return {'images': [{'front': True, 'image': image, 'thumbnails': {'500': image, 'large': image}}]}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, data):
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_file(self, path, content_type, kind):
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    return self.send_error(404)
+                start, end = 0, size - 1
+                match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range') or '')
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = int(match.group(2)) if match.group(2) else end
+                    else:
+                        start = max(0, size - int(match.group(2)))
+                    end = min(end, size - 1)
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{size}")
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                length = end - start + 1
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(length))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+                if self.command == 'HEAD':
+                    return
+                server.count(kind)
+                sent = 0
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    while sent < length:
+                        chunk = f.read(min(256 * 1024, length - sent))
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        if kind == 'media':
+                            server.count_bytes(len(chunk))
+
+            def do_HEAD(self):
+                self.do_GET()
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                path = url.path
+                if path.rstrip('/') == '/ws/2/release' and 'query' in parse_qs(url.query):
+                    server.count('musicbrainz')
+                    return self.send_json(server.release_search())
+                if path == f"/ws/2/release/{BENCH_RELEASE_ID}":
+                    server.count('musicbrainz')
+                    return self.send_json(server.release())
+                if path == f"/caa/release/{BENCH_RELEASE_ID}":
+                    server.count('coverart')
+                    return self.send_json(server.cover_index())
+                if path == '/caa/img/cover.jpg':
+                    return self.send_file(os.path.join(server.fixtures_dir, 'cover.jpg'), 'image/jpeg', 'coverart')
+                if path.startswith('/media/'):
+                    name = os.path.basename(path)
+                    return self.send_file(os.path.join(server.fixtures_dir, name), 'audio/mp4', 'media')
+                self.send_error(404)
+
+        return Handler
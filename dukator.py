@@ -7,12 +7,41 @@ import os
 import sys
 import re
 import time
+import math
 import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from difflib import SequenceMatcher
 from urllib.parse import quote as url_quote
 from mutagen.id3 import ID3, TIT2, TPE1, TALB, TDRC, TRCK, APIC, TXXX
 from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+from mutagen.flac import FLAC, Picture
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+import base64
 import yt_dlp
 import io
+import uuid
+import hashlib
+import queue
+import subprocess
+import shutil
+import sqlite3
+import bisect
+import heapq
+import ctypes
+import ctypes.util
+import errno
+import select
+import struct
+import unicodedata
+import mutagen
+from mutagen.easyid3 import EasyID3
+from mutagen.easymp4 import EasyMP4Tags
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Forzar stdout/stderr a UTF-8 para evitar UnicodeEncodeError con emojis en Windows
 if sys.stdout and hasattr(sys.stdout, 'reconfigure'):
@@ -85,7 +114,165 @@ DOWNLOAD_SOURCES = [
     ('pixabay', 'Pixabay', 'pixabay.com'),
 ]
 
-COVER_ART_ARCHIVE = "https://coverartarchive.org"
+# Limite de descargas simultaneas por host (evita baneos/throttling por fuente)
+DOWNLOAD_HOST_LIMITS = {
+    'youtube.com': 4,
+    'soundcloud.com': 2,
+    'audiomack.com': 2,
+    'bandcamp.com': 2,
+    'mixcloud.com': 2,
+    'archive.org': 3,
+}
+DEFAULT_HOST_LIMIT = 2
+
+# Canciones de un album descargadas en paralelo
+ALBUM_WORKER_CHOICES = ["1", "2", "4", "6", "8"]
+DEFAULT_ALBUM_WORKERS = 4
+
+# Modo "carrera": fuentes consultadas en paralelo para cada pista
+SOURCE_MODE_CHOICES = {'Secuencial': 'serial', 'Carrera': 'race'}
+DEFAULT_SOURCE_MODE = 'race'      # solo configuraciones nuevas
+LEGACY_SOURCE_MODE = 'serial'     # configuraciones de antes del modo carrera (sin la clave)
+RACE_SOURCES = ('youtube', 'soundcloud', 'mixcloud', 'archive', 'dailymotion', 'bilibili')
+RACE_DEADLINE = 8.0          # segundos maximos esperando candidatos
+RACE_GOOD_ENOUGH = 0.9       # puntuacion que corta la carrera antes del deadline
+RACE_MIN_SCORE = 0.35        # por debajo se descarta el candidato
+RACE_MAX_ATTEMPTS = 3        # candidatos a probar si falla la descarga del ganador
+RACE_SEARCH_TIMEOUT = 8      # timeout de socket de las busquedas con yt-dlp (acota a los perdedores)
+
+# Palabras que delatan una version distinta (solo penalizan si no estan en el titulo pedido)
+CANDIDATE_PENALTY_WORDS = ('live', 'cover', 'remix', 'karaoke', 'instrumental', 'sped up', 'slowed', 'nightcore')
+
+# Formato de salida: MP3 recodificado o el stream original sin recodificar
+OUTPUT_FORMAT_CHOICES = {'MP3': 'mp3', 'Original': 'original'}
+DEFAULT_OUTPUT_FORMAT = 'mp3'
+FETCH_FORMATS = {
+    # Priorizar m4a/webm nativos para evitar re-encode innecesario
+    'mp3': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
+    # Maxima fidelidad: FLAC si la fuente lo tiene (Archive.org, Bandcamp)
+    'original': 'bestaudio[acodec=flac]/bestaudio/best',
+}
+# Codec del stream -> contenedor de salida (solo remux, sin recodificar)
+NATIVE_CONTAINERS = {
+    'aac': 'm4a',
+    'alac': 'm4a',
+    'mp3': 'mp3',
+    'opus': 'opus',
+    'vorbis': 'ogg',
+    'flac': 'flac',
+}
+# Contenedor -> muxer de FFmpeg
+CONTAINER_MUXERS = {'m4a': 'ipod', 'mp3': 'mp3', 'opus': 'opus', 'ogg': 'ogg', 'flac': 'flac'}
+
+# Contenedores que FFmpeg sabe etiquetar en el mismo pase (y cuales admiten
+# caratula). M4A va por mutagen: FFmpeg no escribe el campo libre SOURCE.
+FFMPEG_TAG_CONTAINERS = ('mp3', 'flac', 'ogg', 'opus')
+FFMPEG_COVER_CONTAINERS = ('mp3', 'flac')
+# Postprocesadores de yt-dlp que lanzan FFmpeg (pp_key() les quita el prefijo);
+# MoveFiles y compañia tambien avisan con 'started' pero no son CPU
+YTDLP_FFMPEG_POSTPROCESSORS = frozenset(
+    cls.pp_key() for name, cls in vars(yt_dlp.postprocessor).items()
+    if name.startswith('FFmpeg') and name.endswith('PP')
+)
+
+# Descargas a medias: se reanudan entre reintentos y reinicios
+DEFAULT_PARTIAL_MAX_AGE_DAYS = 7
+
+# Carpeta de trabajo (previews descargados): cuota y vida maxima de lo no reservado
+SCRATCH_MAX_MB = 300
+SCRATCH_MAX_AGE = 6 * 3600
+
+# Cliente HTTP compartido (metadatos, caratulas, busquedas)
+HTTP_USER_AGENT = "DUKATOR/2.0 (https://github.com/dukator)"
+BROWSER_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+HTTP_TIMEOUT = (5, 20)  # (conexion, lectura) en segundos
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_RETRY_STATUS = (429, 503)
+HTTP_HOST_LIMITS = {
+    'musicbrainz.org': 1,
+    'coverartarchive.org': 4,
+    'archive.org': 4,
+    'youtube.com': 4,
+    'api.audiomack.com': 2,
+}
+HTTP_DEFAULT_HOST_LIMIT = 4
+
+# MusicBrainz: 1 peticion/s por cliente (politica del servicio) y cache en disco.
+# Las URLs base se pueden redirigir (benchmarks/ levanta sustitutos locales)
+MUSICBRAINZ_API = os.environ.get('DUKATOR_MUSICBRAINZ_API', "https://musicbrainz.org/ws/2")
+MUSICBRAINZ_MIN_INTERVAL = 1.0
+MUSICBRAINZ_SEARCH_TTL = 24 * 3600
+MUSICBRAINZ_RELEASE_TTL = 30 * 24 * 3600
+# Respuestas recientes tambien en memoria (el resto se relee del disco)
+MUSICBRAINZ_MEMORY_ITEMS = 64
+
+# Busqueda de canciones: fuentes consultadas a la vez, cada una con su plazo
+SONG_SEARCH_SOURCES = [
+    ('youtube', 'YouTube'),
+    ('soundcloud', 'SoundCloud'),
+    ('audiomack', 'Audiomack'),
+]
+SONG_SEARCH_DEADLINE = 15.0
+SONG_SEARCH_LIMIT = 10
+
+# Previews en streaming: el formato de audio mas ligero que suena bien y
+# el tamaño de cada trozo PCM que se encola en pygame
+PREVIEW_STREAM_FORMAT = 'bestaudio[abr<=160]/worstaudio[abr>=48]/bestaudio/best'
+PREVIEW_CHUNK_SECONDS = 0.25
+# Cache de previews decodificados (~5 MB cada uno) y cuantos preparar por adelantado
+PREVIEW_CACHE_MB = 150
+PREVIEW_PREFETCH_COUNT = 3
+PREVIEW_PREFETCH_TIMEOUT = 60  # segundos como mucho decodificando uno (un stream atascado se corta)
+
+# Cache busqueda -> candidatos (preview, descarga suelta y de album)
+CANDIDATE_CACHE_TTL = 6 * 3600
+CANDIDATE_CACHE_MAX_ENTRIES = 500
+CANDIDATE_CACHE_FLUSH_DELAY = 5.0  # segundos agrupando altas antes de escribir el JSON
+
+# Biblioteca local: indice SQLite con escaneo recursivo e incremental
+LIBRARY_AUDIO_EXTENSIONS = {'.mp3', '.wav', '.flac', '.m4a', '.ogg', '.opus', '.aac', '.wma'}
+LIBRARY_TAG_WORKERS = 8
+# Vigilancia de la carpeta: agrupar eventos hasta que se calma / sondeo sin inotify
+LIBRARY_WATCH_SETTLE = 0.5
+LIBRARY_POLL_INTERVAL = 5.0
+# Filtro de la biblioteca mientras se escribe: espera tras la ultima tecla,
+# longitud minima de la consulta y filas como mucho por resultado
+LIBRARY_FILTER_DEBOUNCE_MS = 150
+LIBRARY_FILTER_MIN_CHARS = 2
+LIBRARY_FILTER_MAX_RESULTS = 1000
+
+# Progreso por bytes: suavizado de la velocidad y umbral para dar una descarga por atascada
+PROGRESS_SMOOTHING_SECONDS = 3.0
+PROGRESS_STALL_SECONDS = 15
+
+# Metricas por etapa: tope del JSONL (se rota) y registros guardados en memoria
+METRICS_JSONL_MAX_MB = 20
+METRICS_MEMORY_RECORDS = 20000
+
+# Traza de sesiones (Chrome trace-event), desactivada por defecto: trace_sessions en la config
+DEFAULT_TRACE_SESSIONS = False
+TRACE_MAX_EVENTS = 500000
+TRACE_MAX_FILES = 20
+
+# Cola de eventos hilos -> Tk: veces por segundo que se vacia
+UI_EVENT_FPS = 30
+
+# Busqueda de albumes mientras se escribe: espera tras la ultima tecla
+SEARCH_DEBOUNCE_MS = 450
+SEARCH_MIN_CHARS = 3
+
+COVER_ART_ARCHIVE = os.environ.get('DUKATOR_COVER_ART_ARCHIVE', "https://coverartarchive.org")
+# Tamaños de miniatura de Cover Art Archive, en orden de preferencia
+COVER_THUMBNAIL_SIZES = ('1200', '500', 'large')
+DEFAULT_COVER_CACHE_MB = 200
+COVER_MEMORY_ITEMS = 8
+COVER_MAX_SIZE = 1200
+COVER_MAX_BYTES = 1024 * 1024
+
+# Campo libre SOURCE legible como 'source' en la lectura "easy" de mutagen
+EasyID3.RegisterTXXXKey('source', 'SOURCE')
+EasyMP4Tags.RegisterFreeformKey('source', 'SOURCE')
 
 ctk.set_appearance_mode("dark")
 
@@ -142,34 +329,1469 @@ class SourceDetector:
         return names.get(source, source)
 
 
+class HostLimiter:
+    """Limita las descargas concurrentes por host"""
+    
+    def __init__(self, limits=None, default_limit=DEFAULT_HOST_LIMIT):
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        
+    def _semaphore(self, host):
+        with self._lock:
+            sem = self._semaphores.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.limits.get(host, self.default_limit))
+                self._semaphores[host] = sem
+            return sem
+            
+    def slot(self, host):
+        """Context manager: ocupa un hueco del host mientras dura el bloque"""
+        return self._semaphore(host or 'generic')
+
+
+class HttpClient:
+    """Sesion HTTP compartida: conexiones reutilizadas, limite por host,
+    reintentos con espera en 429/503 y timeouts/User-Agent en un solo sitio"""
+    
+    def __init__(self, host_limits=None, default_limit=HTTP_DEFAULT_HOST_LIMIT):
+        self.limiter = HostLimiter(host_limits or HTTP_HOST_LIMITS, default_limit)
+        pool_size = max([default_limit] + list(self.limiter.limits.values()))
+        retry = Retry(
+            total=HTTP_RETRIES,
+            backoff_factor=HTTP_BACKOFF,
+            status_forcelist=HTTP_RETRY_STATUS,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['User-Agent'] = HTTP_USER_AGENT
+        
+    @staticmethod
+    def host_of(url):
+        host = (urlparse(url).hostname or '').lower()
+        return host[4:] if host.startswith('www.') else host
+        
+    def get(self, url, params=None, headers=None, timeout=HTTP_TIMEOUT, browser=False):
+        """GET con el limite del host; browser=True para paginas que se 'rascan'"""
+        if browser:
+            headers = dict(headers or {}, **{'User-Agent': BROWSER_USER_AGENT})
+        with self.limiter.slot(self.host_of(url)):
+            return self.session.get(url, params=params, headers=headers, timeout=timeout)
+
+
+HTTP = HttpClient()
+
+
+class JobJournal:
+    """Diario de descargas en disco (JSONL, solo anexar) para reanudar tras un cierre"""
+    
+    STATES = ('queued', 'resolving', 'downloading', 'transcoding', 'tagging', 'done', 'failed')
+    FINISHED = ('done', 'failed')
+    
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._load()
+        self.compact()
+        
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Ultima linea a medias si la app murio escribiendo
+                        continue
+                    self._apply(record)
+        except OSError as e:
+            print(f"[Jobs] No se pudo leer el diario: {e}")
+            
+    def _apply(self, record):
+        job_id = record.get('id')
+        if not job_id:
+            return
+        job = self.jobs.setdefault(job_id, {'id': job_id})
+        for key in ('kind', 'payload', 'state', 'error', 'ts'):
+            if key in record:
+                job[key] = record[key]
+                
+    def _append(self, record):
+        record['ts'] = time.time()
+        with self._lock:
+            self._apply(record)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                print(f"[Jobs] No se pudo escribir el diario: {e}")
+                
+    def add(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        self._append({'id': job_id, 'kind': kind, 'payload': payload, 'state': 'queued'})
+        return job_id
+        
+    def set_state(self, job_id, state, error=None):
+        if not job_id or job_id not in self.jobs:
+            return
+        record = {'id': job_id, 'state': state}
+        if error:
+            record['error'] = str(error)[:200]
+        self._append(record)
+        
+    def pending(self):
+        with self._lock:
+            return [dict(job) for job in self.jobs.values() if job.get('state') not in self.FINISHED]
+            
+    def compact(self):
+        """Reescribe el diario solo con los trabajos sin terminar (reemplazo atomico)"""
+        with self._lock:
+            self.jobs = {k: v for k, v in self.jobs.items() if v.get('state') not in self.FINISHED}
+            tmp_path = self.path + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    for job in self.jobs.values():
+                        f.write(json.dumps(job, ensure_ascii=False) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"[Jobs] No se pudo compactar el diario: {e}")
+
+
+class MusicBrainzClient:
+    """Cliente de MusicBrainz: peticiones en fila a 1/s y respuestas cacheadas en disco.
+    
+    Dentro del TTL la respuesta sale de la cache sin tocar la red; pasado el
+    TTL se revalida con If-None-Match/If-Modified-Since y, si la red falla,
+    se sirve la copia caducada antes que nada.
+    """
+    
+    def __init__(self, cache_dir, http=None, base_url=MUSICBRAINZ_API, memory_items=MUSICBRAINZ_MEMORY_ITEMS):
+        self.cache_dir = cache_dir
+        self.http = http or HTTP
+        self.base_url = base_url.rstrip('/')
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._next_request = 0.0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        
+    def search_releases(self, query, limit=25):
+        params = {"query": query, "fmt": "json", "limit": limit}
+        return self._get("release/", params, MUSICBRAINZ_SEARCH_TTL)
+        
+    def get_release(self, release_id, inc="recordings"):
+        params = {"fmt": "json", "inc": inc}
+        return self._get(f"release/{release_id}", params, MUSICBRAINZ_RELEASE_TTL)
+        
+    def _cache_path(self, path, params):
+        key = path + '?' + '&'.join(f"{k}={params[k]}" for k in sorted(params))
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+        
+    def _remember(self, cache_path, entry):
+        """Guarda la entrada en memoria y descarta la menos usada (LRU)"""
+        with self._memory_lock:
+            self._memory[cache_path] = entry
+            self._memory.move_to_end(cache_path)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+                
+    def _read_cache(self, cache_path):
+        with self._memory_lock:
+            entry = self._memory.get(cache_path)
+            if entry is not None:
+                self._memory.move_to_end(cache_path)
+        if entry is None and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+                self._remember(cache_path, entry)
+            except (OSError, ValueError):
+                entry = None
+        return entry
+        
+    def _write_cache(self, cache_path, entry):
+        self._remember(cache_path, entry)
+        # Temporal unico: dos hilos pueden guardar la misma consulta a la vez
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"[MusicBrainz] No se pudo guardar la cache: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            
+    def _throttle(self):
+        """Reserva el siguiente hueco de 1 s; las llamadas concurrentes hacen fila"""
+        with self._rate_lock:
+            now = time.monotonic()
+            wait_for = self._next_request - now
+            self._next_request = max(now, self._next_request) + MUSICBRAINZ_MIN_INTERVAL
+        if wait_for > 0:
+            time.sleep(wait_for)
+            
+    def _get(self, path, params, ttl):
+        cache_path = self._cache_path(path, params)
+        entry = self._read_cache(cache_path)
+        if entry and time.time() - entry.get('fetched', 0) < ttl:
+            return entry['data']
+            
+        headers = {"Accept": "application/json"}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+                
+        try:
+            self._throttle()
+            response = self.http.get(f"{self.base_url}/{path}", params=params, headers=headers)
+            if response.status_code == 304 and entry:
+                entry['fetched'] = time.time()
+                self._write_cache(cache_path, entry)
+                return entry['data']
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            if entry:
+                return entry['data']
+            raise
+            
+        self._write_cache(cache_path, {
+            'fetched': time.time(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'data': data,
+        })
+        return data
+
+
+class PreviewCache:
+    """Previews ya decodificados (PCM s16le), en disco y con tope de tamaño.
+    
+    La clave es el id del medio segun el extractor de yt-dlp (p. ej.
+    Youtube-dQw4w9WgXcQ), sacado de la URL sin tocar la red, asi que dos
+    URLs del mismo video comparten entrada. Cada archivo empieza con una
+    linea JSON (titulo, frecuencia, canales) seguida del audio; se reproduce
+    tal cual, sin FFmpeg. LRU por fecha de modificacion, como las caratulas.
+    """
+    
+    def __init__(self, cache_dir, max_mb=PREVIEW_CACHE_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._keys = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        
+    def key_for(self, url):
+        with self._lock:
+            if url in self._keys:
+                return self._keys[url]
+        key = None
+        for ie in yt_dlp.extractor.gen_extractor_classes():
+            if ie.ie_key() != 'Generic' and ie.suitable(url):
+                media_id = ie.get_temp_id(url)
+                if media_id:
+                    key = re.sub(r'[^\w-]', '_', f"{ie.ie_key()}-{media_id}")
+                break
+        if key is None:
+            key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        with self._lock:
+            self._keys[url] = key
+        return key
+        
+    def path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+        
+    def open(self, key, freq, channels):
+        """(meta, archivo abierto en el inicio del PCM), o None si no esta o no encaja"""
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        try:
+            meta = json.loads(f.readline())
+            if meta.get('freq') != freq or meta.get('channels') != channels:
+                f.close()
+                return None
+            os.utime(path)  # LRU: la fecha de modificacion marca el ultimo uso
+            return meta, f
+        except (OSError, ValueError):
+            f.close()
+            return None
+            
+    def put(self, key, title, freq, channels, data):
+        path = self.path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        meta = {'title': title, 'freq': freq, 'channels': channels}
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps(meta).encode('utf-8') + b'\n')
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict()
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+                
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pcm'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class CandidateCache:
+    """Cache consulta -> candidatos, en memoria y en un JSON en disco.
+    
+    Las entradas caducan a los ttl segundos y, pasado max_entries, se
+    descartan las usadas hace mas tiempo. Los resultados vacios no se
+    guardan: suelen ser un fallo pasajero de la fuente. put() solo marca
+    la cache como sucia; el JSON se escribe flush_delay segundos despues
+    (o con flush() al cerrar), fuera del lock que usan las busquedas.
+    """
+    
+    def __init__(self, path, ttl=CANDIDATE_CACHE_TTL, max_entries=CANDIDATE_CACHE_MAX_ENTRIES,
+                 flush_delay=CANDIDATE_CACHE_FLUSH_DELAY):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_delay = flush_delay
+        self.entries = {}
+        self.dirty = False
+        self._timer = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._load()
+    
+    @staticmethod
+    def key(kind, query):
+        return f"{kind}:{' '.join(query.lower().split())}"
+    
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        self.entries = {
+            key: entry for key, entry in entries.items()
+            if now - entry.get('stored', 0) < self.ttl
+        }
+    
+    def flush(self):
+        """Escribe el JSON si hay cambios: copia bajo el lock, serializa y escribe fuera"""
+        with self._save_lock:
+            with self._lock:
+                self._timer = None
+                if not self.dirty:
+                    return
+                self.dirty = False
+                snapshot = {key: dict(entry) for key, entry in self.entries.items()}
+            tmp_path = self.path + '.tmp'
+            try:
+                data = json.dumps(snapshot, ensure_ascii=False)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"[Cache] No se pudo guardar {self.path}: {e}")
+                
+    def _schedule_flush(self):
+        # Llamado con _lock tomado: un unico temporizador por rafaga de altas
+        self.dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def get(self, kind, query):
+        key = self.key(kind, query)
+        with self._lock:
+            entry = self.entries.get(key)
+            if not entry:
+                return None
+            if time.time() - entry['stored'] >= self.ttl:
+                del self.entries[key]
+                return None
+            entry['used'] = time.time()
+            return [dict(candidate) for candidate in entry['candidates']]
+    
+    def put(self, kind, query, candidates):
+        if not candidates:
+            return
+        now = time.time()
+        with self._lock:
+            self.entries[self.key(kind, query)] = {
+                'stored': now,
+                'used': now,
+                'candidates': [dict(candidate) for candidate in candidates],
+            }
+            if len(self.entries) > self.max_entries:
+                by_use = sorted(self.entries, key=lambda k: self.entries[k].get('used', 0))
+                for key in by_use[:len(self.entries) - self.max_entries]:
+                    del self.entries[key]
+            self._schedule_flush()
+    
+    def fetch(self, kind, query, resolver):
+        """Devuelve los candidatos cacheados o llama a resolver() y los guarda"""
+        candidates = self.get(kind, query)
+        if candidates is None:
+            candidates = resolver() or []
+            self.put(kind, query, candidates)
+        return candidates
+
+
+class LibraryIndex:
+    """Indice persistente (SQLite) de los archivos de audio bajo una carpeta.
+    
+    scan() recorre el arbol completo pero solo vuelve a leer etiquetas de
+    los archivos nuevos o cuyo tamaño/mtime ha cambiado; load() devuelve el
+    ultimo estado conocido sin tocar el disco de musica.
+    """
+    
+    COLUMNS = ('path', 'root', 'size', 'mtime', 'duration', 'bitrate',
+               'title', 'artist', 'album', 'year', 'track', 'source')
+    
+    def __init__(self, db_path, tag_workers=LIBRARY_TAG_WORKERS):
+        self.db_path = db_path
+        self.tag_workers = tag_workers
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    root TEXT NOT NULL,
+                    size INTEGER,
+                    mtime REAL,
+                    duration REAL,
+                    bitrate INTEGER,
+                    title TEXT,
+                    artist TEXT,
+                    album TEXT,
+                    year TEXT,
+                    track TEXT,
+                    source TEXT
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS files_root ON files(root)")
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+            if 'source' not in columns:
+                # Indice de una version anterior: anadir la columna y releer todo
+                self.conn.execute("ALTER TABLE files ADD COLUMN source TEXT")
+                self.conn.execute("UPDATE files SET mtime = -1")
+    
+    @staticmethod
+    def root_key(root):
+        return os.path.normcase(os.path.abspath(root))
+    
+    def load(self, root):
+        with self._lock:
+            cursor = self.conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM files WHERE root = ? ORDER BY path",
+                (self.root_key(root),)
+            )
+            return [self.as_entry(dict(zip(self.COLUMNS, row))) for row in cursor]
+    
+    @staticmethod
+    def as_entry(row):
+        """Fila del indice -> modelo de la lista de archivos locales"""
+        name, ext = os.path.splitext(os.path.basename(row['path']))
+        return dict(row, file=row['path'], ext=ext.upper()[1:], title=row.get('title') or name)
+    
+    def walk(self, root):
+        """Archivos de audio bajo root (recursivo) -> {path: (size, mtime)}"""
+        found = {}
+        stack = [root]
+        while stack:
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif os.path.splitext(entry.name.lower())[1] in LIBRARY_AUDIO_EXTENSIONS:
+                                st = entry.stat()
+                                found[entry.path] = (st.st_size, st.st_mtime)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return found
+    
+    @staticmethod
+    def read_tags(path):
+        info = {'duration': 0, 'bitrate': 0, 'title': '', 'artist': '', 'album': '', 'year': '', 'track': '', 'source': ''}
+        try:
+            audio = mutagen.File(path, easy=True)
+        except Exception:
+            return info
+        if audio is None:
+            return info
+        if getattr(audio, 'info', None):
+            info['duration'] = getattr(audio.info, 'length', 0) or 0
+            info['bitrate'] = getattr(audio.info, 'bitrate', 0) or 0
+        tags = audio.tags or {}
+        for field, key in (('title', 'title'), ('artist', 'artist'), ('album', 'album'),
+                           ('year', 'date'), ('track', 'tracknumber'), ('source', 'source')):
+            try:
+                values = tags.get(key)
+            except Exception:
+                values = None
+            if values:
+                info[field] = str(values[0] if isinstance(values, list) else values)
+        return info
+    
+    def scan(self, root, on_progress=None):
+        """Sincroniza el indice con el disco. Devuelve (entradas, estadisticas)"""
+        key = self.root_key(root)
+        on_disk = self.walk(root)
+        with self._lock:
+            known = {
+                path: (size, mtime)
+                for path, size, mtime in self.conn.execute(
+                    "SELECT path, size, mtime FROM files WHERE root = ?", (key,)
+                )
+            }
+        changed = [path for path, stat in on_disk.items() if known.get(path) != stat]
+        removed = [path for path in known if path not in on_disk]
+        
+        rows = []
+        if changed:
+            with ThreadPoolExecutor(max_workers=self.tag_workers, thread_name_prefix="library") as pool:
+                for done, (path, tags) in enumerate(zip(changed, pool.map(self.read_tags, changed)), 1):
+                    size, mtime = on_disk[path]
+                    rows.append(self.row_for(path, key, size, mtime, tags))
+                    if on_progress and done % 200 == 0:
+                        on_progress(done, len(changed))
+        
+        with self._lock, self.conn:
+            if removed:
+                self.conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+            if rows:
+                self.conn.executemany(
+                    f"INSERT OR REPLACE INTO files ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                    rows
+                )
+        stats = {'total': len(on_disk), 'changed': len(changed), 'removed': len(removed)}
+        return self.load(root), stats
+    
+    def row_for(self, path, key, size, mtime, tags):
+        return (path, key, size, mtime, tags['duration'], tags['bitrate'], tags['title'],
+                tags['artist'], tags['album'], tags['year'], tags['track'], tags['source'])
+    
+    def add_file(self, path, root):
+        """Indexa un archivo nuevo o modificado; devuelve su entrada.
+        
+        None si no es de root, no es audio o ya estaba indexado tal cual (el
+        vigilante y el descargador avisan del mismo archivo: solo cuenta uno).
+        """
+        path = os.path.abspath(path)
+        if not self.root_key(path).startswith(self.root_key(root) + os.sep):
+            return None
+        if os.path.splitext(path.lower())[1] not in LIBRARY_AUDIO_EXTENSIONS:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            known = self.conn.execute("SELECT size, mtime FROM files WHERE path = ?", (path,)).fetchone()
+        if known == (st.st_size, st.st_mtime):
+            return None
+        row = self.row_for(path, self.root_key(root), st.st_size, st.st_mtime, self.read_tags(path))
+        with self._lock, self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO files ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                row
+            )
+        return self.as_entry(dict(zip(self.COLUMNS, row)))
+        
+    def remove_path(self, path):
+        """Quita un archivo o una carpeta entera; devuelve las rutas eliminadas"""
+        path = os.path.abspath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock, self.conn:
+            removed = [
+                row[0] for row in self.conn.execute(
+                    "SELECT path FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (path, len(prefix), prefix)
+                )
+            ]
+            self.conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in removed])
+        return removed
+
+
+class LibrarySearch:
+    """Busqueda instantanea en la biblioteca (artista, album, titulo y SOURCE).
+    
+    Indice invertido palabra -> ids sobre un vocabulario ordenado: cada
+    palabra de la consulta se busca como prefijo con bisect y se cruzan los
+    conjuntos, empezando por el mas pequeño. Admite altas y bajas sueltas
+    para no reconstruir el indice cada vez que termina una descarga.
+    """
+    
+    FIELDS = ('artist', 'album', 'title', 'source')
+    
+    def __init__(self):
+        self.entries = {}
+        self.words = {}
+        self.ids_by_path = {}
+        self.postings = {}
+        self.vocabulary = []
+        self.next_id = 0
+    
+    @staticmethod
+    def tokenize(text):
+        text = text.lower()
+        if not text.isascii():
+            text = unicodedata.normalize('NFKD', text)
+            text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+        return re.findall(r'\w+', text)
+        
+    def rebuild(self, entries):
+        """Reconstruye el indice completo (en un hilo de fondo: son muchas entradas)"""
+        self.__init__()
+        for entry in entries:
+            self.add(entry, sort_vocabulary=False)
+        self.vocabulary = sorted(self.postings)
+        return self
+        
+    def add(self, entry, sort_vocabulary=True):
+        self.remove(entry['file'])
+        entry_id = self.next_id
+        self.next_id += 1
+        text = ' '.join(str(entry.get(field) or '') for field in self.FIELDS)
+        text += ' ' + os.path.splitext(os.path.basename(entry['file']))[0]
+        words = set(self.tokenize(text))
+        self.entries[entry_id] = entry
+        self.words[entry_id] = words
+        self.ids_by_path[entry['file']] = entry_id
+        for word in words:
+            posting = self.postings.get(word)
+            if posting is None:
+                self.postings[word] = posting = set()
+                if sort_vocabulary:
+                    bisect.insort(self.vocabulary, word)
+            posting.add(entry_id)
+    
+    def remove(self, path):
+        entry_id = self.ids_by_path.pop(path, None)
+        if entry_id is None:
+            return
+        del self.entries[entry_id]
+        for word in self.words.pop(entry_id):
+            posting = self.postings[word]
+            posting.discard(entry_id)
+            if not posting:
+                del self.postings[word]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+    
+    def matching(self, prefix):
+        ids = set()
+        idx = bisect.bisect_left(self.vocabulary, prefix)
+        while idx < len(self.vocabulary) and self.vocabulary[idx].startswith(prefix):
+            ids |= self.postings[self.vocabulary[idx]]
+            idx += 1
+        return ids
+    
+    def search(self, query, limit=None):
+        """(entradas, total): las entradas cuyas palabras empiezan por todas las
+        de la consulta, en orden de alta y como mucho limit; total las cuenta todas"""
+        terms = self.tokenize(query)
+        if not terms:
+            # El dict ya va en orden de alta (los ids solo crecen): sin ordenar
+            entries = list(self.entries.values())
+            return (entries[:limit] if limit else entries), len(entries)
+        result = None
+        # Los prefijos largos filtran mas: primero
+        for term in sorted(set(terms), key=len, reverse=True):
+            ids = self.matching(term)
+            result = ids if result is None else result & ids
+            if not result:
+                return [], 0
+        # Solo se ordena lo que se va a mostrar
+        ids = heapq.nsmallest(limit, result) if limit and len(result) > limit else sorted(result)
+        return [self.entries[i] for i in ids], len(result)
+
+
+class LibraryWatcher:
+    """Vigila la carpeta de la biblioteca y aplica los cambios al indice.
+    
+    En Linux usa inotify (via ctypes, sin dependencias); en el resto de
+    sistemas, o si inotify falla, compara cada LIBRARY_POLL_INTERVAL segundos
+    el tamaño/mtime de los archivos (sin releer etiquetas). Los eventos se
+    agrupan hasta que la carpeta lleva LIBRARY_WATCH_SETTLE segundos quieta
+    y se entregan de una vez con on_delta(entradas_nuevas, rutas_borradas),
+    desde el hilo del vigilante. on_overflow() se llama si el kernel pierde
+    eventos y hace falta un escaneo completo.
+    """
+    
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct('iIII')
+    
+    def __init__(self, index, root, on_delta, on_overflow=None, poll_interval=LIBRARY_POLL_INTERVAL):
+        self.index = index
+        self.root = os.path.abspath(root)
+        self.on_delta = on_delta
+        self.on_overflow = on_overflow
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._fd = None
+        self._libc = None
+        self._watches = {}  # wd -> carpeta
+        self._pending = {}  # ruta -> 'changed' | 'removed'
+        
+    def start(self):
+        if sys.platform.startswith('linux') and self._init_inotify():
+            self.mode = 'inotify'
+            target = self._run_inotify
+        else:
+            self.mode = 'polling'
+            target = self._run_polling
+        self._thread = threading.Thread(target=target, name="library-watch", daemon=True)
+        self._thread.start()
+        return self
+        
+    def stop(self):
+        self._stop.set()
+        
+    def _flush(self):
+        """Aplica los cambios pendientes al indice y avisa con on_delta"""
+        pending, self._pending = self._pending, {}
+        added, removed = [], []
+        for path, kind in pending.items():
+            try:
+                if kind == 'removed':
+                    removed.extend(self.index.remove_path(path))
+                else:
+                    entry = self.index.add_file(path, self.root)
+                    if entry:
+                        added.append(entry)
+            except Exception as e:
+                print(f"[Biblioteca] Error aplicando cambio en {path}: {e}")
+        if (added or removed) and not self._stop.is_set():
+            self.on_delta(added, removed)
+            
+    # --- inotify ---
+    
+    def _init_inotify(self):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+            fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+        if fd < 0:
+            return False
+        self._libc = libc
+        self._fd = fd
+        if not self._watch_tree(self.root, report_files=False):
+            os.close(fd)
+            self._fd = None
+            return False
+        return True
+        
+    def _watch_tree(self, folder, report_files=True):
+        """Añade un watch por carpeta (inotify no es recursivo). False si no cabe"""
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(current), self.WATCH_MASK)
+            if wd < 0:
+                if ctypes.get_errno() == errno.ENOSPC:
+                    # Limite de max_user_watches: mejor sondear que ver a medias
+                    return False
+                continue
+            self._watches[wd] = current
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif report_files:
+                            # Carpeta nueva (o movida dentro): sus archivos no generan eventos
+                            self._pending[entry.path] = 'changed'
+            except OSError:
+                continue
+        return True
+        
+    def _unwatch_tree(self, folder):
+        # Una carpeta movida fuera conserva sus watches con la ruta vieja
+        for wd, watched in list(self._watches.items()):
+            if watched == folder or watched.startswith(folder + os.sep):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+                
+    def _run_inotify(self):
+        settle_deadline = None
+        try:
+            while not self._stop.is_set():
+                timeout = LIBRARY_WATCH_SETTLE if settle_deadline is None else max(0.0, settle_deadline - time.monotonic())
+                ready, _, _ = select.select([self._fd], [], [], min(timeout, 1.0))
+                if ready:
+                    try:
+                        data = os.read(self._fd, 64 * 1024)
+                    except BlockingIOError:
+                        continue
+                    if self._read_events(data) == 'overflow':
+                        self._pending.clear()
+                        if self.on_overflow:
+                            self.on_overflow()
+                    if self._pending:
+                        # Se espera a que la carpeta se calme antes de leer etiquetas
+                        settle_deadline = time.monotonic() + LIBRARY_WATCH_SETTLE
+                elif settle_deadline is not None and time.monotonic() >= settle_deadline:
+                    settle_deadline = None
+                    self._flush()
+        except Exception as e:
+            print(f"[Biblioteca] Vigilancia detenida: {e}")
+        finally:
+            os.close(self._fd)
+            
+    def _read_events(self, data):
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            
+            if mask & self.IN_Q_OVERFLOW:
+                return 'overflow'
+            if mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            folder = self._watches.get(wd)
+            if folder is None or not name or name.startswith('.'):
+                continue
+            path = os.path.join(folder, name)
+            if mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                self._pending[path] = 'removed'
+                if mask & self.IN_ISDIR:
+                    self._unwatch_tree(path)
+            elif mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self._watch_tree(path)
+            elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                self._pending[path] = 'changed'
+        return None
+        
+    # --- sondeo ---
+    
+    def _run_polling(self):
+        try:
+            snapshot = self.index.walk(self.root)
+        except Exception:
+            snapshot = {}
+        while not self._stop.wait(self.poll_interval):
+            try:
+                current = self.index.walk(self.root)
+            except Exception as e:
+                print(f"[Biblioteca] Error sondeando {self.root}: {e}")
+                continue
+            for path, stat in current.items():
+                if snapshot.get(path) != stat:
+                    self._pending[path] = 'changed'
+            for path in snapshot.keys() - current.keys():
+                self._pending[path] = 'removed'
+            snapshot = current
+            if self._pending:
+                self._flush()
+
+
+class ScratchDir:
+    """Carpeta de trabajo propia para archivos intermedios (previews descargados).
+    
+    Cada archivo sale de lease(tipo, clave): un nombre fijo por clave (sin
+    marcas de tiempo ni listados de la carpeta temporal) que queda protegido
+    hasta release(), que lo borra junto con sus restos (.part, .webm antes
+    de convertir...). Lo no reservado caduca a los max_age segundos y la
+    carpeta no pasa de max_mb: se borra primero lo mas antiguo.
+    """
+    
+    # Lo que dejaban versiones anteriores en la carpeta temporal del sistema.
+    # Solo con nuestro prefijo: un preview_<ts> suelto puede ser de otro programa
+    LEGACY_TEMP_FILES = re.compile(r'^dukator_preview_\d+(\.\w+)?$')
+    
+    def __init__(self, root_dir, max_mb=SCRATCH_MAX_MB, max_age=SCRATCH_MAX_AGE):
+        self.root_dir = root_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age = max_age
+        self.leases = {}  # ruta base -> reservas activas
+        self._lock = threading.Lock()
+        os.makedirs(self.root_dir, exist_ok=True)
+        
+    def lease(self, kind, key):
+        """Ruta base (sin extension) reservada para key; la extension la pone quien escribe"""
+        stem = os.path.join(self.root_dir, f"{kind}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}")
+        with self._lock:
+            self.leases[stem] = self.leases.get(stem, 0) + 1
+        self.sweep()
+        return stem
+        
+    def release(self, stem):
+        with self._lock:
+            count = self.leases.get(stem, 0) - 1
+            if count > 0:
+                # Otra sesion (p. ej. el mismo preview relanzado) sigue usandolo
+                self.leases[stem] = count
+                return
+            self.leases.pop(stem, None)
+        for _mtime, _size, path in self._entries():
+            if self._stem(path) == stem:
+                self._remove(path)
+                
+    def _stem(self, path):
+        return os.path.join(self.root_dir, os.path.basename(path).split('.', 1)[0])
+        
+    def _entries(self):
+        entries = []
+        try:
+            with os.scandir(self.root_dir) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError:
+            pass
+        return entries
+        
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+            
+    def sweep(self, everything=False):
+        """Borra lo caducado (o, al arrancar, todo lo no reservado) y aplica la cuota"""
+        now = time.time()
+        with self._lock:
+            leased = set(self.leases)
+        entries = sorted(entry for entry in self._entries() if self._stem(entry[2]) not in leased)
+        total = sum(size for _, size, _ in self._entries())
+        removed = 0
+        for mtime, size, path in entries:
+            if everything or now - mtime > self.max_age or total > self.max_bytes:
+                if self._remove(path):
+                    total -= size
+                    removed += 1
+        return removed
+        
+    def sweep_legacy(self, temp_dir=None):
+        """Una vez al arrancar: restos de previews de versiones anteriores en el temp del sistema"""
+        temp_dir = temp_dir or tempfile.gettempdir()
+        removed = 0
+        try:
+            names = os.listdir(temp_dir)
+        except OSError:
+            return 0
+        for name in names:
+            if self.LEGACY_TEMP_FILES.match(name) and self._remove(os.path.join(temp_dir, name)):
+                removed += 1
+        return removed
+        
+    def startup_sweep(self):
+        removed = self.sweep(everything=True) + self.sweep_legacy()
+        if removed:
+            print(f"[Scratch] Eliminados {removed} archivos temporales de sesiones anteriores")
+        return removed
+
+
+class PartialStore:
+    """Carpeta de descargas parciales (.part) reanudables, validadas con un sidecar JSON"""
+    
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+        
+    def dir_for(self, output_folder):
+        """Subcarpeta por destino: dos albumes con "01 - Intro" no comparten parcial"""
+        key = hashlib.sha1(os.path.abspath(output_folder).encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(self.root_dir, key)
+        os.makedirs(path, exist_ok=True)
+        return path
+        
+    def _fingerprint(self, info):
+        return {
+            'extractor': info.get('extractor_key') or info.get('extractor'),
+            'id': info.get('id'),
+            'format_id': info.get('format_id'),
+            'filesize': info.get('filesize') or info.get('filesize_approx'),
+        }
+        
+    def prepare(self, ydl, info):
+        """Conserva el .part solo si es del mismo medio y formato; si no, lo borra"""
+        part_path = ydl.prepare_filename(info, 'temp') + '.part'
+        meta_path = part_path + '.json'
+        fingerprint = self._fingerprint(info)
+        
+        if os.path.exists(part_path):
+            valid = False
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    saved = json.load(f)
+                valid = all(saved.get(k) == fingerprint[k] for k in ('extractor', 'id', 'format_id'))
+                if valid and fingerprint['filesize']:
+                    valid = os.path.getsize(part_path) <= fingerprint['filesize']
+            except (OSError, ValueError):
+                valid = False
+            if valid:
+                print(f"[Partial] Reanudando {os.path.basename(part_path)} ({os.path.getsize(part_path) // 1024} KB)")
+            else:
+                self._remove(part_path)
+                
+        try:
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump(fingerprint, f)
+        except OSError:
+            pass
+        return part_path
+        
+    def finish(self, part_path):
+        self._remove(part_path + '.json')
+        
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+            
+    def sweep(self, max_age_days):
+        """Borra parciales abandonados mas antiguos que max_age_days"""
+        limit = time.time() - max_age_days * 86400
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(self.root_dir, topdown=False):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) < limit:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+            if dirpath != self.root_dir:
+                try:
+                    os.rmdir(dirpath)  # solo si ha quedado vacia
+                except OSError:
+                    pass
+        if removed:
+            print(f"[Partial] Eliminados {removed} parciales caducados")
+        return removed
+
+
+class DownloadPipeline:
+    """Motor por etapas (red -> FFmpeg -> etiquetas) con colas acotadas entre ellas.
+    
+    Cada etapa es (nombre, funcion, hilos, tamano de cola). La funcion recibe
+    el item y lo devuelve para la siguiente etapa; si lanza una excepcion el
+    item termina como fallido. on_done(item, error) se llama una vez por item.
+    Una cola llena bloquea a la etapa anterior (backpressure): la red deja de
+    bajar pistas si FFmpeg no da abasto. Cada item procesado es un span del
+    tracer en el hilo de la etapa.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, stages, on_done, tracer=None):
+        self.on_done = on_done
+        self.tracer = tracer or SessionTracer(None)
+        self.started = time.time()
+        self.stages = []
+        for name, func, workers, queue_size in stages:
+            self.stages.append({
+                'name': name,
+                'func': func,
+                'workers': max(1, workers),
+                'queue': queue.Queue(maxsize=queue_size),
+                'lock': threading.Lock(),
+                'active': 0,
+                'busy': 0.0,
+                'processed': 0,
+                'threads': [],
+            })
+        for index, stage in enumerate(self.stages):
+            for n in range(stage['workers']):
+                thread = threading.Thread(
+                    target=self._worker, args=(index,),
+                    name=f"{stage['name']}-{n}", daemon=True
+                )
+                thread.start()
+                stage['threads'].append(thread)
+                
+    def submit(self, item):
+        self.stages[0]['queue'].put(item)
+        
+    def _worker(self, index):
+        stage = self.stages[index]
+        while True:
+            item = stage['queue'].get()
+            if item is self._STOP:
+                break
+            with stage['lock']:
+                stage['active'] += 1
+            start = time.time()
+            label = (item.get('track') or {}).get('title') or item.get('url') or ''
+            try:
+                with self.tracer.span(stage['name'], 'pipeline', job=item.get('job_id') or '', item=label):
+                    result, error = stage['func'](item), None
+            except Exception as e:
+                result, error = None, e
+            with stage['lock']:
+                stage['active'] -= 1
+                stage['busy'] += time.time() - start
+                stage['processed'] += 1
+                
+            if error is not None:
+                self._finish(item, error)
+            elif index + 1 < len(self.stages):
+                self.stages[index + 1]['queue'].put(result)
+            else:
+                self._finish(result, None)
+                
+    def _finish(self, item, error):
+        try:
+            self.on_done(item, error)
+        except Exception as e:
+            print(f"[Pipeline] Error en on_done: {str(e)[:80]}")
+            
+    def close(self):
+        """Para las etapas en orden (cada una vacia su cola antes de parar)"""
+        for stage in self.stages:
+            for _ in stage['threads']:
+                stage['queue'].put(self._STOP)
+            for thread in stage['threads']:
+                thread.join()
+                
+    def stats(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        result = []
+        for stage in self.stages:
+            with stage['lock']:
+                result.append({
+                    'name': stage['name'],
+                    'workers': stage['workers'],
+                    'active': stage['active'],
+                    'processed': stage['processed'],
+                    'utilisation': min(1.0, stage['busy'] / (stage['workers'] * elapsed)),
+                    'queued': stage['queue'].qsize(),
+                    'queue_max': stage['queue'].maxsize,
+                })
+        return result
+        
+    def describe(self):
+        """Resumen de una linea para el overlay: hilos activos, % de uso y cola"""
+        parts = []
+        for st in self.stats():
+            text = f"{st['name']} {st['active']}/{st['workers']} ({int(st['utilisation'] * 100)}%)"
+            if st['queued']:
+                text += f" cola {st['queued']}"
+            parts.append(text)
+        return "  •  ".join(parts)
+
+
+class CandidateScorer:
+    """Puntua candidatos de busqueda frente a la pista pedida (0..1)"""
+    
+    @staticmethod
+    def normalize(text):
+        text = (text or '').lower()
+        text = re.sub(r'[\(\)\[\]\{\}\-_.,:;!?\'"/|]+', ' ', text)
+        return ' '.join(text.split())
+    
+    @classmethod
+    def score(cls, track, candidate, rank=0, total_sources=1):
+        wanted = cls.normalize(track.get('title', ''))
+        artist = cls.normalize(track.get('artist', ''))
+        found = cls.normalize(f"{candidate.get('title', '')} {candidate.get('uploader', '')}")
+        if not wanted or not found:
+            return 0.0
+        
+        # Palabras del titulo presentes en el candidato + parecido global
+        words = wanted.split()
+        coverage = sum(1 for w in words if w in found.split()) / len(words)
+        similarity = SequenceMatcher(None, f"{artist} {wanted}".strip(), found).ratio()
+        score = 0.45 * coverage + 0.2 * similarity
+        
+        if artist and artist in found:
+            score += 0.15
+            
+        # Duracion: MusicBrainz da ms, los buscadores segundos
+        expected = (track.get('duration_ms') or 0) / 1000
+        duration = candidate.get('duration') or 0
+        if expected and duration:
+            score += 0.2 * max(0.0, 1 - abs(expected - duration) / 30)
+        else:
+            score += 0.1
+            
+        for word in CANDIDATE_PENALTY_WORDS:
+            if word in found and word not in wanted:
+                score -= 0.3
+                
+        # Desempate por prioridad de la fuente (orden de DOWNLOAD_SOURCES)
+        if total_sources > 1:
+            score += 0.05 * (1 - rank / (total_sources - 1))
+        return max(0.0, min(1.0, score))
+
+
+def detect_image_mime(data):
+    """MIME real de una imagen por sus bytes iniciales (no todas las caratulas son JPEG)"""
+    if not data:
+        return None
+    if data[:3] == b'\xff\xd8\xff':
+        return 'image/jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+IMAGE_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp'}
+
+
 class CoverArtFetcher:
-    """Obtiene carátulas de Cover Art Archive (gratuito, sin API key)"""
+    """Obtiene carátulas de Cover Art Archive (gratuito, sin API key).
+    
+    Cache en disco por release id (LRU por tamaño total) mas una pequeña
+    cache en memoria: load_tracks y download_album_tracks piden la misma
+    caratula y solo la primera llamada toca la red.
+    """
     
+    cache_dir = None
+    ffmpeg_path = None
+    max_bytes = DEFAULT_COVER_CACHE_MB * 1024 * 1024
+    _memory = {}
+    _memory_order = []
+    _lock = threading.Lock()
+    
+    @classmethod
+    def configure(cls, cache_dir, max_mb=DEFAULT_COVER_CACHE_MB, ffmpeg_path=None):
+        cls.cache_dir = cache_dir
+        cls.ffmpeg_path = ffmpeg_path
+        cls.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(cache_dir, exist_ok=True)
+        
     @classmethod
     def get_cover(cls, release_id):
+        if not release_id:
+            return None
+        with cls._lock:
+            if release_id in cls._memory:
+                return cls._memory[release_id]
+                
+        data = cls._read_disk(release_id)
+        if data is None:
+            data = cls._download(release_id)
+            if data:
+                data = cls._normalize(data)
+                cls._write_disk(release_id, data)
+        if data:
+            # Los fallos no se recuerdan: un timeout no deja sin caratula al resto del album
+            cls._remember(release_id, data)
+        return data
+        
+    @classmethod
+    def cover_path(cls, release_id):
+        """Ruta de la caratula cacheada en disco (para FFmpeg), o None"""
+        if not cls.cache_dir or not release_id:
+            return None
+        for ext in IMAGE_EXTENSIONS.values():
+            path = os.path.join(cls.cache_dir, f"{release_id}.{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+        
+    @classmethod
+    def _normalize(cls, data):
+        """Una sola vez por album: JPEG de como mucho COVER_MAX_SIZE px de lado"""
+        if detect_image_mime(data) == 'image/jpeg' and len(data) <= COVER_MAX_BYTES:
+            return data
+        cmd = [cls.ffmpeg_path or 'ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+               '-vf', f"scale='min({COVER_MAX_SIZE},iw)':'min({COVER_MAX_SIZE},ih)':force_original_aspect_ratio=decrease",
+               '-frames:v', '1', '-q:v', '3', '-f', 'image2pipe', '-c:v', 'mjpeg', 'pipe:1']
+        kwargs = {}
+        if sys.platform == 'win32':
+            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
         try:
-            url = f"https://coverartarchive.org/release/{release_id}"
-            headers = {
-                "User-Agent": "DUKATOR/2.0 (https://github.com/dukator)",
-                "Accept": "application/json"
-            }
-            response = requests.get(url, headers=headers, timeout=10)
+            proc = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=30, **kwargs)
+            if proc.returncode == 0 and detect_image_mime(proc.stdout) == 'image/jpeg':
+                return proc.stdout
+        except (OSError, subprocess.SubprocessError):
+            pass
+        return data
+        
+    @classmethod
+    def _remember(cls, release_id, data):
+        with cls._lock:
+            cls._memory[release_id] = data
+            if release_id in cls._memory_order:
+                cls._memory_order.remove(release_id)
+            cls._memory_order.append(release_id)
+            while len(cls._memory_order) > COVER_MEMORY_ITEMS:
+                cls._memory.pop(cls._memory_order.pop(0), None)
+                
+    @classmethod
+    def _read_disk(cls, release_id):
+        path = cls.cover_path(release_id)
+        if not path:
+            return None
+        try:
+            os.utime(path)  # LRU: la fecha de modificacion marca el ultimo uso
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+            
+    @classmethod
+    def _write_disk(cls, release_id, data):
+        if not cls.cache_dir:
+            return
+        ext = IMAGE_EXTENSIONS.get(detect_image_mime(data), 'jpg')
+        # Temporal en la misma carpeta y rename atomico: un corte no deja una caratula a medias
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cls.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(cls.cache_dir, f"{release_id}.{ext}"))
+            tmp_path = None
+            cls._evict()
+        except OSError:
+            pass
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            
+    @classmethod
+    def _evict(cls):
+        entries = []
+        for name in os.listdir(cls.cache_dir):
+            path = os.path.join(cls.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= cls.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+                
+    @classmethod
+    def _download(cls, release_id):
+        try:
+            url = f"{COVER_ART_ARCHIVE}/release/{release_id}"
+            headers = {"Accept": "application/json"}
+            response = HTTP.get(url, headers=headers)
             if response.status_code == 200:
                 data = response.json()
                 images = data.get('images', [])
                 for img in images:
                     if img.get('front'):
-                        img_url = img.get('image', '')
-                        img_response = requests.get(img_url, timeout=15)
-                        if img_response.status_code == 200:
-                            return img_response.content
+                        # Miniatura acotada (JPEG) en vez del original de varios MB
+                        thumbnails = img.get('thumbnails', {})
+                        candidates = [thumbnails.get(size) for size in COVER_THUMBNAIL_SIZES] + [img.get('image', '')]
+                        for img_url in candidates:
+                            if not img_url:
+                                continue
+                            img_response = HTTP.get(img_url)
+                            if img_response.status_code == 200:
+                                return img_response.content
             return None
         except:
             return None
 
 
 class AudioPlayer:
-    def __init__(self, status_callback=None):
+    """Previews de 30 s.
+    
+    Por defecto en streaming: yt-dlp solo resuelve la URL del formato de
+    audio mas ligero que sirve (PREVIEW_STREAM_FORMAT) y FFmpeg la lee con
+    -t, decodificando a PCM por una tuberia; los trozos se encolan en un
+    canal de pygame segun llegan, asi que suena en cuanto hay el primero y
+    no se baja mas de lo que se escucha. Sin FFmpeg, o si el stream falla
+    antes de sonar, se vuelve a descargar y convertir el audio a disco.
+    
+    Con preview_cache, un preview escuchado entero (o preparado con
+    prefetch) se guarda decodificado y la siguiente vez suena al instante.
+    """
+    
+    def __init__(self, status_callback=None, resolve_query=None, ffmpeg_path=None, preview_cache=None, scratch=None, tracer=None):
         self.is_playing = False
         self.is_paused = False
         self.current_file = None
@@ -181,8 +1803,33 @@ class AudioPlayer:
         self.start_time = 0
         self.preview_duration = 30
         self.progress_callback = None
+        # Busqueda -> candidatos (la app pasa la suya, cacheada y compartida con las descargas)
+        self.resolve_query = resolve_query
+        self.ffmpeg_path = ffmpeg_path
+        self.tracer = tracer or SessionTracer(None)
+        self.volume = 1.0
+        # Cada play_* abre una sesion: un hilo de una sesion anterior se retira solo
+        self.session = 0
+        self.channel = None
+        self.stream_process = None
+        self.stream_url = None
+        # Previews ya decodificados y la cola (de un hilo) que los prepara por adelantado
+        self.preview_cache = preview_cache
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.prefetch_generation = 0
+        self.prefetch_process = None
+        self.closed = False
+        # Archivos del fallback por descarga: nombre fijo por URL, borrados al terminar
+        self.scratch = scratch or ScratchDir(os.path.join(tempfile.gettempdir(), "dukator_scratch"))
         
     def play_preview(self, search_query, on_complete=None, progress_callback=None):
+        self._start(self._play_preview_thread, search_query, on_complete, progress_callback)
+        
+    def play_url(self, video_url, on_complete=None, progress_callback=None):
+        """Preview de un resultado concreto (pestaña Canciones): sin busqueda previa"""
+        self._start(self._play_url_thread, video_url, on_complete, progress_callback)
+        
+    def _start(self, target, arg, on_complete, progress_callback):
         self.progress_callback = progress_callback
         if not PYGAME_AVAILABLE:
             if self.status_callback:
@@ -191,92 +1838,339 @@ class AudioPlayer:
             
         self.stop()
         self.stop_flag = False
+        self.session += 1
         
         self.preview_thread = threading.Thread(
-            target=self._play_preview_thread,
-            args=(search_query, on_complete),
+            target=self._run_session,
+            args=(target, arg, on_complete, self.session),
+            name=f"preview-{self.session}",
             daemon=True
         )
         self.preview_thread.start()
         
-    def _play_preview_thread(self, search_query, on_complete):
+    def _run_session(self, target, arg, on_complete, session):
+        """Cuerpo del hilo de preview: una sesion de traza propia (o parte de un lote en curso)"""
+        trace = self.tracer.begin('preview')
         try:
-            import yt_dlp
+            target(arg, on_complete, session)
+        finally:
+            self.tracer.end(trace)
             
-            temp_dir = tempfile.gettempdir()
-            temp_file = os.path.join(temp_dir, f"dukator_preview_{int(time.time())}.mp3")
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': temp_file.replace('.mp3', '.%(ext)s'),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '128',
-                }],
-                'quiet': True,
-                'no_warnings': True,
-                'duration_limit': self.preview_duration + 5,
-            }
+    def _traced(self, name, func, *args):
+        with self.tracer.span(name, 'preview'):
+            return func(*args)
             
-            url = "https://www.youtube.com/results"
-            params = {"search_query": search_query}
-            response = requests.get(url, params=params, timeout=30)
-            match = re.search(r'"videoId":"([^"]+)"', response.text)
+    def _active(self, session):
+        return session == self.session and not self.stop_flag
+        
+    def _play_preview_thread(self, search_query, on_complete, session):
+        try:
+            if self.resolve_query:
+                candidates = self._traced('preview_resolve', self.resolve_query, search_query)
+                video_url = candidates[0]['url'] if candidates else None
+            else:
+                url = "https://www.youtube.com/results"
+                params = {"search_query": search_query}
+                response = HTTP.get(url, params=params, browser=True)
+                match = re.search(r'"videoId":"([^"]+)"', response.text)
+                video_url = f"https://www.youtube.com/watch?v={match.group(1)}" if match else None
             
-            if not match:
+            if not video_url:
                 if self.status_callback:
                     self.status_callback("No encontrado en YouTube")
                 return
-                
-            video_id = match.group(1)
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
+        except Exception as e:
+            if self.status_callback:
+                self.status_callback(f"Error en preview: {str(e)}")
+            return
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(video_url, download=True)
-                self.current_track_name = info.get('title', 'Preview')
+        self._play_url_thread(video_url, on_complete, session)
+        
+    def _play_url_thread(self, video_url, on_complete, session):
+        try:
+            if (not self._traced('preview_cached', self._play_cached, video_url, session)
+                    and not self._traced('preview_stream', self._play_stream, video_url, session)
+                    and self._active(session)):
+                self._traced('preview_download', self._play_download, video_url, session)
                 
-            if os.path.exists(temp_file):
-                self.current_file = temp_file
-                pygame.mixer.music.load(temp_file)
-                pygame.mixer.music.play()
-                self.is_playing = True
-                self.is_paused = False
-                self.start_time = time.time()
+            if self.status_callback and self._active(session):
+                self.status_callback("Preview finalizado")
                 
-                if self.status_callback:
-                    self.status_callback(f"▶ Reproduciendo: {self.current_track_name[:50]}")
-                    
-                while pygame.mixer.music.get_busy() and not self.stop_flag:
-                    elapsed = time.time() - self.start_time
-                    # Actualizar progreso visual
-                    if self.progress_callback:
-                        try:
-                            self.progress_callback(elapsed, self.preview_duration)
-                        except:
-                            pass
-                    if elapsed >= self.preview_duration and self.is_playing:
-                        pygame.mixer.music.stop()
-                        break
-                    time.sleep(0.1)
-                    
-                if self.status_callback and not self.stop_flag:
-                    self.status_callback("Preview finalizado")
-                    
-                try:
-                    os.remove(temp_file)
-                except:
-                    pass
-                    
+        except Exception as e:
+            if self.status_callback:
+                self.status_callback(f"Error en preview: {str(e)}")
+                
+        finally:
             if on_complete:
                 on_complete()
                 
+    def _started(self, session):
+        self.is_playing = True
+        self.is_paused = False
+        self.start_time = time.time()
+        if self.status_callback:
+            self.status_callback(f"▶ Reproduciendo: {self.current_track_name[:50]}")
+            
+    def _report_progress(self):
+        elapsed = time.time() - self.start_time
+        # Actualizar progreso visual
+        if self.progress_callback:
+            try:
+                self.progress_callback(elapsed, self.preview_duration)
+            except:
+                pass
+        return elapsed
+        
+    def _mixer_format(self):
+        """(frecuencia, canales) del mixer si admite PCM s16le; None si no"""
+        mixer = pygame.mixer.get_init() if PYGAME_AVAILABLE else None
+        if not mixer or abs(mixer[1]) != 16:
+            return None
+        return mixer[0], mixer[2]
+        
+    def _open_stream(self, video_url):
+        """Lanza FFmpeg decodificando el preview a PCM. (proceso, titulo) o None"""
+        ffmpeg = self.ffmpeg_path or 'ffmpeg'
+        mixer = self._mixer_format()
+        if not mixer or not shutil.which(ffmpeg):
+            return None
+        freq, channels = mixer
+        
+        try:
+            with yt_dlp.YoutubeDL({'format': PREVIEW_STREAM_FORMAT, 'quiet': True, 'no_warnings': True}) as ydl:
+                info = ydl.extract_info(video_url, download=False)
         except Exception as e:
-            if self.status_callback:
-                self.status_callback(f"Error en preview: {str(e)}")
+            print(f"[Preview] Sin stream para {video_url}: {e}")
+            return None
+        stream_url = info.get('url')
+        if not stream_url:
+            return None
+        
+        cmd = [ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin']
+        headers = info.get('http_headers') or {}
+        if headers:
+            cmd += ['-headers', ''.join(f"{k}: {v}\r\n" for k, v in headers.items())]
+        if stream_url.startswith('http'):
+            cmd += ['-reconnect', '1', '-reconnect_streamed', '1']
+        cmd += ['-i', stream_url, '-t', str(self.preview_duration), '-vn',
+                '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', str(channels), '-ar', str(freq), 'pipe:1']
+        kwargs = {}
+        if sys.platform == 'win32':
+            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, **kwargs)
+        except OSError:
+            return None
+        return process, info.get('title', 'Preview')
+        
+    def _play_cached(self, video_url, session):
+        mixer = self._mixer_format()
+        if not self.preview_cache or not mixer:
+            return False
+        cached = self.preview_cache.open(self.preview_cache.key_for(video_url), *mixer)
+        if not cached:
+            return False
+        meta, f = cached
+        self.current_track_name = meta.get('title') or 'Preview'
+        with f:
+            started, _ = self._play_pcm(f.read, session)
+        return started
+        
+    def _play_stream(self, video_url, session):
+        """Preview en streaming. False si no se pudo empezar a sonar (toca el fallback)"""
+        opened = self._open_stream(video_url)
+        if not opened:
+            return False
+        process, title = opened
+        self.stream_process = process
+        self.stream_url = video_url
+        if not self._active(session):
+            process.kill()
+        self.current_track_name = title
+        
+        recorded = [] if self.preview_cache else None
+        try:
+            started, finished = self._play_pcm(process.stdout.read, session, recorded)
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            if self.stream_process is process:
+                self.stream_process = None
+                self.stream_url = None
+        # Solo se guarda un preview completo (no uno cortado por stop)
+        if finished and recorded and process.returncode == 0:
+            freq, channels = self._mixer_format()
+            self.preview_cache.put(self.preview_cache.key_for(video_url), title, freq, channels, b''.join(recorded))
+        return started
+        
+    def _play_pcm(self, read, session, recorded=None):
+        """Encola trozos de read() en un canal de pygame. Devuelve (empezo, llego_al_final)"""
+        freq, channels = self._mixer_format()
+        frame = 2 * channels
+        chunk_bytes = int(freq * PREVIEW_CHUNK_SECONDS) * frame
+        channel = None
+        finished = False
+        while self._active(session):
+            data = read(chunk_bytes)
+            if len(data) < frame:
+                finished = True
+                break
+            data = data[:len(data) - len(data) % frame]
+            if recorded is not None:
+                recorded.append(data)
+            sound = pygame.mixer.Sound(buffer=data)
+            if channel is None:
+                channel = pygame.mixer.find_channel(True)
+                channel.set_volume(self.volume)
+                self.channel = channel
+                channel.play(sound)
+                self._started(session)
+                continue
+            # Un trozo sonando y otro en cola: se espera a que quede hueco
+            while channel.get_queue() is not None and self._active(session):
+                self._report_progress()
+                time.sleep(0.02)
+            channel.queue(sound)
+            
+        while channel is not None and channel.get_busy() and self._active(session):
+            self._report_progress()
+            time.sleep(0.1)
+        return channel is not None, finished
+        
+    def prefetch(self, search_queries):
+        """Prepara en segundo plano (un hilo, por orden) los previews de estas busquedas.
+        
+        Una llamada nueva deja sin efecto lo que quedase pendiente de la anterior.
+        """
+        if self.closed or not self.preview_cache or not self._mixer_format():
+            return
+        self.prefetch_generation += 1
+        generation = self.prefetch_generation
+        for search_query in search_queries:
+            self.prefetch_pool.submit(self._prefetch_one, search_query, generation)
+            
+    def _prefetch_one(self, search_query, generation):
+        if generation != self.prefetch_generation or not self.resolve_query:
+            return
+        try:
+            candidates = self.resolve_query(search_query)
+            if not candidates or generation != self.prefetch_generation:
+                return
+            video_url = candidates[0]['url']
+            if video_url == self.stream_url:
+                # Ya suena en streaming: esa sesion lo guarda en la cache al terminar
+                return
+            key = self.preview_cache.key_for(video_url)
+            freq, channels = self._mixer_format()
+            cached = self.preview_cache.open(key, freq, channels)
+            if cached:
+                cached[1].close()
+                return
+            opened = self._open_stream(video_url)
+            if not opened:
+                return
+            process, title = opened
+            data = self._read_prefetch(process, generation, int(freq * PREVIEW_CHUNK_SECONDS) * 2 * channels)
+            if data:
+                self.preview_cache.put(key, title, freq, channels, data)
+        except Exception as e:
+            print(f"[Preview] Prefetch fallido para '{search_query}': {e}")
+            
+    def _read_prefetch(self, process, generation, chunk_bytes):
+        """PCM completo de FFmpeg, o None si se cancela, se atasca o falla.
+        
+        Lee por trozos para enterarse de un prefetch nuevo o de close(), y
+        FFmpeg se mata si pasa de PREVIEW_PREFETCH_TIMEOUT (stream atascado).
+        """
+        self.prefetch_process = process
+        watchdog = threading.Timer(PREVIEW_PREFETCH_TIMEOUT, process.kill)
+        watchdog.daemon = True
+        watchdog.start()
+        chunks = []
+        try:
+            while generation == self.prefetch_generation:
+                data = process.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                chunks.append(data)
+        finally:
+            watchdog.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            self.prefetch_process = None
+        if process.returncode != 0 or not chunks:
+            return None
+        return b''.join(chunks)
+        
+    def close(self):
+        """Al salir: para el preview, descarta los prefetch pendientes y corta el que este en curso"""
+        self.closed = True
+        self.stop()
+        self.prefetch_generation += 1
+        self.prefetch_pool.shutdown(wait=False, cancel_futures=True)
+        process = self.prefetch_process
+        if process and process.poll() is None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+            
+    def _play_download(self, video_url, session):
+        """Fallback: bajar el audio y convertirlo a MP3 antes de reproducir"""
+        stem = self.scratch.lease('preview', video_url)
+        try:
+            self._play_downloaded_file(video_url, stem, session)
+        finally:
+            self.scratch.release(stem)
+            
+    def _play_downloaded_file(self, video_url, stem, session):
+        temp_file = stem + '.mp3'
+        
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'outtmpl': stem + '.%(ext)s',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '128',
+            }],
+            'quiet': True,
+            'no_warnings': True,
+            'duration_limit': self.preview_duration + 5,
+        }
+        
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(video_url, download=True)
+            self.current_track_name = info.get('title', 'Preview')
+            
+        if os.path.exists(temp_file) and self._active(session):
+            self.current_file = temp_file
+            pygame.mixer.music.load(temp_file)
+            pygame.mixer.music.set_volume(self.volume)
+            pygame.mixer.music.play()
+            self._started(session)
+                
+            while pygame.mixer.music.get_busy() and self._active(session):
+                elapsed = self._report_progress()
+                if elapsed >= self.preview_duration and self.is_playing:
+                    pygame.mixer.music.stop()
+                    break
+                time.sleep(0.1)
+                
+            # Soltar el archivo (Windows no deja borrarlo abierto) antes de release()
+            if self.current_file == temp_file:
+                try:
+                    pygame.mixer.music.unload()
+                except:
+                    pass
+                self.current_file = None
                 
     def pause(self):
         if self.is_playing and not self.is_paused:
+            if self.channel:
+                self.channel.pause()
             pygame.mixer.music.pause()
             self.is_paused = True
             return True
@@ -284,6 +2178,8 @@ class AudioPlayer:
         
     def resume(self):
         if self.is_paused:
+            if self.channel:
+                self.channel.unpause()
             pygame.mixer.music.unpause()
             self.is_paused = False
             return True
@@ -293,20 +2189,29 @@ class AudioPlayer:
         self.stop_flag = True
         self.is_playing = False
         self.is_paused = False
+        process = self.stream_process
+        if process and process.poll() is None:
+            try:
+                process.kill()
+            except OSError:
+                pass
+        if self.channel:
+            try:
+                self.channel.stop()
+            except:
+                pass
+            self.channel = None
         try:
             pygame.mixer.music.stop()
         except:
             pass
-        if self.current_file:
-            try:
-                os.remove(self.current_file)
-            except:
-                pass
-        self.current_file = None
         
     def set_volume(self, volume):
+        self.volume = volume
         try:
             pygame.mixer.music.set_volume(volume)
+            if self.channel:
+                self.channel.set_volume(volume)
         except:
             pass
             
@@ -404,27 +2309,213 @@ class ProgressOverlay(ctk.CTkFrame):
             font=ctk.CTkFont(size=12),
             text_color=COLORS['text_secondary']
         )
-        self.counter_label.grid(row=5, column=0, pady=(0, 20))
+        self.counter_label.grid(row=5, column=0, pady=(0, 4))
+        
+        # Uso de cada etapa del pipeline (red / FFmpeg / etiquetas)
+        self.stages_label = ctk.CTkLabel(
+            self, text="",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_muted']
+        )
+        self.stages_label.grid(row=8, column=0, padx=20, pady=(0, 20))
+        
+        # Bytes, velocidad y ETA (agregado y por descarga en curso)
+        self.transfer_label = ctk.CTkLabel(
+            self, text="",
+            font=ctk.CTkFont(size=12),
+            text_color=COLORS['text_secondary']
+        )
+        self.transfer_label.grid(row=6, column=0, padx=20, pady=(0, 2))
+        
+        self.jobs_label = ctk.CTkLabel(
+            self, text="",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_muted'],
+            justify="left"
+        )
+        self.jobs_label.grid(row=7, column=0, padx=20, pady=(0, 4))
         
-    def update_progress(self, current, total, status="", source=""):
-        percent = int((current / total) * 100) if total > 0 else 0
-        self.percent_label.configure(text=f"{percent}%")
-        self.progress_bar.set(current / total if total > 0 else 0)
+        self.fraction = 0
+        
+    def update_progress(self, current, total, status="", source="", active=0):
+        # Nunca por debajo de lo que ya marcan los bytes de las pistas en curso
+        fraction = max(current / total if total > 0 else 0, self.fraction)
+        self.percent_label.configure(text=f"{int(fraction * 100)}%")
+        self.progress_bar.set(fraction)
         if status:
             self.status_label.configure(text=status[:50])
         if source:
             self.source_label.configure(text=source)
-        self.counter_label.configure(text=f"{current} / {total} canciones")
+        counter = f"{current} / {total} canciones"
+        if active:
+            counter += f"  •  {active} en curso"
+        self.counter_label.configure(text=counter)
+        
+    def update_stages(self, text):
+        self.stages_label.configure(text=text)
+        
+    def set_fraction(self, fraction):
+        """Avance contando los bytes de las pistas a medias, no solo las terminadas"""
+        self.fraction = fraction
+        self.percent_label.configure(text=f"{int(fraction * 100)}%")
+        self.progress_bar.set(fraction)
+        
+    def update_transfers(self, summary, job_lines):
+        self.transfer_label.configure(text=summary)
+        self.jobs_label.configure(text="\n".join(job_lines))
         
     def show(self):
+        self.fraction = 0
+        self.stages_label.configure(text="")
+        self.update_transfers("", [])
         self.place(relx=0.5, rely=0.5, anchor="center")
         self.lift()
         
     def hide(self):
         self.place_forget()
 
+class VirtualList(ctk.CTkFrame):
+    """Lista virtualizada: solo existen widgets para las filas visibles.
+    
+    Las filas salen de row_factory(parent) y se reciclan al hacer scroll;
+    cada una debe tener show(item) para pintarse a partir de su modelo (un
+    dict ligero) y medir como mucho row_height - row_gap de alto. El estado
+    vive en el modelo, no en la fila: se cambia el dict y se llama a
+    refresh(item), este visible o no.
+    """
+    
+    def __init__(self, master, row_factory, row_height, row_gap=6, empty_text="", **kwargs):
+        kwargs.setdefault('fg_color', COLORS['bg_secondary'])
+        kwargs.setdefault('corner_radius', 8)
+        super().__init__(master, **kwargs)
+        self.row_factory = row_factory
+        self.row_height = row_height
+        self.row_gap = row_gap
+        self.items = []
+        self.offset = 0
+        self.rows = []
+        self.bound = {}  # fila -> item que muestra
+        
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=0, column=0, sticky="nsew", padx=(6, 0), pady=4)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns", padx=2, pady=4)
+        self.empty_label = ctk.CTkLabel(self.body, text=empty_text, text_color=COLORS['text_muted'])
+        
+        self.body.bind("<Configure>", lambda e: self.render())
+        self.bind_all("<MouseWheel>", self.on_mousewheel, add="+")
+        self.bind_all("<Button-4>", self.on_mousewheel, add="+")
+        self.bind_all("<Button-5>", self.on_mousewheel, add="+")
+    
+    def set_items(self, items):
+        self.items = list(items)
+        self.offset = 0
+        self.render(force=True)
+    
+    def append(self, items):
+        self.items.extend(items)
+        self.render()
+    
+    def set_empty_text(self, text):
+        self.empty_label.configure(text=text)
+    
+    def refresh(self, item=None):
+        """Vuelve a pintar las filas que muestran item (o todas)"""
+        for row, bound_item in self.bound.items():
+            if bound_item is not None and (item is None or bound_item is item):
+                row.show(bound_item)
+    
+    def viewport_height(self):
+        # place() escala las coordenadas con el DPI: se trabaja sin escalar
+        return max(1, int(self._reverse_widget_scaling(self.body.winfo_height())))
+    
+    def total_height(self):
+        return len(self.items) * self.row_height
+    
+    def scroll_to(self, offset):
+        max_offset = max(0, self.total_height() - self.viewport_height())
+        offset = int(min(max(0, offset), max_offset))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+    
+    def yview(self, *args):
+        """Comando del scrollbar: ('moveto', f) o ('scroll', n, 'units'|'pages')"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * self.total_height())
+        elif args[0] == 'scroll':
+            step = self.row_height if args[2] == 'units' else self.viewport_height()
+            self.scroll_to(self.offset + int(args[1]) * step)
+    
+    def on_mousewheel(self, event):
+        # Solo si el puntero esta sobre esta lista (bind_all es global)
+        if not str(event.widget).startswith(str(self)):
+            return
+        if event.num == 4:
+            units = -3
+        elif event.num == 5:
+            units = 3
+        elif abs(event.delta) >= 120:
+            units = -3 * int(event.delta / 120)
+        else:
+            units = -event.delta
+        self.scroll_to(self.offset + units * self.row_height)
+    
+    def render(self, force=False):
+        viewport = self.viewport_height()
+        needed = viewport // self.row_height + 2
+        while len(self.rows) < needed:
+            row = self.row_factory(self.body)
+            self.rows.append(row)
+            self.bound[row] = None
+        
+        total = self.total_height()
+        max_offset = max(0, total - viewport)
+        self.offset = min(self.offset, max_offset)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + viewport) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        
+        if self.items:
+            self.empty_label.place_forget()
+        else:
+            self.empty_label.place(relx=0.5, y=20, anchor="n")
+        
+        first = self.offset // self.row_height
+        for k, row in enumerate(self.rows):
+            idx = first + k
+            if idx >= len(self.items):
+                if self.bound[row] is not None:
+                    row.place_forget()
+                    self.bound[row] = None
+                continue
+            item = self.items[idx]
+            if force or self.bound[row] is not item:
+                row.show(item)
+                self.bound[row] = item
+            row.place(x=0, y=idx * self.row_height - self.offset + self.row_gap // 2, relwidth=1.0)
+
+
 class TrackCard(ctk.CTkFrame):
-    def __init__(self, master, track_data, on_preview=None, **kwargs):
+    """Fila (reciclable) de la lista de canciones del album.
+    
+    El estado de descarga, la fuente y el preview viven en el track_data
+    ('status', 'source', 'playing'); la tarjeta solo los pinta en show().
+    """
+    
+    STATUS_ICONS = {
+        'pending': ('○', COLORS['text_secondary']),
+        'downloading': ('⏳', COLORS['accent']),
+        'success': ('✓', COLORS['action_play']),
+        'error': ('✗', COLORS['action_stop'])
+    }
+    
+    def __init__(self, master, on_preview=None, on_change=None, **kwargs):
         super().__init__(
             master,
             fg_color=COLORS['bg_card'],
@@ -434,13 +2525,12 @@ class TrackCard(ctk.CTkFrame):
             **kwargs
         )
         
-        self.track_data = track_data
+        self.track_data = None
         self.on_preview = on_preview
-        self.is_playing = False
-        self.download_source = None
+        self.on_change = on_change
         
         self.setup_ui()
-        
+    
     def setup_ui(self):
         inner_frame = ctk.CTkFrame(self, fg_color="transparent")
         inner_frame.pack(fill="x", padx=8, pady=6)
@@ -448,7 +2538,6 @@ class TrackCard(ctk.CTkFrame):
         self.checkbox = ctk.CTkCheckBox(
             inner_frame,
             text="",
-            variable=self.track_data['selected'],
             fg_color=COLORS['accent'],
             hover_color=COLORS['accent_hover'],
             border_color=COLORS['border_light'],
@@ -457,14 +2546,14 @@ class TrackCard(ctk.CTkFrame):
         )
         self.checkbox.pack(side="left", padx=(0, 8))
         
-        num_label = ctk.CTkLabel(
+        self.num_label = ctk.CTkLabel(
             inner_frame,
-            text=f"{self.track_data['number']:02d}",
+            text="",
             font=ctk.CTkFont(size=11, weight="bold"),
             text_color=COLORS['text_secondary'],
             width=25
         )
-        num_label.pack(side="left", padx=(0, 8))
+        self.num_label.pack(side="left", padx=(0, 8))
         
         self.status_label = ctk.CTkLabel(
             inner_frame,
@@ -475,14 +2564,14 @@ class TrackCard(ctk.CTkFrame):
         )
         self.status_label.pack(side="left", padx=(0, 5))
         
-        title_label = ctk.CTkLabel(
+        self.title_label = ctk.CTkLabel(
             inner_frame,
-            text=self.track_data['title'][:60],
+            text="",
             font=ctk.CTkFont(size=13),
             text_color=COLORS['text_primary'],
             anchor="w"
         )
-        title_label.pack(side="left", fill="x", expand=True, padx=(0, 10))
+        self.title_label.pack(side="left", fill="x", expand=True, padx=(0, 10))
         
         self.source_label = ctk.CTkLabel(
             inner_frame,
@@ -493,72 +2582,725 @@ class TrackCard(ctk.CTkFrame):
         )
         self.source_label.pack(side="left", padx=(0, 5))
         
-        duration_sec = self.track_data['duration_ms'] // 1000
-        mins = duration_sec // 60
-        secs = duration_sec % 60
-        
-        duration_label = ctk.CTkLabel(
+        self.duration_label = ctk.CTkLabel(
             inner_frame,
-            text=f"{mins}:{secs:02d}",
+            text="",
             font=ctk.CTkFont(size=11),
             text_color=COLORS['text_secondary'],
             width=45
         )
-        duration_label.pack(side="left", padx=(0, 10))
+        self.duration_label.pack(side="left", padx=(0, 10))
+        
+        self.preview_btn = ctk.CTkButton(
+            inner_frame,
+            text="▶",
+            font=ctk.CTkFont(size=14),
+            width=32,
+            height=28,
+            fg_color=COLORS['bg_secondary'],
+            hover_color=COLORS['accent'],
+            corner_radius=6,
+            command=self.toggle_preview
+        )
+        self.preview_btn.pack(side="right")
+    
+    def show(self, track_data):
+        if track_data is not self.track_data:
+            self.track_data = track_data
+            self.checkbox.configure(variable=track_data['selected'])
+            self.num_label.configure(text=f"{track_data['number']:02d}")
+            self.title_label.configure(text=track_data['title'][:60])
+            duration_sec = track_data['duration_ms'] // 1000
+            mins = duration_sec // 60
+            secs = duration_sec % 60
+            self.duration_label.configure(text=f"{mins}:{secs:02d}")
+        
+        icon, color = self.STATUS_ICONS.get(track_data.get('status'), self.STATUS_ICONS['pending'])
+        self.status_label.configure(text=icon, text_color=color)
+        self.source_label.configure(text=track_data.get('source') or "")
+        if track_data.get('playing'):
+            self.preview_btn.configure(text="⏹", fg_color=COLORS['action_stop'])
+        else:
+            self.preview_btn.configure(text="▶", fg_color=COLORS['bg_secondary'])
+    
+    @staticmethod
+    def preview_query(track):
+        return f"{track.get('artist', '')} {track['title']} audio"
+        
+    def toggle_preview(self):
+        track = self.track_data
+        if track is None:
+            return
+        if track.get('playing'):
+            track['playing'] = False
+            if self.on_preview:
+                self.on_preview(None, stop=True)
+        else:
+            if self.on_preview:
+                search_query = self.preview_query(track)
+                self.on_preview(search_query, callback=lambda t=track: self.on_preview_complete(t))
+            track['playing'] = True
+        if self.on_change:
+            self.on_change(track)
+    
+    def on_preview_complete(self, track):
+        # Llega desde el hilo del reproductor: on_change pasa por el bus de la app
+        track['playing'] = False
+        if self.on_change:
+            self.on_change(track)
+
+
+class SongResultRow(ctk.CTkFrame):
+    """Fila (reciclable) de resultados de la pestaña Canciones"""
+    
+    def __init__(self, master, on_preview=None, on_download=None, **kwargs):
+        super().__init__(master, fg_color=COLORS['bg_card'], corner_radius=8, **kwargs)
+        self.result = None
+        self.on_preview = on_preview
+        self.on_download = on_download
+        self.grid_columnconfigure(1, weight=1)
+        
+        # Fuente
+        self.source_label = ctk.CTkLabel(
+            self,
+            text="",
+            font=ctk.CTkFont(size=10, weight="bold"),
+            text_color=COLORS['accent'],
+            width=80
+        )
+        self.source_label.grid(row=0, column=0, padx=10, pady=10, sticky="w")
+        
+        # Info
+        info_frame = ctk.CTkFrame(self, fg_color="transparent")
+        info_frame.grid(row=0, column=1, sticky="ew", padx=5)
+        
+        self.title_label = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color=COLORS['text_primary'],
+            anchor="w"
+        )
+        self.title_label.pack(fill="x")
+        
+        self.uploader_label = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=ctk.CTkFont(size=10),
+            text_color=COLORS['text_secondary'],
+            anchor="w"
+        )
+        self.uploader_label.pack(fill="x")
+        
+        # Botones
+        btn_frame = ctk.CTkFrame(self, fg_color="transparent")
+        btn_frame.grid(row=0, column=2, padx=10)
+        
+        ctk.CTkButton(
+            btn_frame,
+            text="▶",
+            width=35,
+            height=35,
+            fg_color=COLORS['bg_secondary'],
+            hover_color=COLORS['accent_hover'],
+            command=lambda: self.result and self.on_preview and self.on_preview(self.result)
+        ).pack(side="left", padx=2)
+        
+        ctk.CTkButton(
+            btn_frame,
+            text="⬇",
+            width=35,
+            height=35,
+            fg_color=COLORS['action_play'],
+            hover_color=COLORS['accent_hover'],
+            command=lambda: self.result and self.on_download and self.on_download(self.result)
+        ).pack(side="left", padx=2)
+    
+    def show(self, result):
+        self.result = result
+        self.source_label.configure(text=result['source'].upper())
+        self.title_label.configure(text=result['title'][:60])
+        self.uploader_label.configure(text=(result.get('uploader') or '')[:40])
+
+
+class LocalFileRow(ctk.CTkFrame):
+    """Fila (reciclable) de la pestaña de archivos locales"""
+    
+    def __init__(self, master, on_play=None, **kwargs):
+        super().__init__(master, fg_color=COLORS['bg_card'], corner_radius=8, **kwargs)
+        self.file_data = None
+        self.on_play = on_play
+        
+        self.ext_label = ctk.CTkLabel(
+            self,
+            text="",
+            font=ctk.CTkFont(size=10, weight="bold"),
+            text_color=COLORS['accent'],
+            width=40
+        )
+        self.ext_label.pack(side="left", padx=8)
+        
+        info_frame = ctk.CTkFrame(self, fg_color="transparent")
+        info_frame.pack(side="left", fill="x", expand=True, padx=5)
+        
+        self.title_label = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_primary'],
+            anchor="w"
+        )
+        self.title_label.pack(fill="x")
+        
+        self.size_label = ctk.CTkLabel(
+            info_frame,
+            text="",
+            font=ctk.CTkFont(size=9),
+            text_color=COLORS['text_muted'],
+            anchor="w"
+        )
+        self.size_label.pack(fill="x")
         
-        self.preview_btn = ctk.CTkButton(
-            inner_frame,
+        btn_frame = ctk.CTkFrame(self, fg_color="transparent")
+        btn_frame.pack(side="right", padx=8)
+        
+        ctk.CTkButton(
+            btn_frame,
             text="▶",
-            font=ctk.CTkFont(size=14),
-            width=32,
-            height=28,
+            width=35,
+            height=35,
             fg_color=COLORS['bg_secondary'],
-            hover_color=COLORS['accent'],
-            corner_radius=6,
-            command=self.toggle_preview
-        )
-        self.preview_btn.pack(side="right")
+            hover_color=COLORS['accent_hover'],
+            command=lambda: self.file_data and self.on_play and self.on_play(self.file_data['file'])
+        ).pack(side="left", padx=2)
+    
+    def show(self, file_data):
+        self.file_data = file_data
+        size_mb = file_data['size'] / (1024 * 1024)
+        details = [part for part in (file_data.get('artist'), file_data.get('album')) if part]
+        duration = int(file_data.get('duration') or 0)
+        if duration:
+            details.append(f"{duration // 60}:{duration % 60:02d}")
+        if file_data.get('bitrate'):
+            details.append(f"{file_data['bitrate'] // 1000} kbps")
+        details.append(f"{size_mb:.1f} MB")
+        self.ext_label.configure(text=file_data['ext'])
+        self.title_label.configure(text=file_data['title'][:60])
+        self.size_label.configure(text="  •  ".join(details)[:90])
+
+
+class TransferProgress:
+    """Progreso a nivel de bytes de las descargas en curso (todas las fuentes).
+    
+    Se alimenta de los progress_hooks / postprocessor_hooks de yt-dlp (ver
+    hooks()). Por trabajo guarda bytes hechos/totales, velocidad instantanea
+    y suavizada (media exponencial con constante de tiempo
+    PROGRESS_SMOOTHING_SECONDS) y ETA; un trabajo sin bytes nuevos durante
+    PROGRESS_STALL_SECONDS se marca como atascado. snapshot() devuelve
+    ademas el agregado de todos los trabajos concurrentes.
+    """
+    
+    def __init__(self, on_change=None, min_interval=0.25):
+        self.jobs = {}
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self._last_notify = 0
+        self._lock = threading.Lock()
+        
+    def hooks(self, key, label):
+        """(progress_hook, postprocessor_hook) para un trabajo de yt-dlp"""
+        now = time.monotonic()
+        with self._lock:
+            self.jobs[key] = {
+                'label': label, 'phase': 'downloading', 'files': {},
+                'started': now, 'last_bytes_at': now, 'last_sample': None,
+                'speed': 0.0, 'smoothed': 0.0,
+            }
+            
+        def progress_hook(d):
+            if d.get('status') in ('downloading', 'finished'):
+                total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                done = d.get('downloaded_bytes') or 0
+                if d['status'] == 'finished':
+                    done = total = total or done
+                self.update(key, d.get('filename') or d.get('tmpfilename') or '', done, total)
+                
+        def postprocessor_hook(d):
+            if d.get('status') == 'started':
+                self.set_phase(key, 'transcoding')
+                
+        return progress_hook, postprocessor_hook
+        
+    def update(self, key, filename, done, total):
+        now = time.monotonic()
+        with self._lock:
+            job = self.jobs.get(key)
+            if job is None:
+                return
+            previous = job['files'].get(filename, (0, 0))[0]
+            job['files'][filename] = (done, total)
+            job['phase'] = 'downloading'
+            job_done = sum(d for d, _ in job['files'].values())
+            last = job['last_sample']
+            if done > previous:
+                job['last_bytes_at'] = now
+            if last is None:
+                job['last_sample'] = (now, job_done)
+            elif now - last[0] >= 0.2:
+                dt = now - last[0]
+                speed = max(0.0, (job_done - last[1]) / dt)
+                alpha = 1 - math.exp(-dt / PROGRESS_SMOOTHING_SECONDS)
+                job['speed'] = speed
+                job['smoothed'] = speed if not job['smoothed'] else job['smoothed'] + alpha * (speed - job['smoothed'])
+                job['last_sample'] = (now, job_done)
+        self._notify()
+        
+    def set_phase(self, key, phase):
+        with self._lock:
+            if key in self.jobs:
+                self.jobs[key]['phase'] = phase
+        self._notify(force=True)
+        
+    def finish(self, key):
+        with self._lock:
+            self.jobs.pop(key, None)
+        self._notify(force=True)
+        
+    def _notify(self, force=False):
+        now = time.monotonic()
+        if self.on_change and (force or now - self._last_notify >= self.min_interval):
+            self._last_notify = now
+            self.on_change()
+            
+    def snapshot(self):
+        """{'jobs': [...], 'done', 'total', 'speed', 'smoothed', 'eta', 'stalled'}"""
+        now = time.monotonic()
+        jobs = []
+        with self._lock:
+            for key, job in self.jobs.items():
+                done = sum(d for d, _ in job['files'].values())
+                total = sum(t for _, t in job['files'].values())
+                # Sin muestras recientes la velocidad real es 0, no la ultima vista
+                idle = now - job['last_bytes_at']
+                speed = job['speed'] if idle < 2 else 0.0
+                smoothed = job['smoothed']
+                remaining = max(0, total - done)
+                jobs.append({
+                    'key': key,
+                    'label': job['label'],
+                    'phase': job['phase'],
+                    'done': done,
+                    'total': total,
+                    'speed': speed,
+                    'smoothed': smoothed,
+                    'eta': remaining / smoothed if smoothed > 0 and total else None,
+                    'stalled': job['phase'] == 'downloading' and idle >= PROGRESS_STALL_SECONDS,
+                })
+        done = sum(j['done'] for j in jobs)
+        total = sum(j['total'] for j in jobs)
+        smoothed = sum(j['smoothed'] for j in jobs if not j['stalled'])
+        return {
+            'jobs': jobs,
+            'done': done,
+            'total': total,
+            'speed': sum(j['speed'] for j in jobs),
+            'smoothed': smoothed,
+            'eta': max(0, total - done) / smoothed if smoothed > 0 and total else None,
+            'stalled': sum(1 for j in jobs if j['stalled']),
+        }
+        
+    def fraction_sum(self):
+        """Suma de las fracciones descargadas de los trabajos en curso (para barras por pista)"""
+        return sum(j['done'] / j['total'] for j in self.snapshot()['jobs'] if j['total'])
+        
+    @staticmethod
+    def format_bytes(value):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if value < 1024 or unit == 'GB':
+                return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+            value /= 1024
+            
+    @staticmethod
+    def format_eta(seconds):
+        if seconds is None:
+            return "--:--"
+        seconds = int(seconds)
+        if seconds >= 3600:
+            return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+        return f"{seconds // 60}:{seconds % 60:02d}"
         
-    def set_source(self, source_name):
-        self.download_source = source_name
-        self.source_label.configure(text=source_name)
+    @classmethod
+    def describe(cls, snap):
+        """Una linea con el agregado: "45.2 MB / 300.0 MB  •  2.1 MB/s  •  ETA 2:03" """
+        if not snap['jobs']:
+            return ""
+        size = cls.format_bytes(snap['done'])
+        if snap['total']:
+            size += f" / {cls.format_bytes(snap['total'])}"
+        parts = [size, f"{cls.format_bytes(snap['smoothed'])}/s", f"ETA {cls.format_eta(snap['eta'])}"]
+        if len(snap['jobs']) > 1:
+            parts.append(f"{len(snap['jobs'])} en curso")
+        if snap['stalled']:
+            parts.append(f"⚠ {snap['stalled']} sin datos")
+        return "  •  ".join(parts)
         
+    @classmethod
+    def describe_job(cls, job):
+        if job['phase'] == 'transcoding':
+            state = "procesando..."
+        elif job['stalled']:
+            state = "⚠ sin datos"
+        else:
+            percent = f"{job['done'] * 100 // job['total']}%  " if job['total'] else ""
+            state = f"{percent}{cls.format_bytes(job['speed'])}/s  ETA {cls.format_eta(job['eta'])}"
+        return f"{job['label'][:28]}  {state}"
+
+
+class TraceSpan:
+    """Context manager de SessionTracer.span(): un evento completo ('X') en el hilo actual"""
+    
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0
+        
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.args
+        
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = str(exc)[:200]
+        self.tracer.complete(self.name, self.cat, self.start, time.perf_counter() - self.start, self.args)
+        return False
+
 
-    def set_status(self, status):
-        icons = {
-            'pending': ('○', COLORS['text_secondary']),
-            'downloading': ('⏳', COLORS['accent']),
-            'success': ('✓', COLORS['action_play']),
-            'error': ('✗', COLORS['action_stop'])
+class SessionTracer:
+    """Linea de tiempo opcional (trace_sessions en la config) en formato Chrome trace-event.
+    
+    Mientras haya alguna sesion abierta (lote de album, lote de enlaces,
+    descarga suelta o preview) cada span() queda como evento completo en
+    el hilo que lo ejecuta; al cerrarse la ultima se escribe un .json en
+    trace_dir que se abre en Perfetto o chrome://tracing. Los huecos entre
+    spans de un hilo son tiempo ocioso.
+    """
+    
+    def __init__(self, trace_dir, enabled=False, max_events=TRACE_MAX_EVENTS, max_files=TRACE_MAX_FILES):
+        self.trace_dir = trace_dir
+        self.enabled = enabled
+        self.max_events = max_events
+        self.max_files = max_files
+        self.epoch = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self.threads = {}
+        self.sessions = {}
+        self.next_session = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        
+    @property
+    def recording(self):
+        return bool(self.sessions)
+        
+    def span(self, name, cat='stage', **args):
+        return TraceSpan(self, name, cat, args)
+        
+    def complete(self, name, cat, start, seconds, args=None):
+        if not self.sessions:
+            return
+        thread = threading.current_thread()
+        event = {
+            'name': name, 'cat': cat, 'ph': 'X', 'pid': self.pid, 'tid': thread.ident,
+            'ts': round((start - self.epoch) * 1e6, 1), 'dur': round(seconds * 1e6, 1),
         }
-        icon, color = icons.get(status, ('○', COLORS['text_secondary']))
-        self.status_label.configure(text=icon, text_color=color)
+        if args:
+            event['args'] = {k: v for k, v in args.items() if isinstance(v, (str, int, float, bool))}
+        with self._lock:
+            if not self.sessions:
+                return
+            if len(self.events) >= self.max_events:
+                self.dropped += 1
+                return
+            self.threads.setdefault(thread.ident, thread.name)
+            self.events.append(event)
+            
+    def begin(self, name):
+        """Abre una sesion (None si el trazado esta desactivado); se cierra con end()"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self.next_session += 1
+            self.sessions[self.next_session] = (name, time.perf_counter(), threading.current_thread())
+            return self.next_session
+            
+    def end(self, token):
+        """Cierra la sesion; al cerrar la ultima escribe la traza y devuelve su ruta"""
+        if token is None:
+            return None
+        with self._lock:
+            session = self.sessions.get(token)
+        if session is None:
+            return None
+        name, start, thread = session
+        self.complete(name, 'session', start, time.perf_counter() - start)
+        with self._lock:
+            del self.sessions[token]
+            if self.sessions:
+                return None
+            events, threads, dropped = self.events, self.threads, self.dropped
+            self.events, self.threads, self.dropped = [], {}, 0
+        return self.write(name, events, threads, dropped)
+        
+    def write(self, name, events, threads, dropped=0):
+        meta = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': 'DUKATOR'}}]
+        for tid, thread_name in threads.items():
+            meta.append({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': thread_name}})
+        trace = {'traceEvents': meta + events, 'displayTimeUnit': 'ms', 'otherData': {'dropped_events': dropped}}
+        safe_name = re.sub(r'[^\w-]+', '_', name)
+        path = os.path.join(self.trace_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_name}.json")
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(trace, f)
+            os.replace(tmp_path, path)
+            traces = sorted(
+                (os.path.join(self.trace_dir, f) for f in os.listdir(self.trace_dir) if f.endswith('.json')),
+                key=os.path.getmtime
+            )
+            for old in traces[:-self.max_files]:
+                os.remove(old)
+        except OSError as e:
+            print(f"[Traza] No se pudo escribir {path}: {e}")
+            return None
+        print(f"[Traza] {len(events)} eventos -> {path}")
+        return path
 
-    def toggle_preview(self):
-        if self.is_playing:
-            self.preview_btn.configure(text="▶", fg_color=COLORS['bg_secondary'])
-            self.is_playing = False
-            if self.on_preview:
-                self.on_preview(None, stop=True)
-        else:
-            self.preview_btn.configure(text="⏹", fg_color=COLORS['action_stop'])
-            self.is_playing = True
-            if self.on_preview:
-                search_query = f"{self.track_data.get('artist', '')} {self.track_data['title']} audio"
-                self.on_preview(search_query, callback=self.on_preview_complete)
+
+class StageTimer:
+    """Context manager de StageMetrics.stage(): mide el bloque y guarda el registro.
+    
+    El bloque puede anotar el registro (record['bytes'], record['outcome']...);
+    si lanza una excepcion queda como 'error' y la excepcion sigue su curso.
+    split() corta el bloque en dos etapas; todos los registros se guardan
+    al salir, asi que el primero aun se puede anotar despues del corte.
+    """
+    
+    def __init__(self, metrics, record):
+        self.metrics = metrics
+        self.record = record
+        self.start = 0
+        self.closed = []
+        
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.record
+        
+    def split(self, name):
+        """Cierra la etapa en curso y mide el resto del bloque como la etapa name"""
+        if self.record['stage'] == name:
+            return
+        now = time.perf_counter()
+        self.closed.append((self.record, self.start, now - self.start))
+        self.record = dict(self.record, stage=name, bytes=0, outcome='ok')
+        self.start = now
+        
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.record['outcome'] = 'error'
+            self.record.setdefault('error', str(exc)[:200])
+        for record, start, seconds in self.closed + [(self.record, self.start, seconds)]:
+            record['seconds'] = round(seconds, 4)
+            self.metrics.add(record)
+            if self.metrics.tracer:
+                name = f"{record['stage']} {record['source']}".strip()
+                self.metrics.tracer.complete(name, 'metrics', start, seconds, record)
+        return False
+
+
+class StageMetrics:
+    """Tiempos por etapa y fuente: MusicBrainz, busqueda de candidatos,
+    extraccion, transferencia, FFmpeg y etiquetado.
+    
+    Cada registro (etapa, fuente, segundos, bytes, resultado) se añade a
+    stages.jsonl (rotado al pasar METRICS_JSONL_MAX_MB) y se guarda en
+    memoria; write_prometheus() vuelca cuantiles, sumas y contadores de la
+    sesion en formato de texto de Prometheus y summary_table() resume p50/p95
+    por etapa desde una marca (el inicio de un lote).
+    """
+    
+    QUANTILES = (0.5, 0.95)
+    
+    def __init__(self, metrics_dir, max_jsonl_mb=METRICS_JSONL_MAX_MB, max_records=METRICS_MEMORY_RECORDS, tracer=None):
+        self.metrics_dir = metrics_dir
+        self.tracer = tracer
+        self.jsonl_path = os.path.join(metrics_dir, "stages.jsonl")
+        self.prom_path = os.path.join(metrics_dir, "stages.prom")
+        self.max_jsonl_bytes = int(max_jsonl_mb * 1024 * 1024)
+        self.max_records = max_records
+        self.records = []
+        self.seq = 0
+        self._lock = threading.Lock()
+        os.makedirs(metrics_dir, exist_ok=True)
+        
+    def stage(self, name, source='', **fields):
+        record = {'stage': name, 'source': source, 'bytes': 0, 'outcome': 'ok'}
+        record.update(fields)
+        return StageTimer(self, record)
+        
+    def add(self, record):
+        record['ts'] = round(time.time(), 3)
+        with self._lock:
+            self.seq += 1
+            record['seq'] = self.seq
+            self.records.append(record)
+            if len(self.records) > self.max_records:
+                del self.records[:len(self.records) - self.max_records]
+            try:
+                if os.path.exists(self.jsonl_path) and os.path.getsize(self.jsonl_path) > self.max_jsonl_bytes:
+                    os.replace(self.jsonl_path, self.jsonl_path + '.1')
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            except OSError:
+                pass
                 
-    def on_preview_complete(self):
-        self.preview_btn.configure(text="▶", fg_color=COLORS['bg_secondary'])
-        self.is_playing = False
-        
-    def stop_playing(self):
-        self.preview_btn.configure(text="▶", fg_color=COLORS['bg_secondary'])
-        self.is_playing = False
+    def mark(self):
+        """Marca para summary_table(): el numero del ultimo registro"""
+        with self._lock:
+            return self.seq
+            
+    @staticmethod
+    def percentile(sorted_values, q):
+        if not sorted_values:
+            return 0.0
+        idx = max(0, math.ceil(q * len(sorted_values)) - 1)
+        return sorted_values[idx]
+        
+    def groups(self, since=0):
+        """{(etapa, fuente): {'seconds': [...ordenados], 'bytes', 'outcomes': {...}}}"""
+        with self._lock:
+            records = [r for r in self.records if r['seq'] > since]
+        groups = {}
+        for r in records:
+            group = groups.setdefault((r['stage'], r.get('source') or ''), {'seconds': [], 'bytes': 0, 'outcomes': {}})
+            group['seconds'].append(r['seconds'])
+            group['bytes'] += r.get('bytes') or 0
+            group['outcomes'][r['outcome']] = group['outcomes'].get(r['outcome'], 0) + 1
+        for group in groups.values():
+            group['seconds'].sort()
+        return groups
+        
+    def summary_table(self, since=0):
+        groups = self.groups(since)
+        if not groups:
+            return ""
+        lines = [f"{'etapa':<20} {'fuente':<12} {'n':>5} {'p50 s':>8} {'p95 s':>8} {'MB':>8}  resultados"]
+        for (stage, source), group in sorted(groups.items()):
+            outcomes = ", ".join(f"{k}={v}" for k, v in sorted(group['outcomes'].items()))
+            lines.append(
+                f"{stage:<20} {source[:12]:<12} {len(group['seconds']):>5} "
+                f"{self.percentile(group['seconds'], 0.5):>8.2f} {self.percentile(group['seconds'], 0.95):>8.2f} "
+                f"{group['bytes'] / (1024 * 1024):>8.1f}  {outcomes}"
+            )
+        return "\n".join(lines)
+        
+    def write_prometheus(self):
+        """Vuelca la sesion a stages.prom (sustitucion atomica, apto para node_exporter textfile)"""
+        groups = self.groups()
+        lines = [
+            "# HELP dukator_stage_duration_seconds Duracion de cada etapa por fuente.",
+            "# TYPE dukator_stage_duration_seconds summary",
+        ]
+        for (stage, source), group in sorted(groups.items()):
+            labels = f'stage="{stage}",source="{source}"'
+            for q in self.QUANTILES:
+                lines.append(f'dukator_stage_duration_seconds{{{labels},quantile="{q}"}} {self.percentile(group["seconds"], q):.4f}')
+            lines.append(f"dukator_stage_duration_seconds_sum{{{labels}}} {sum(group['seconds']):.4f}")
+            lines.append(f"dukator_stage_duration_seconds_count{{{labels}}} {len(group['seconds'])}")
+        lines += [
+            "# HELP dukator_stage_bytes_total Bytes movidos por cada etapa.",
+            "# TYPE dukator_stage_bytes_total counter",
+        ]
+        for (stage, source), group in sorted(groups.items()):
+            lines.append(f'dukator_stage_bytes_total{{stage="{stage}",source="{source}"}} {group["bytes"]}')
+        lines += [
+            "# HELP dukator_stage_outcomes_total Resultados (ok, miss, error) por etapa y fuente.",
+            "# TYPE dukator_stage_outcomes_total counter",
+        ]
+        for (stage, source), group in sorted(groups.items()):
+            for outcome, count in sorted(group['outcomes'].items()):
+                lines.append(f'dukator_stage_outcomes_total{{stage="{stage}",source="{source}",outcome="{outcome}"}} {count}')
+        tmp_path = self.prom_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.prom_path)
+        except OSError:
+            pass
+            
+    def report_batch(self, since, title):
+        """Al final de un lote: tabla p50/p95 en consola y en last_batch.txt, y .prom al dia"""
+        table = self.summary_table(since)
+        self.write_prometheus()
+        if not table:
+            return ""
+        try:
+            with open(os.path.join(self.metrics_dir, "last_batch.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"{title}\n{table}\n")
+        except OSError:
+            pass
+        print(f"[Metricas] {title}\n{table}")
+        return table
+
+
+class UIEventBus:
+    """Unica via de los hilos de trabajo hacia Tk.
+    
+    Los hilos encolan; el hilo de Tk vacia la cola UI_EVENT_FPS veces por
+    segundo. post(clave, fn) se fusiona: de varias actualizaciones del mismo
+    widget (estado, barra de progreso...) solo se aplica la ultima. call(fn)
+    no se fusiona ni se pierde (resultados, dialogos, altas en listas). Todo
+    se ejecuta en el orden en que llego la ultima version de cada clave.
+    """
+    
+    def __init__(self, root, fps=UI_EVENT_FPS):
+        self.root = root
+        self.interval = max(1, int(1000 / fps))
+        self._pending = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.root.after(self.interval, self._drain)
+        
+    def post(self, key, callback):
+        with self._lock:
+            # Reinsertar: la version nueva ocupa el puesto de la mas reciente
+            self._pending.pop(key, None)
+            self._pending[key] = callback
+            
+    def call(self, callback):
+        with self._lock:
+            self._seq += 1
+            self._pending[('call', self._seq)] = callback
+            
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for callback in pending.values():
+            try:
+                callback()
+            except Exception as e:
+                print(f"[UI] Error aplicando evento: {e}")
+        self.root.after(self.interval, self._drain)
 
 
 class DUKATOR:
     def __init__(self):
         self.root = ctk.CTk()
+        self.ui = UIEventBus(self.root)
         self.root.title("DUKATOR - Underground Music Downloader")
         self.root.minsize(850, 650)
         
@@ -592,29 +3334,100 @@ class DUKATOR:
         self.root.grid_columnconfigure(0, weight=1)
         self.root.grid_rowconfigure(1, weight=1)
         
-        self.app_dir = self.get_app_dir()
+        self.setup_services()
+        
+        self.audio_player = AudioPlayer(
+            status_callback=self.update_player_status,
+            resolve_query=self.resolve_youtube_query,
+            ffmpeg_path=self.ffmpeg_path,
+            preview_cache=PreviewCache(os.path.join(self.cache_dir, "previews")),
+            scratch=self.scratch,
+            tracer=self.tracer
+        )
+        
+        self.setup_ui()
+        self.update_selection_count()
+        
+        self.root.after(800, self.resume_pending_jobs)
+        
+    def setup_services(self, app_dir=None):
+        """Estado y servicios sin interfaz: configuracion, caches, diario y pools.
+        
+        Separado de la ventana para poder usar los descargadores sin Tk
+        (benchmarks/); app_dir sustituye a la carpeta de la aplicacion.
+        """
+        self.app_dir = app_dir or self.get_app_dir()
         self.ffmpeg_path = self.find_ffmpeg()
         
         self.download_path = os.path.join(os.path.expanduser("~"), "Downloads", "DUKATOR")
-        os.makedirs(self.download_path, exist_ok=True)
         
         # Cargar configuracion
         self.config_file = os.path.join(self.app_dir, "dukator_config.json")
         self.load_config()
+        os.makedirs(self.download_path, exist_ok=True)
+        
+        # Diario de descargas (reanudar tras cierre o crash)
+        self.journal = JobJournal(os.path.join(self.app_dir, "dukator_jobs.jsonl"))
+        
+        # Cache local: descargas parciales reanudables
+        self.cache_dir = os.path.join(self.app_dir, "dukator_cache")
+        self.partials = PartialStore(os.path.join(self.cache_dir, "partial"))
+        self.transfers = TransferProgress(on_change=lambda: self.ui.post('transfers', self.show_transfers))
+        self.transfers_tick = None
+        self.tracer = SessionTracer(os.path.join(self.cache_dir, "traces"), enabled=self.trace_sessions)
+        self.metrics = StageMetrics(os.path.join(self.cache_dir, "metrics"), tracer=self.tracer)
+        self.scratch = ScratchDir(os.path.join(self.cache_dir, "scratch"))
+        self.musicbrainz = MusicBrainzClient(os.path.join(self.cache_dir, "musicbrainz"))
+        self.candidate_cache = CandidateCache(os.path.join(self.cache_dir, "candidates.json"))
+        self.library = LibraryIndex(os.path.join(self.cache_dir, "library.sqlite3"))
+        self.library_search = LibrarySearch()
+        self.library_watcher = None
+        CoverArtFetcher.configure(os.path.join(self.cache_dir, "covers"), self.cover_cache_mb, self.ffmpeg_path)
+        threading.Thread(target=self.partials.sweep, args=(self.partial_max_age_days,), daemon=True).start()
+        threading.Thread(target=self.scratch.startup_sweep, daemon=True).start()
         
         self.musicbrainz_token = ""
         self.current_tracks = []
-        self.track_cards = []
         self.selected_tracks = []
         self.download_history = []
         self.quality = "320"
         self.current_album_info = {}
         self.current_cover_art = None
-        
-        self.audio_player = AudioPlayer(status_callback=self.update_player_status)
-        
-        self.setup_ui()
-        self.update_selection_count()
+        self.host_limiter = HostLimiter(DOWNLOAD_HOST_LIMITS)
+        # Una carrera por hilo de album y una busqueda por fuente: las que pierden
+        # siguen en vuelo tras RACE_DEADLINE, asi que el pool cubre el peor caso
+        # (los hilos se crean bajo demanda)
+        self.resolve_pool = ThreadPoolExecutor(
+            max_workers=int(ALBUM_WORKER_CHOICES[-1]) * len(RACE_SOURCES),
+            thread_name_prefix="resolve"
+        )
+        self.transcode_workers = os.cpu_count() or 2
+        # Busquedas/cargas de MusicBrainz en segundo plano; cada tipo lleva un
+        # numero de generacion y solo la ultima peticion pinta resultados
+        self.metadata_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="metadata")
+        self.library_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library")
+        self.task_generation = {}
+        self.task_futures = {}
+        self.search_debounce_id = None
+        self.last_album_query = None
+        self.library_filter_id = None
+        # Registro de buscadores de canciones: fuente -> funcion(query) -> resultados
+        self.song_search_providers = {
+            'youtube': self.search_youtube_songs,
+            'soundcloud': self.search_soundcloud_songs,
+            'audiomack': self.search_audiomack_songs,
+        }
+        self.search_pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="search")
+        # Registro de resolvedores de la carrera: fuente -> funcion(track) -> candidatos
+        # (las fuentes sin entrada usan la busqueda generica de yt-dlp)
+        self.candidate_resolvers = {
+            'youtube': self.resolve_youtube,
+            'soundcloud': self.resolve_soundcloud,
+            'audiomack': lambda track: [],
+            'vimeo': lambda track: [],
+            'bandcamp': lambda track: [],
+        }
+        self.race_sources = RACE_SOURCES
         
     def get_app_dir(self):
         if getattr(sys, 'frozen', False):
@@ -646,9 +3459,21 @@ class DUKATOR:
         default_config = {
             'quality': '320',
             'download_path': self.download_path,
+            'album_workers': DEFAULT_ALBUM_WORKERS,
+            'source_mode': DEFAULT_SOURCE_MODE,
+            'partial_max_age_days': DEFAULT_PARTIAL_MAX_AGE_DAYS,
+            'output_format': DEFAULT_OUTPUT_FORMAT,
+            'cover_cache_mb': DEFAULT_COVER_CACHE_MB,
+            'trace_sessions': DEFAULT_TRACE_SESSIONS,
             'history': []
         }
         
+        self.album_workers = DEFAULT_ALBUM_WORKERS
+        self.source_mode = DEFAULT_SOURCE_MODE
+        self.partial_max_age_days = DEFAULT_PARTIAL_MAX_AGE_DAYS
+        self.output_format = DEFAULT_OUTPUT_FORMAT
+        self.cover_cache_mb = DEFAULT_COVER_CACHE_MB
+        self.trace_sessions = DEFAULT_TRACE_SESSIONS
         try:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r') as f:
@@ -657,6 +3482,17 @@ class DUKATOR:
                     if config.get('download_path'):
                         self.download_path = config['download_path']
                     self.download_history = config.get('history', [])
+                    self.album_workers = max(1, int(config.get('album_workers', DEFAULT_ALBUM_WORKERS)))
+                    # Quien ya tenia configuracion sigue en secuencial hasta que elija carrera
+                    if config.get('source_mode') in SOURCE_MODE_CHOICES.values():
+                        self.source_mode = config['source_mode']
+                    else:
+                        self.source_mode = LEGACY_SOURCE_MODE
+                    self.partial_max_age_days = float(config.get('partial_max_age_days', DEFAULT_PARTIAL_MAX_AGE_DAYS))
+                    if config.get('output_format') in OUTPUT_FORMAT_CHOICES.values():
+                        self.output_format = config['output_format']
+                    self.cover_cache_mb = float(config.get('cover_cache_mb', DEFAULT_COVER_CACHE_MB))
+                    self.trace_sessions = bool(config.get('trace_sessions', DEFAULT_TRACE_SESSIONS))
             else:
                 self.quality = '320'
                 self.download_history = []
@@ -668,6 +3504,12 @@ class DUKATOR:
         config = {
             'quality': self.quality,
             'download_path': self.download_path,
+            'album_workers': self.album_workers,
+            'source_mode': self.source_mode,
+            'partial_max_age_days': self.partial_max_age_days,
+            'output_format': self.output_format,
+            'cover_cache_mb': self.cover_cache_mb,
+            'trace_sessions': self.trace_sessions,
             'history': self.download_history[-50:]  # Keep last 50
         }
         try:
@@ -680,6 +3522,18 @@ class DUKATOR:
         self.quality = value
         self.save_config()
         
+    def on_output_format_change(self, value):
+        self.output_format = OUTPUT_FORMAT_CHOICES.get(value, DEFAULT_OUTPUT_FORMAT)
+        self.save_config()
+        
+    def on_workers_change(self, value):
+        self.album_workers = max(1, int(value))
+        self.save_config()
+        
+    def on_source_mode_change(self, value):
+        self.source_mode = SOURCE_MODE_CHOICES.get(value, DEFAULT_SOURCE_MODE)
+        self.save_config()
+        
     def setup_ui(self):
         self.setup_header()
         self.setup_main_content()
@@ -739,6 +3593,75 @@ class DUKATOR:
         quality_menu.pack(side="left", padx=(0, 15))
         quality_menu.set(self.quality)
         
+        ctk.CTkLabel(
+            settings_frame,
+            text="Formato:",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_secondary']
+        ).pack(side="left", padx=(0, 5))
+        
+        format_menu = ctk.CTkOptionMenu(
+            settings_frame,
+            values=list(OUTPUT_FORMAT_CHOICES.keys()),
+            width=90,
+            height=28,
+            fg_color=COLORS['bg_card'],
+            button_color=COLORS['accent'],
+            button_hover_color=COLORS['accent_hover'],
+            dropdown_fg_color=COLORS['bg_card'],
+            dropdown_hover_color=COLORS['accent'],
+            corner_radius=6,
+            command=self.on_output_format_change
+        )
+        format_menu.pack(side="left", padx=(0, 15))
+        format_menu.set(next(k for k, v in OUTPUT_FORMAT_CHOICES.items() if v == self.output_format))
+        
+        ctk.CTkLabel(
+            settings_frame,
+            text="Simultáneas:",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_secondary']
+        ).pack(side="left", padx=(0, 5))
+        
+        workers_menu = ctk.CTkOptionMenu(
+            settings_frame,
+            values=ALBUM_WORKER_CHOICES,
+            width=60,
+            height=28,
+            fg_color=COLORS['bg_card'],
+            button_color=COLORS['accent'],
+            button_hover_color=COLORS['accent_hover'],
+            dropdown_fg_color=COLORS['bg_card'],
+            dropdown_hover_color=COLORS['accent'],
+            corner_radius=6,
+            command=self.on_workers_change
+        )
+        workers_menu.pack(side="left", padx=(0, 15))
+        workers_menu.set(str(self.album_workers))
+        
+        ctk.CTkLabel(
+            settings_frame,
+            text="Fuentes:",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_secondary']
+        ).pack(side="left", padx=(0, 5))
+        
+        source_mode_menu = ctk.CTkOptionMenu(
+            settings_frame,
+            values=list(SOURCE_MODE_CHOICES.keys()),
+            width=110,
+            height=28,
+            fg_color=COLORS['bg_card'],
+            button_color=COLORS['accent'],
+            button_hover_color=COLORS['accent_hover'],
+            dropdown_fg_color=COLORS['bg_card'],
+            dropdown_hover_color=COLORS['accent'],
+            corner_radius=6,
+            command=self.on_source_mode_change
+        )
+        source_mode_menu.pack(side="left", padx=(0, 15))
+        source_mode_menu.set(next(k for k, v in SOURCE_MODE_CHOICES.items() if v == self.source_mode))
+        
         folder_btn = StyledButton(
             settings_frame,
             text="📁 Carpeta",
@@ -784,6 +3707,7 @@ class DUKATOR:
         )
         self.search_entry.grid(row=0, column=1, sticky="ew", padx=10, pady=12)
         self.search_entry.bind("<Return>", lambda e: self.search_album())
+        self.search_entry.bind("<KeyRelease>", self.on_search_key)
         
         search_btn = StyledButton(
             search_frame,
@@ -869,13 +3793,17 @@ class DUKATOR:
         )
         self.selection_count_label.pack(side="right", padx=10)
         
-        self.tracks_list_frame = ctk.CTkScrollableFrame(
+        self.tracks_list = VirtualList(
             tracks_container,
-            fg_color=COLORS['bg_secondary'],
-            corner_radius=8
+            row_factory=lambda parent: TrackCard(
+                parent,
+                on_preview=self.handle_preview,
+                on_change=lambda track: self.ui.post(('track', id(track)), lambda: self.tracks_list.refresh(track))
+            ),
+            row_height=50,
+            row_gap=8
         )
-        self.tracks_list_frame.grid(row=1, column=0, sticky="nsew")
-        self.tracks_list_frame.grid_columnconfigure(0, weight=1)
+        self.tracks_list.grid(row=1, column=0, sticky="nsew")
         
         controls_frame = ctk.CTkFrame(self.tab_album, fg_color="transparent")
         controls_frame.grid(row=3, column=0, sticky="ew", padx=10, pady=10)
@@ -961,8 +3889,7 @@ class DUKATOR:
         
         self.song_source_var = ctk.StringVar(value="all")
         
-        for source, label in [("youtube", "YouTube"), ("soundcloud", "SoundCloud"), 
-                              ("audiomack", "Audiomack"), ("all", "Todas")]:
+        for source, label in SONG_SEARCH_SOURCES + [("all", "Todas")]:
             ctk.CTkRadioButton(
                 sources_frame,
                 text=label,
@@ -972,407 +3899,335 @@ class DUKATOR:
             ).pack(side="left", padx=10)
         
         # Resultados
-        self.songs_results_frame = ctk.CTkScrollableFrame(
+        self.songs_results_frame = ctk.CTkFrame(
             self.tab_songs,
             fg_color=COLORS['bg_secondary'],
             corner_radius=8
         )
         self.songs_results_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
         self.songs_results_frame.grid_columnconfigure(0, weight=1)
+        self.songs_results_frame.grid_rowconfigure(1, weight=1)
         
         ctk.CTkLabel(
             self.songs_results_frame,
             text="Resultados:",
             font=ctk.CTkFont(size=12, weight="bold"),
             text_color=COLORS['text_secondary']
-        ).grid(row=0, column=0, sticky="w", pady=(0, 10))
+        ).grid(row=0, column=0, sticky="w", padx=10, pady=(8, 4))
+        
+        # Estado de cada fuente durante la busqueda
+        self.song_sources_label = ctk.CTkLabel(
+            self.songs_results_frame,
+            text="",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_muted']
+        )
+        self.song_sources_label.grid(row=0, column=0, sticky="e", padx=10, pady=(8, 4))
         
-        self.song_results_container = ctk.CTkFrame(self.songs_results_frame, fg_color="transparent")
-        self.song_results_container.grid(row=1, column=0, sticky="ew")
-        self.song_results_container.grid_columnconfigure(0, weight=1)
+        self.song_results_list = VirtualList(
+            self.songs_results_frame,
+            row_factory=lambda parent: SongResultRow(
+                parent,
+                on_preview=lambda r: self.preview_song(r['url']),
+                on_download=self.download_single_song
+            ),
+            row_height=66,
+            row_gap=10
+        )
+        self.song_results_list.grid(row=1, column=0, sticky="nsew")
         
     def search_songs(self):
         query = self.song_search_entry.get().strip()
         if not query:
             return
-            
+        
         source = self.song_source_var.get()
+        sources = [src for src, _ in SONG_SEARCH_SOURCES] if source == "all" else [source]
+        sources = [src for src in sources if src in self.song_search_providers]
         
         # Limpiar resultados anteriores
-        for widget in self.song_results_container.winfo_children():
-            widget.destroy()
-            
-        ctk.CTkLabel(
-            self.song_results_container,
-            text=f"🔍 Buscando en {source}...",
-            text_color=COLORS['text_secondary']
-        ).grid(row=0, column=0, pady=10)
+        self.song_results_list.set_empty_text("")
+        self.song_results_list.set_items([])
+        
+        # Una busqueda nueva deja obsoleta la anterior
+        generation = self.task_generation.get('songs', 0) + 1
+        self.task_generation['songs'] = generation
+        status = {src: 'loading' for src in sources}
+        self.show_song_sources_status(status)
+        
+        def is_current():
+            return self.task_generation.get('songs') == generation
+        
+        def source_finished(src, state, results):
+            if not is_current():
+                return
+            status[src] = (state, len(results)) if state == 'done' else state
+            self.append_song_results(results)
+            self.show_song_sources_status(status)
+            if 'loading' not in status.values() and not self.song_results_list.items:
+                self.display_song_results([])
         
-        # Buscar en background
-        def safe_print(msg):
-            try:
-                print(msg)
-            except UnicodeEncodeError:
-                print(msg.encode('ascii', errors='replace').decode('ascii'))
-
         def do_search():
-            try:
-                sources_to_search = []
-                if source == "all":
-                    sources_to_search = ["youtube", "soundcloud", "audiomack"]  # Bandcamp excluido (403)
-                else:
-                    sources_to_search = [source]
-                
-                all_results = []
-                
-                for src in sources_to_search:
+            futures = {
+                self.search_pool.submit(self.cached_song_search, src, query): src
+                for src in sources
+            }
+            deadline = time.time() + SONG_SEARCH_DEADLINE
+            pending = set(futures)
+            while pending and is_current():
+                done, pending = wait(pending, timeout=max(0, deadline - time.time()), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    src = futures[future]
                     try:
-                        # YouTube - usar yt-dlp nativo (más robusto)
-                        if src == "youtube":
-                            try:
-                                ydl_opts = {
-                                    'quiet': True, 
-                                    'no_warnings': True, 
-                                    'extract_flat': True,
-                                    'skip_download': True,
-                                    'ignoreerrors': True,
-                                }
-                                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                                    results = ydl.extract_info(f"ytsearch10:{query}", download=False)
-                                    if results and 'entries' in results:
-                                        for entry in list(results['entries'])[:10]:
-                                            if not entry:
-                                                continue
-                                            vid_id = entry.get('id', '')
-                                            title = entry.get('title', '').strip()
-                                            # Descartar entradas sin título o sin ID válido
-                                            if not title or not vid_id:
-                                                continue
-                                            # Construir URL limpia (sin list= ni parámetros extra)
-                                            clean_url = f"https://www.youtube.com/watch?v={vid_id}"
-                                            all_results.append({
-                                                'title': title[:60],
-                                                'url': clean_url,
-                                                'source': 'youtube',
-                                                'duration': entry.get('duration', 0) or 0,
-                                                'uploader': entry.get('uploader', '') or entry.get('channel', '')
-                                            })
-                            except Exception as e:
-                                safe_print(f"[YouTube] Error: {str(e)[:50]}")
-                        
-                        # SoundCloud - formato correcto scsearch
-                        elif src == "soundcloud":
-                            try:
-                                ydl_opts = {
-                                    'quiet': True, 
-                                    'no_warnings': True, 
-                                    'extract_flat': True,
-                                    'skip_download': True,
-                                    'ignoreerrors': True,
-                                }
-                                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                                    results = ydl.extract_info(f"scsearch10:{query}", download=False)
-                                    if results and 'entries' in results:
-                                        for entry in list(results['entries'])[:10]:
-                                            if not entry:
-                                                continue
-                                            title = entry.get('title', '').strip()
-                                            if not title:
-                                                continue
-                                            # webpage_url es la URL real de soundcloud.com
-                                            # entry.get('url') devuelve URL interna de API (inútil)
-                                            sc_url = entry.get('webpage_url') or entry.get('url', '')
-                                            if not sc_url or sc_url.startswith('https://api.soundcloud.com'):
-                                                # Construir URL desde permalink si está disponible
-                                                permalink = entry.get('permalink_url', '')
-                                                sc_url = permalink if permalink else sc_url
-                                            if not sc_url:
-                                                continue
-                                            all_results.append({
-                                                'title': title[:60],
-                                                'url': sc_url,
-                                                'source': 'soundcloud',
-                                                'duration': entry.get('duration', 0) or 0,
-                                                'uploader': entry.get('uploader', '') or ''
-                                            })
-                            except Exception as e:
-                                print(f"[SoundCloud] Error: {str(e)[:50]}")
-                                
-                        # Bandcamp - DESACTIVADO temporalmente (API devuelve 403 Forbidden)
-                        # Bandcamp tiene protección anti-scraping activa
-                        elif src == "bandcamp":
-                            # No disponible temporalmente - mostrar mensaje en UI
-                            print("[Bandcamp] No disponible temporalmente (403 Forbidden)")
-                            # Añadir resultado dummy para mostrar mensaje
-                            all_results.append({
-                                'title': '[Bandcamp no disponible]',
-                                'url': '',
-                                'source': 'bandcamp',
-                                'duration': 0,
-                                'uploader': 'API bloqueada'
-                            })
-                        
-                        # Audiomack - API pública oficial
-                        elif src == "audiomack":
-                            try:
-                                api_url = f"https://api.audiomack.com/v1/search"
-                                params = {
-                                    'q': query,
-                                    'type': 'song',
-                                    'limit': 10,
-                                }
-                                headers = {
-                                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                                    'Accept': 'application/json',
-                                }
-                                response = requests.get(api_url, params=params, headers=headers, timeout=15)
-                                am_results = []
-                                if response.status_code == 200:
-                                    try:
-                                        data = response.json()
-                                        items = data.get('results', {}).get('song', {}).get('data', [])
-                                        for item in items[:10]:
-                                            slug = item.get('url_slug', '')
-                                            artist_slug = item.get('artist', {}).get('url_slug', '') if isinstance(item.get('artist'), dict) else ''
-                                            if slug and artist_slug:
-                                                full_url = f"https://audiomack.com/{artist_slug}/song/{slug}"
-                                                am_results.append({
-                                                    'title': item.get('title', query)[:60],
-                                                    'url': full_url,
-                                                    'source': 'audiomack',
-                                                    'duration': int(item.get('duration', 0) or 0),
-                                                    'uploader': item.get('artist', {}).get('name', '') if isinstance(item.get('artist'), dict) else ''
-                                                })
-                                    except Exception:
-                                        pass
-                                # Fallback: yt-dlp search si la API no devuelve nada
-                                if not am_results:
-                                    try:
-                                        ydl_opts_am = {
-                                            'quiet': True,
-                                            'no_warnings': True,
-                                            'extract_flat': True,
-                                            'skip_download': True,
-                                            'ignoreerrors': True,
-                                        }
-                                        with yt_dlp.YoutubeDL(ydl_opts_am) as ydl:
-                                            res = ydl.extract_info(f"ytsearch5:{query} audiomack", download=False)
-                                            if res and 'entries' in res:
-                                                for entry in list(res['entries'])[:5]:
-                                                    if entry:
-                                                        u = entry.get('url') or f"https://www.youtube.com/watch?v={entry.get('id','')}"
-                                                        am_results.append({
-                                                            'title': entry.get('title', query)[:60],
-                                                            'url': u,
-                                                            'source': 'audiomack',
-                                                            'duration': entry.get('duration', 0) or 0,
-                                                            'uploader': entry.get('uploader', '') or ''
-                                                        })
-                                    except Exception:
-                                        pass
-                                all_results.extend(am_results)
-                            except Exception as e:
-                                print(f"[Audiomack] Error: {str(e)[:50]}")
-                                
+                        results = list(future.result() or [])
+                        state = 'done'
                     except Exception as e:
                         print(f"[{src}] Error: {str(e)[:80]}")
-                
-                # Mostrar resultados en UI - usar list() para copiar valores y evitar closure issues
-                results_copy = list(all_results)
-                self.root.after(0, lambda r=results_copy: self.display_song_results(r))
-                
-            except Exception as e:
-                self.root.after(0, lambda: self.update_status(f"Error: {str(e)}"))
+                        results, state = [], 'failed'
+                    self.ui.call(lambda s=src, st=state, r=results: source_finished(s, st, r))
+            for future in pending:
+                self.ui.call(lambda s=futures[future]: source_finished(s, 'timeout', []))
         
         threading.Thread(target=do_search, daemon=True).start()
-        
+    
+    def cached_song_search(self, src, query):
+        return self.candidate_cache.fetch(f"songs:{src}", query, lambda: self.timed_search(src, self.song_search_providers[src], query))
+        
+    def timed_search(self, source, search, search_query):
+        """Busqueda de candidatos medida (solo llega aqui si la cache no la tenia)"""
+        with self.metrics.stage('search', source) as stage:
+            candidates = search(search_query)
+            stage['outcome'] = 'ok' if candidates else 'miss'
+            stage['results'] = len(candidates or [])
+        return candidates
+    
+    def show_song_sources_status(self, status):
+        labels = dict(SONG_SEARCH_SOURCES)
+        parts = []
+        for src, state in status.items():
+            if state == 'loading':
+                text = "buscando…"
+            elif state == 'failed':
+                text = "error"
+            elif state == 'timeout':
+                text = "sin respuesta"
+            else:
+                text = f"{state[1]}"
+            parts.append(f"{labels.get(src, src)}: {text}")
+        self.song_sources_label.configure(text="  •  ".join(parts))
+    
+    def ytdlp_search(self, search_url):
+        """Busqueda plana con yt-dlp (sin resolver formatos); devuelve las entradas"""
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': True,
+            'skip_download': True,
+            'ignoreerrors': True,
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            results = ydl.extract_info(search_url, download=False)
+        if results and 'entries' in results:
+            return [entry for entry in results['entries'] if entry]
+        return []
+    
+    # YouTube - usar yt-dlp nativo (más robusto)
+    def search_youtube_songs(self, query):
+        found = []
+        for entry in self.ytdlp_search(f"ytsearch{SONG_SEARCH_LIMIT}:{query}")[:SONG_SEARCH_LIMIT]:
+            vid_id = entry.get('id', '')
+            title = (entry.get('title') or '').strip()
+            # Descartar entradas sin título o sin ID válido
+            if not title or not vid_id:
+                continue
+            # Construir URL limpia (sin list= ni parámetros extra)
+            clean_url = f"https://www.youtube.com/watch?v={vid_id}"
+            found.append({
+                'title': title[:60],
+                'url': clean_url,
+                'source': 'youtube',
+                'duration': entry.get('duration', 0) or 0,
+                'uploader': entry.get('uploader', '') or entry.get('channel', '')
+            })
+        return found
+    
+    # SoundCloud - formato correcto scsearch
+    def search_soundcloud_songs(self, query):
+        found = []
+        for entry in self.ytdlp_search(f"scsearch{SONG_SEARCH_LIMIT}:{query}")[:SONG_SEARCH_LIMIT]:
+            title = (entry.get('title') or '').strip()
+            if not title:
+                continue
+            # webpage_url es la URL real de soundcloud.com
+            # entry.get('url') devuelve URL interna de API (inútil)
+            sc_url = entry.get('webpage_url') or entry.get('url', '')
+            if not sc_url or sc_url.startswith('https://api.soundcloud.com'):
+                # Construir URL desde permalink si está disponible
+                permalink = entry.get('permalink_url', '')
+                sc_url = permalink if permalink else sc_url
+            if not sc_url:
+                continue
+            found.append({
+                'title': title[:60],
+                'url': sc_url,
+                'source': 'soundcloud',
+                'duration': entry.get('duration', 0) or 0,
+                'uploader': entry.get('uploader', '') or ''
+            })
+        return found
+    
+    # Audiomack - API pública oficial
+    def search_audiomack_songs(self, query):
+        api_url = f"https://api.audiomack.com/v1/search"
+        params = {
+            'q': query,
+            'type': 'song',
+            'limit': SONG_SEARCH_LIMIT,
+        }
+        headers = {'Accept': 'application/json'}
+        found = []
+        try:
+            response = HTTP.get(api_url, params=params, headers=headers, browser=True)
+            if response.status_code == 200:
+                data = response.json()
+                items = data.get('results', {}).get('song', {}).get('data', [])
+                for item in items[:SONG_SEARCH_LIMIT]:
+                    artist = item.get('artist') if isinstance(item.get('artist'), dict) else {}
+                    slug = item.get('url_slug', '')
+                    artist_slug = artist.get('url_slug', '')
+                    if slug and artist_slug:
+                        found.append({
+                            'title': item.get('title', query)[:60],
+                            'url': f"https://audiomack.com/{artist_slug}/song/{slug}",
+                            'source': 'audiomack',
+                            'duration': int(item.get('duration', 0) or 0),
+                            'uploader': artist.get('name', '')
+                        })
+        except Exception as e:
+            print(f"[Audiomack] Error: {str(e)[:50]}")
+        
+        # Fallback: yt-dlp search si la API no devuelve nada
+        if not found:
+            for entry in self.ytdlp_search(f"ytsearch5:{query} audiomack")[:5]:
+                u = entry.get('url') or f"https://www.youtube.com/watch?v={entry.get('id','')}"
+                found.append({
+                    'title': (entry.get('title') or query)[:60],
+                    'url': u,
+                    'source': 'audiomack',
+                    'duration': entry.get('duration', 0) or 0,
+                    'uploader': entry.get('uploader', '') or ''
+                })
+        return found
+    
     def display_song_results(self, results):
-        # Debug: mostrar qué llega
-        print(f"[DEBUG] display_song_results recibió {len(results)} resultados")
-        for r in results[:3]:
-            print(f"  - {r.get('source', '?')}: {r.get('title', '?')[:40]}")
-        
-        for widget in self.song_results_container.winfo_children():
-            widget.destroy()
-            
-        if not results:
-            ctk.CTkLabel(
-                self.song_results_container,
-                text="No se encontraron resultados",
-                text_color=COLORS['text_secondary']
-            ).grid(row=0, column=0, pady=10)
-            return
-            
-        for idx, result in enumerate(results):
-            row = idx
-            result_frame = ctk.CTkFrame(self.song_results_container, fg_color=COLORS['bg_card'], corner_radius=8)
-            result_frame.grid(row=row, column=0, sticky="ew", pady=5)
-            result_frame.grid_columnconfigure(1, weight=1)
-            
-            # Fuente
-            source_label = ctk.CTkLabel(
-                result_frame,
-                text=result['source'].upper(),
-                font=ctk.CTkFont(size=10, weight="bold"),
-                text_color=COLORS['accent'],
-                width=80
-            )
-            source_label.grid(row=0, column=0, padx=10, pady=10, sticky="w")
-            
-            # Info
-            title = result['title'][:60]
-            duration = int(result.get('duration', 0))
-            mins = duration // 60 if duration else 0
-            secs = duration % 60 if duration else 0
-            duration_str = f"{mins}:{secs:02d}" if duration else ""
-            
-            info_frame = ctk.CTkFrame(result_frame, fg_color="transparent")
-            info_frame.grid(row=0, column=1, sticky="ew", padx=5)
-            
-            ctk.CTkLabel(
-                info_frame,
-                text=title,
-                font=ctk.CTkFont(size=12),
-                text_color=COLORS['text_primary'],
-                anchor="w"
-            ).pack(fill="x")
-            
-            if result.get('uploader'):
-                ctk.CTkLabel(
-                    info_frame,
-                    text=result['uploader'][:40],
-                    font=ctk.CTkFont(size=10),
-                    text_color=COLORS['text_secondary'],
-                    anchor="w"
-                ).pack(fill="x")
-            
-            # Botones
-            btn_frame = ctk.CTkFrame(result_frame, fg_color="transparent")
-            btn_frame.grid(row=0, column=2, padx=10)
-            
-            # Preview button
-            preview_btn = ctk.CTkButton(
-                btn_frame,
-                text="▶",
-                width=35,
-                height=35,
-                fg_color=COLORS['bg_secondary'],
-                hover_color=COLORS['accent_hover'],
-                command=lambda r=result: self.preview_song(r['url'])
-            )
-            preview_btn.pack(side="left", padx=2)
-            
-            # Download button
-            download_btn = ctk.CTkButton(
-                btn_frame,
-                text="⬇",
-                width=35,
-                height=35,
-                fg_color=COLORS['action_play'],
-                hover_color=COLORS['accent_hover'],
-                command=lambda r=result: self.download_single_song(r)
-            )
-            download_btn.pack(side="left", padx=2)
+        self.song_results_list.set_empty_text("No se encontraron resultados")
+        self.song_results_list.set_items(results)
+    
+    def append_song_results(self, results):
+        """Añade filas al final de la lista (cada fuente según va respondiendo)"""
+        self.song_results_list.append(results)
             
     def preview_song(self, url):
         if not url:
             return
         self.update_status(f"Cargando preview...")
         
-        def do_preview():
-            try:
-                import yt_dlp
-                temp_dir = tempfile.gettempdir()
-                temp_file = os.path.join(temp_dir, f"preview_{int(time.time())}")
-                
-                ydl_opts = {
-                    'format': 'worstaudio/worst',  # Mas rapido
-                    'outtmpl': temp_file,
-                    'quiet': True,
-                    'no_warnings': True,
-                    'duration_limit': 35,
-                }
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([url])
-                
-                # Buscar archivo descargado
-                for f in os.listdir(temp_dir):
-                    if f.startswith('preview_'):
-                        filepath = os.path.join(temp_dir, f)
-                        if PYGAME_AVAILABLE:
-                            pygame.mixer.music.load(filepath)
-                            pygame.mixer.music.play()
-                            self.root.after(0, lambda: self.update_status(f"Reproduciendo preview..."))
-                        break
-                        
-            except Exception as e:
-                self.root.after(0, lambda: self.update_status(f"Error preview: {str(e)[:40]}"))
+        def update_progress(current, total):
+            self.ui.post('preview_progress', lambda: self.update_progress_slider(current, total))
         
-        threading.Thread(target=do_preview, daemon=True).start()
+        self.audio_player.play_url(url, progress_callback=update_progress)
+        self.play_pause_btn.configure(text="⏸", fg_color=COLORS['action_play'])
         
-    def download_single_song(self, result):
-        url = result['url']
-        title = result['title']
+    def download_single_song(self, result, job_id=None):
+        url = result.get('url')
+        title = result.get('title', '')
+        if not url:
+            self.job_state(job_id, 'failed', 'sin URL')
+            return
         
         output_folder = os.path.join(self.download_path, "Singles")
         os.makedirs(output_folder, exist_ok=True)
         
+        if job_id is None:
+            job_id = self.journal.add('single', {'result': {k: result.get(k) for k in ('title', 'url', 'source')}})
+        
         self.update_status(f"Descargando: {title}")
         
         def do_download():
-            # Obtener calidad configurada
-            quality = self.quality_var.get()
-            # Obtener ubicación de ffmpeg
-            ffmpeg_dir = os.path.dirname(self.ffmpeg_path) if self.ffmpeg_path and os.path.dirname(self.ffmpeg_path) else None
-            
-            # Reintentos
-            for attempt in range(3):
-                try:
-                    ydl_opts = {
-                        'format': 'bestaudio/best',
-                        'outtmpl': os.path.join(output_folder, '%(title)s.%(ext)s'),
-                        'quiet': True,
-                        'no_warnings': True,
-                        # FFmpeg location
-                        'ffmpeg_location': ffmpeg_dir,
-                        # Headers para evitar bloqueos
-                        'http_headers': {
-                            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                        },
-                        'retries': 5,
-                        'fragment_retries': 5,
-                        'socket_timeout': 120,
-                        # Opciones para YouTube
-                        'extractor_args': {
-                            'youtube': {
-                                'player_client': ['android', 'web'],
-                            }
-                        },
-                        # Convertir a MP3 con calidad configurada
-                        'postprocessors': [{
-                            'key': 'FFmpegExtractAudio',
-                            'preferredcodec': 'mp3',
-                            'preferredquality': quality,
-                        }],
-                    }
-                    
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        ydl.download([url])
+            metrics_mark = self.metrics.mark()
+            trace = self.tracer.begin('single')
+            try:
+                # Obtener calidad y formato configurados
+                quality = self.quality_var.get()
+                output_format = self.output_format
+                # Obtener ubicación de ffmpeg
+                ffmpeg_dir = os.path.dirname(self.ffmpeg_path) if self.ffmpeg_path and os.path.dirname(self.ffmpeg_path) else None
+                
+                # Reintentos
+                for attempt in range(3):
+                    try:
+                        ydl_opts = {
+                            'format': 'bestaudio/best',
+                            'outtmpl': '%(title)s.%(ext)s',
+                            'quiet': True,
+                            'no_warnings': True,
+                            # FFmpeg location
+                            'ffmpeg_location': ffmpeg_dir,
+                            # Headers para evitar bloqueos
+                            'http_headers': {
+                                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                            },
+                            'retries': 5,
+                            'fragment_retries': 5,
+                            'socket_timeout': 120,
+                            # Opciones para YouTube
+                            'extractor_args': {
+                                'youtube': {
+                                    'player_client': ['android', 'web'],
+                                }
+                            },
+                            # Convertir a MP3 con calidad configurada, o en modo
+                            # "Original" solo remux al contenedor del codec (sin recodificar)
+                            'postprocessors': [{
+                                'key': 'FFmpegExtractAudio',
+                                'preferredcodec': 'best' if output_format == 'original' else 'mp3',
+                                'preferredquality': quality,
+                            }],
+                            'postprocessor_hooks': [
+                                self.job_postprocessor_hook(job_id)
+                            ],
+                        }
                         
-                    self.add_to_history(title, url, result.get('source', 'unknown'))
-                    self.root.after(0, lambda t=title: self.update_status(f"✓ Descargado: {t}"))
-                    self.root.after(0, lambda t=title: messagebox.showinfo("Info", f"Descargado: {t}"))
-                    return
+                        self.job_state(job_id, 'downloading')
+                        # Los reintentos continuan el .part del intento anterior
+                        info = self.ytdlp_download(url, ydl_opts, output_folder, label=title)
+                        for path in self.downloaded_files(info):
+                            self.library_file_added(path)
                         
-                except Exception as e:
-                    error_msg = str(e)
-                    if attempt < 2:
-                        time.sleep(2 + attempt)
-                    else:
-                        self.root.after(0, lambda err=error_msg: self.update_status(f"✗ Error: {err[:50]}"))
+                        self.job_state(job_id, 'done')
+                        self.add_to_history(title, url, result.get('source', 'unknown'))
+                        self.update_status(f"✓ Descargado: {title}")
+                        self.metrics.report_batch(metrics_mark, f"Cancion: {title}")
+                        self.ui.call(lambda t=title: messagebox.showinfo("Info", f"Descargado: {t}"))
+                        return
+                            
+                    except Exception as e:
+                        error_msg = str(e)
+                        if attempt < 2:
+                            with self.tracer.span('retry_wait', 'retry', attempt=attempt):
+                                time.sleep(2 + attempt)
+                        else:
+                            self.job_state(job_id, 'failed', error_msg)
+                            self.update_status(f"✗ Error: {error_msg[:50]}")
+                            self.metrics.report_batch(metrics_mark, f"Cancion: {title}")
+            finally:
+                self.tracer.end(trace)
                 
-        threading.Thread(target=do_download, daemon=True).start()
+        thread = threading.Thread(target=do_download, name="single", daemon=True)
+        thread.start()
+        return thread
         
     def add_to_history(self, title, url, source):
         if not hasattr(self, 'download_history'):
@@ -1557,8 +4412,17 @@ class DUKATOR:
             corner_radius=4,
             width=300
         )
-        self.progress_bar.grid(row=0, column=1, sticky="e", padx=15, pady=8)
-        self.progress_bar.set(0)
+        self.progress_bar.grid(row=0, column=2, sticky="e", padx=15, pady=8)
+        self.progress_bar.set(0)
+        
+        self.transfer_status_label = ctk.CTkLabel(
+            status_frame,
+            text="",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_muted'],
+            anchor="e"
+        )
+        self.transfer_status_label.grid(row=0, column=1, sticky="e", padx=(15, 0), pady=8)
         
     def toggle_play_pause(self):
         if self.audio_player.is_playing and not self.audio_player.is_paused:
@@ -1577,8 +4441,9 @@ class DUKATOR:
         except:
             pass
         self.player_track_label.configure(text="Sin reproducción")
-        for card in self.track_cards:
-            card.stop_playing()
+        for track in self.current_tracks:
+            track['playing'] = False
+        self.tracks_list.refresh()
             
     def on_progress_seek(self, event=None):
         #pygame.mixer no soporta seek, pero podemos reiniciar desde donde seclickó
@@ -1594,8 +4459,8 @@ class DUKATOR:
         self.audio_player.set_volume(value)
         
     def update_player_status(self, text):
-        self.player_track_label.configure(text=text[:60])
-        self.root.update_idletasks()
+        # Llega desde el hilo del reproductor
+        self.ui.post('player_status', lambda: self.player_track_label.configure(text=text[:60]))
         
     def handle_preview(self, search_query, callback=None, stop=False):
         if stop:
@@ -1604,17 +4469,27 @@ class DUKATOR:
             self.progress_slider.set(0)
             return
             
-        for card in self.track_cards:
-            if card.is_playing:
-                card.stop_playing()
+        for track in self.current_tracks:
+            if track.get('playing'):
+                track['playing'] = False
+                self.tracks_list.refresh(track)
         
         # Callback para actualizar slider de progreso
         def update_progress(current, total):
-            self.root.after(0, lambda c=current, t=total: self.update_progress_slider(c, t))
+            self.ui.post('preview_progress', lambda: self.update_progress_slider(current, total))
         
         self.audio_player.play_preview(search_query, callback, progress_callback=update_progress)
         self.play_pause_btn.configure(text="⏸", fg_color=COLORS['action_play'])
         
+        # Lo normal es ir escuchando el album en orden: preparar las siguientes
+        queries = [TrackCard.preview_query(track) for track in self.current_tracks]
+        if search_query in queries:
+            self.prefetch_previews(queries.index(search_query) + 1)
+        
+    def prefetch_previews(self, start):
+        upcoming = self.current_tracks[start:start + PREVIEW_PREFETCH_COUNT]
+        self.audio_player.prefetch([TrackCard.preview_query(track) for track in upcoming])
+        
     def update_progress_slider(self, current, total):
         try:
             if total > 0 and current <= total:
@@ -1627,70 +4502,116 @@ class DUKATOR:
         secs = seconds % 60
         return f"{mins}:{secs:02d}"
         
+    def run_background(self, kind, work, on_result, on_error=None, pool=None):
+        """Ejecuta work() fuera del hilo de Tk y entrega el resultado por el bus de la UI.
+        
+        Una nueva tarea del mismo tipo deja obsoleta a la anterior: si aun no
+        habia empezado se cancela y, si ya estaba en curso, su resultado se descarta.
+        """
+        generation = self.task_generation.get(kind, 0) + 1
+        self.task_generation[kind] = generation
+        previous = self.task_futures.get(kind)
+        if previous:
+            previous.cancel()
+            
+        def is_current():
+            return self.task_generation.get(kind) == generation
+            
+        def deliver(callback, value):
+            if is_current() and callback:
+                callback(value)
+                
+        def task():
+            if not is_current():
+                return
+            try:
+                result = work()
+            except Exception as e:
+                # Ligar e ahora: al salir del except Python la borra
+                self.ui.call(lambda err=e: deliver(on_error, err))
+                return
+            self.ui.call(lambda: deliver(on_result, result))
+            
+        self.task_futures[kind] = (pool or self.metadata_pool).submit(task)
+        
+    def cancel_background(self, kind):
+        self.task_generation[kind] = self.task_generation.get(kind, 0) + 1
+        previous = self.task_futures.pop(kind, None)
+        if previous:
+            previous.cancel()
+            
+    def on_search_key(self, event):
+        if event.keysym in ('Return', 'KP_Enter'):
+            return
+        if self.search_debounce_id:
+            self.root.after_cancel(self.search_debounce_id)
+            self.search_debounce_id = None
+        query = self.search_entry.get().strip()
+        if len(query) >= SEARCH_MIN_CHARS and query != self.last_album_query:
+            self.search_debounce_id = self.root.after(SEARCH_DEBOUNCE_MS, self.search_album)
+            
     def search_album(self):
+        if self.search_debounce_id:
+            self.root.after_cancel(self.search_debounce_id)
+            self.search_debounce_id = None
+            
         query = self.search_entry.get().strip()
         if not query:
             return
+        self.last_album_query = query
             
         self.update_status("🔍 Buscando en MusicBrainz...")
         
         for widget in self.album_results_frame.winfo_children():
             widget.destroy()
             
-        for widget in self.tracks_list_frame.winfo_children():
-            widget.destroy()
-            
         self.current_tracks = []
-        self.track_cards = []
+        self.tracks_list.set_items([])
         self.update_selection_count()
+        self.cancel_background('tracks')
         
-        try:
-            url = "https://musicbrainz.org/ws/2/release/"
-            params = {
-                "query": query,
-                "fmt": "json",
-                "limit": 25
-            }
-            headers = {"User-Agent": "DUKATOR/2.0 (dukator@email.com)"}
+        def work():
+            with self.metrics.stage('musicbrainz_search', 'MusicBrainz'):
+                return self.musicbrainz.search_releases(query)
+                
+        self.run_background(
+            'albums',
+            work,
+            self.show_album_results,
+            lambda e: self.update_status(f"Error: {str(e)}")
+        )
+        
+    def show_album_results(self, data):
+        if "releases" not in data or not data["releases"]:
+            self.update_status("No se encontraron resultados")
+            return
             
-            response = requests.get(url, params=params, headers=headers, timeout=30)
-            data = response.json()
+        for release in data["releases"]:
+            artist_credit = release.get('artist-credit', [{}])
+            artist_name = artist_credit[0].get('artist', {}).get('name', 'Unknown') if artist_credit else 'Unknown'
             
-            if "releases" not in data or not data["releases"]:
-                self.update_status("No se encontraron resultados")
-                return
-                
-            for release in data["releases"]:
-                artist_credit = release.get('artist-credit', [{}])
-                artist_name = artist_credit[0].get('artist', {}).get('name', 'Unknown') if artist_credit else 'Unknown'
-                
-                release_text = f"{artist_name} - {release.get('title', 'Unknown')}"
-                if release.get('date'):
-                    release_text += f" ({release['date'][:4]})"
-                if release.get('country'):
-                    release_text += f" [{release.get('country')}]"
-                    
-                btn = StyledButton(
-                    self.album_results_frame,
-                    text=release_text,
-                    anchor="w",
-                    height=32,
-                    style="secondary"
-                )
-                btn.pack(pady=3, fill="x")
-                btn.configure(command=lambda r=release: self.load_tracks(r))
+            release_text = f"{artist_name} - {release.get('title', 'Unknown')}"
+            if release.get('date'):
+                release_text += f" ({release['date'][:4]})"
+            if release.get('country'):
+                release_text += f" [{release.get('country')}]"
                 
-            self.update_status(f"Encontrados {len(data['releases'])} álbumes")
+            btn = StyledButton(
+                self.album_results_frame,
+                text=release_text,
+                anchor="w",
+                height=32,
+                style="secondary"
+            )
+            btn.pack(pady=3, fill="x")
+            btn.configure(command=lambda r=release: self.load_tracks(r))
             
-        except Exception as e:
-            self.update_status(f"Error: {str(e)}")
+        self.update_status(f"Encontrados {len(data['releases'])} álbumes")
             
     def load_tracks(self, release):
-        for widget in self.tracks_list_frame.winfo_children():
-            widget.destroy()
-            
         self.current_tracks = []
-        self.track_cards = []
+        self.tracks_list.set_items([])
+        self.update_selection_count()
         
         release_id = release.get('id')
         if not release_id:
@@ -1698,56 +4619,66 @@ class DUKATOR:
             
         self.update_status("Cargando canciones...")
         
-        try:
-            url = f"https://musicbrainz.org/ws/2/release/{release_id}"
-            params = {"fmt": "json", "inc": "recordings"}
-            headers = {"User-Agent": "DUKATOR/2.0 (dukator@email.com)"}
-            
-            response = requests.get(url, params=params, headers=headers, timeout=30)
-            data = response.json()
-            
-            artist_credit = release.get('artist-credit', [{}])
-            artist_name = artist_credit[0].get('artist', {}).get('name', 'Unknown') if artist_credit else 'Unknown'
-            album_title = release.get('title', 'Unknown')
-            album_year = release.get('date', '')[:4] if release.get('date') else ''
+        def work():
+            with self.metrics.stage('musicbrainz_release', 'MusicBrainz'):
+                data = self.musicbrainz.get_release(release_id)
+            with self.metrics.stage('cover_art', 'CoverArtArchive') as stage:
+                cover_art = CoverArtFetcher.get_cover(release_id)
+                stage['bytes'] = len(cover_art or b'')
+                stage['outcome'] = 'ok' if cover_art else 'miss'
+            return data, cover_art
             
-            self.current_album_info = {
+        self.run_background(
+            'tracks',
+            work,
+            lambda result: self.show_tracks(release, *result),
+            lambda e: self.update_status(f"Error: {str(e)}")
+        )
+        
+    @staticmethod
+    def parse_release(release, data):
+        """Resultado de busqueda + release de MusicBrainz -> (album_info, pistas)"""
+        artist_credit = release.get('artist-credit', [{}])
+        artist_name = artist_credit[0].get('artist', {}).get('name', 'Unknown') if artist_credit else 'Unknown'
+        album_info = {
+            'artist': artist_name,
+            'album': release.get('title', 'Unknown'),
+            'year': release.get('date', '')[:4] if release.get('date') else '',
+            'release_id': release.get('id')
+        }
+        tracks = [
+            {
+                'number': track.get('position', 0),
+                'title': track.get('title', 'Unknown'),
+                'duration_ms': track.get('length', 0),
                 'artist': artist_name,
-                'album': album_title,
-                'year': album_year,
-                'release_id': release_id
             }
-            
-            self.current_cover_art = CoverArtFetcher.get_cover(release_id)
-            
-            tracks = data.get('media', [{}])[0].get('tracks', [])
+            for track in data.get('media', [{}])[0].get('tracks', [])
+        ]
+        return album_info, tracks
+        
+    def show_tracks(self, release, data, cover_art):
+        self.current_cover_art = cover_art
+        
+        try:
+            self.current_album_info, tracks = self.parse_release(release, data)
             
             for track in tracks:
-                track_num = track.get('position', 0)
-                track_title = track.get('title', 'Unknown')
-                duration_ms = track.get('length', 0)
-                
-                track_data = {
-                    'number': track_num,
-                    'title': track_title,
-                    'duration_ms': duration_ms,
-                    'selected': ctk.BooleanVar(value=True),
-                    'artist': artist_name
-                }
-                self.current_tracks.append(track_data)
-                
-                card = TrackCard(
-                    self.tracks_list_frame,
-                    track_data,
-                    on_preview=self.handle_preview
+                track_data = dict(
+                    track,
+                    selected=ctk.BooleanVar(value=True),
+                    status='pending',
+                    source='',
+                    playing=False
                 )
-                card.pack(pady=4, fill="x")
-                self.track_cards.append(card)
+                self.current_tracks.append(track_data)
                 
                 track_data['selected'].trace_add('write', self.update_selection_count)
-                
+            
+            self.tracks_list.set_items(self.current_tracks)
             self.update_selection_count()
             self.update_status(f"Cargadas {len(self.current_tracks)} canciones")
+            self.prefetch_previews(0)
             
         except Exception as e:
             self.update_status(f"Error: {str(e)}")
@@ -1786,6 +4717,26 @@ class DUKATOR:
             text_color=COLORS['text_secondary']
         ).pack(side="left")
         
+        self.library_filter_entry = ctk.CTkEntry(
+            header,
+            placeholder_text="Filtrar por artista, álbum, título o fuente...",
+            fg_color=COLORS['bg_secondary'],
+            border_color=COLORS['border'],
+            text_color=COLORS['text_primary'],
+            height=28,
+            width=320
+        )
+        self.library_filter_entry.pack(side="left", padx=(15, 5))
+        self.library_filter_entry.bind("<KeyRelease>", self.on_library_filter_key)
+        
+        self.library_count_label = ctk.CTkLabel(
+            header,
+            text="",
+            font=ctk.CTkFont(size=11),
+            text_color=COLORS['text_muted']
+        )
+        self.library_count_label.pack(side="left", padx=5)
+        
         scan_btn = ctk.CTkButton(
             header,
             text="🔄 Actualizar",
@@ -1796,98 +4747,117 @@ class DUKATOR:
         )
         scan_btn.pack(side="right", padx=5)
         
-        self.local_results_frame = ctk.CTkScrollableFrame(
+        self.local_results_list = VirtualList(
             self.tab_local,
-            fg_color=COLORS['bg_secondary'],
-            corner_radius=8
+            row_factory=lambda parent: LocalFileRow(parent, on_play=self.play_local_file),
+            row_height=62,
+            row_gap=6,
+            empty_text="No se encontraron archivos de audio"
         )
-        self.local_results_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
+        self.local_results_list.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
         
-        self.local_files = []
         self.scan_folder()
     
     def scan_folder(self):
-        if not hasattr(self, 'local_results_frame'):
+        """Pinta la biblioteca desde el indice al instante y la sincroniza en segundo plano"""
+        if not hasattr(self, 'local_results_list'):
             return
-            
-        for widget in self.local_results_frame.winfo_children():
-            widget.destroy()
         
-        audio_extensions = {'.mp3', '.wav', '.flac', '.m4a', '.ogg', '.aac', '.wma'}
-        audio_files = []
+        root = self.download_path
+        self.watch_library(root)
         
-        try:
-            for f in os.listdir(self.download_path):
-                ext = os.path.splitext(f.lower())[1]
-                if ext in audio_extensions:
-                    full_path = os.path.join(self.download_path, f)
-                    audio_files.append({
-                        'title': os.path.splitext(f)[0],
-                        'file': full_path,
-                        'ext': ext.upper()[1:],
-                        'size': os.path.getsize(full_path)
-                    })
-        except Exception as e:
-            self.update_status(f"Error escaneando carpeta: {str(e)[:50]}")
-            return
+        def load():
+            # Indexar 100k entradas lleva segundos: se construye fuera del hilo de Tk
+            return LibrarySearch().rebuild(self.library.load(root))
         
-        self.local_files = audio_files
+        def show_cached(search):
+            self.set_library_files(search)
+            self.update_status(f"📂 {len(search.entries)} archivos en la biblioteca (actualizando...)")
         
-        if not audio_files:
-            ctk.CTkLabel(
-                self.local_results_frame,
-                text="No se encontraron archivos de audio",
-                text_color=COLORS['text_muted']
-            ).pack(pady=20)
-            return
+        def progress(done, total):
+            self.update_status(f"📂 Leyendo etiquetas {done}/{total}...")
+        
+        def scan():
+            audio_files, stats = self.library.scan(root, on_progress=progress)
+            return LibrarySearch().rebuild(audio_files), stats
         
-        for idx, f in enumerate(audio_files):
-            size_mb = f['size'] / (1024 * 1024)
-            result_frame = ctk.CTkFrame(self.local_results_frame, fg_color=COLORS['bg_card'], corner_radius=8)
-            result_frame.pack(fill="x", pady=3)
-            
-            ctk.CTkLabel(
-                result_frame,
-                text=f['ext'],
-                font=ctk.CTkFont(size=10, weight="bold"),
-                text_color=COLORS['accent'],
-                width=40
-            ).pack(side="left", padx=8)
-            
-            info_frame = ctk.CTkFrame(result_frame, fg_color="transparent")
-            info_frame.pack(side="left", fill="x", expand=True, padx=5)
-            
-            ctk.CTkLabel(
-                info_frame,
-                text=f['title'][:60],
-                font=ctk.CTkFont(size=11),
-                text_color=COLORS['text_primary'],
-                anchor="w"
-            ).pack(fill="x")
-            
-            ctk.CTkLabel(
-                info_frame,
-                text=f"{size_mb:.1f} MB",
-                font=ctk.CTkFont(size=9),
-                text_color=COLORS['text_muted'],
-                anchor="w"
-            ).pack(fill="x")
-            
-            btn_frame = ctk.CTkFrame(result_frame, fg_color="transparent")
-            btn_frame.pack(side="right", padx=8)
-            
-            play_btn = ctk.CTkButton(
-                btn_frame,
-                text="▶",
-                width=35,
-                height=35,
-                fg_color=COLORS['bg_secondary'],
-                hover_color=COLORS['accent_hover'],
-                command=lambda fdata=f: self.play_local_file(fdata['file'])
+        def show(result):
+            search, stats = result
+            self.set_library_files(search)
+            self.update_status(
+                f"📂 {stats['total']} archivos de audio encontrados"
+                + (f" ({stats['changed']} nuevos/cambiados)" if stats['changed'] else "")
             )
-            play_btn.pack(side="left", padx=2)
         
-        self.update_status(f"📂 {len(audio_files)} archivos de audio encontrados")
+        # Mismo pool de un hilo: el escaneo arranca cuando termina la carga
+        self.run_background('library_load', load, show_cached, pool=self.library_pool)
+        self.run_background(
+            'library',
+            scan,
+            show,
+            lambda e: self.update_status(f"Error escaneando carpeta: {str(e)[:50]}"),
+            pool=self.library_pool
+        )
+
+    def set_library_files(self, search):
+        self.library_search = search
+        self.filter_library()
+    
+    def on_library_filter_key(self, event=None):
+        # Una sola pasada cuando se deja de escribir, no una por tecla
+        if self.library_filter_id:
+            self.root.after_cancel(self.library_filter_id)
+        self.library_filter_id = self.root.after(LIBRARY_FILTER_DEBOUNCE_MS, self.filter_library)
+    
+    def filter_library(self):
+        if self.library_filter_id:
+            self.root.after_cancel(self.library_filter_id)
+            self.library_filter_id = None
+        query = self.library_filter_entry.get().strip() if hasattr(self, 'library_filter_entry') else ''
+        if len(query) < LIBRARY_FILTER_MIN_CHARS:
+            # Una letra casa con media biblioteca: se muestra todo sin filtrar
+            query = ''
+        matches, count = self.library_search.search(query, limit=LIBRARY_FILTER_MAX_RESULTS if query else None)
+        self.local_results_list.set_items(matches)
+        total = len(self.library_search.entries)
+        if not query:
+            self.library_count_label.configure(text=f"{total}")
+        elif count > len(matches):
+            self.library_count_label.configure(text=f"{count}/{total} (se muestran {len(matches)})")
+        else:
+            self.library_count_label.configure(text=f"{count}/{total}")
+    
+    def watch_library(self, root):
+        """(Re)arranca el vigilante si la carpeta de la biblioteca ha cambiado"""
+        if self.library_watcher and self.library_watcher.root == os.path.abspath(root):
+            return
+        if self.library_watcher:
+            self.library_watcher.stop()
+        self.library_watcher = LibraryWatcher(
+            self.library,
+            root,
+            on_delta=lambda added, removed: self.ui.call(lambda: self.apply_library_delta(added, removed)),
+            on_overflow=lambda: self.ui.call(self.scan_folder)
+        ).start()
+    
+    def library_file_added(self, path):
+        """Llamado por los descargadores (desde su hilo) al publicar un archivo"""
+        try:
+            entry = self.library.add_file(path, self.download_path)
+        except Exception as e:
+            print(f"[Biblioteca] No se pudo indexar {path}: {e}")
+            return
+        if entry:
+            self.ui.call(lambda: self.apply_library_delta([entry], []))
+    
+    def apply_library_delta(self, added, removed):
+        """Altas/bajas sueltas en la vista, sin volver a escanear la carpeta"""
+        for path in removed:
+            self.library_search.remove(path)
+        for entry in added:
+            self.library_search.add(entry)
+        if hasattr(self, 'local_results_list'):
+            self.filter_library()
     
     def play_local_file(self, filepath):
         if not PYGAME_AVAILABLE:
@@ -1901,70 +4871,247 @@ class DUKATOR:
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo reproducir: {str(e)}")
             
+    def job_state(self, job_id, state, error=None):
+        if job_id:
+            self.journal.set_state(job_id, state, error)
+            
+    def job_postprocessor_hook(self, job_id):
+        """Hook de yt-dlp: marca el trabajo como 'transcoding' cuando arranca FFmpeg"""
+        def hook(d):
+            if d.get('status') == 'started':
+                self.job_state(job_id, 'transcoding')
+        return hook
+        
+    def resume_pending_jobs(self):
+        pending = self.journal.pending()
+        if not pending:
+            return
+            
+        if not messagebox.askyesno(
+            "Descargas pendientes",
+            f"Hay {len(pending)} descargas sin terminar de la sesión anterior.\n\n¿Reanudarlas?"
+        ):
+            for job in pending:
+                self.journal.set_state(job['id'], 'failed', 'descartado por el usuario')
+            self.journal.compact()
+            return
+            
+        albums = {}
+        bulk_links, bulk_ids = [], []
+        for job in pending:
+            payload = job.get('payload') or {}
+            kind = job.get('kind')
+            if kind == 'album_track':
+                album_info = payload.get('album_info', {})
+                key = (album_info.get('release_id'), album_info.get('artist'), album_info.get('album'))
+                group = albums.setdefault(key, {'album_info': album_info, 'tracks': [], 'jobs': []})
+                group['tracks'].append(dict(payload.get('track', {}), track_num=payload.get('track_num')))
+                group['jobs'].append(job['id'])
+            elif kind == 'bulk':
+                bulk_links.append(payload.get('url', ''))
+                bulk_ids.append(job['id'])
+            elif kind == 'single':
+                self.download_single_song(payload.get('result', {}), job_id=job['id'])
+                
+        for group in albums.values():
+            threading.Thread(
+                target=self.download_album_tracks,
+                args=(group['tracks'], group['album_info'], group['jobs']),
+                name="album",
+                daemon=True
+            ).start()
+        if bulk_links:
+            threading.Thread(target=self.download_bulk, args=(bulk_links, bulk_ids), name="bulk", daemon=True).start()
+            
+        self.update_status(f"Reanudando {len(pending)} descargas pendientes...")
+        
+    def set_track_state(self, track, status, source=None):
+        """Actualiza el modelo de la pista (desde cualquier hilo) y repinta su fila.
+        
+        Se compara por identidad (no titulo): dos pistas "Intro" no se pisan el estado.
+        """
+        def apply():
+            track['status'] = status
+            if source:
+                track['source'] = source
+            self.tracks_list.refresh(track)
+        self.ui.post(('track_state', id(track)), apply)
+    
     def download_selected(self):
         selected = [t for t in self.current_tracks if t['selected'].get()]
         if not selected:
             messagebox.showwarning("Aviso", "No hay canciones seleccionadas")
             return
             
-        threading.Thread(target=self.download_album_tracks, args=(selected,), daemon=True).start()
-        
-    def download_album_tracks(self, tracks):
-        album_info = self.current_album_info
+        threading.Thread(target=self.download_album_tracks, args=(selected,), name="album", daemon=True).start()
         
-        safe_artist = self.sanitize_filename(album_info.get('artist', 'Unknown'))
-        safe_album = self.sanitize_filename(album_info.get('album', 'Unknown'))
-        folder_name = f"{album_info.get('year', '')} - {safe_album}" if album_info.get('year') else safe_album
-        
-        output_folder = os.path.join(self.download_path, safe_artist, folder_name)
-        os.makedirs(output_folder, exist_ok=True)
-        
-        # Mostrar overlay
-        self.root.after(0, lambda: self.progress_overlay.show())
-        
-        cover_art = CoverArtFetcher.get_cover(album_info.get('release_id', ''))
-        if not cover_art:
-            cover_art = self.current_cover_art
-        
-        total = len(tracks)
-        
-        for idx, track in enumerate(tracks):
-            # Actualizar overlay
-            self.root.after(0, lambda i=idx, t=total: self.progress_overlay.update_progress(i+1, t, f"Buscando...", "YouTube"))
-            
-            # Marcar como descargando
-            for card in self.track_cards:
-                if card.track_data['title'] == track['title']:
-                    card.set_status('downloading')
-            
-            success = False
-            for source_id, source_name, _ in DOWNLOAD_SOURCES:
-                self.root.after(0, lambda s=source_name, t=track: self.progress_overlay.update_progress(idx+1, total, f"[{s}] {t['title'][:30]}...", s))
-                self.update_status(f"[{source_name}] Buscando: {track['title']}")
-                result = self.try_download_from_source(source_id, track, output_folder, idx + 1, cover_art)
-                if result:
-                    success = True
-                    self.update_status(f"✓ [{source_name}] Descargado: {track['title']}")
-                    for card in self.track_cards:
-                        if card.track_data['title'] == track['title']:
-                            card.set_source(source_name)
-                            card.set_status('success')
-                    break
-            if not success:
-                self.update_status(f"❌ No encontrado: {track['title']}")
-                for card in self.track_cards:
-                    if card.track_data['title'] == track['title']:
-                        card.set_status('error')
+    def download_album_tracks(self, tracks, album_info=None, job_ids=None):
+        metrics_mark = self.metrics.mark()
+        trace = self.tracer.begin('album')
+        try:
+            resumed = album_info is not None
+            album_info = dict(album_info if resumed else self.current_album_info)
+            
+            if job_ids is None:
+                job_ids = [
+                    self.journal.add('album_track', {
+                        'track': {k: track.get(k) for k in ('number', 'title', 'duration_ms', 'artist')},
+                        'track_num': idx + 1,
+                        'album_info': album_info,
+                    })
+                    for idx, track in enumerate(tracks)
+                ]
+            
+            safe_artist = self.sanitize_filename(album_info.get('artist', 'Unknown'))
+            safe_album = self.sanitize_filename(album_info.get('album', 'Unknown'))
+            folder_name = f"{album_info.get('year', '')} - {safe_album}" if album_info.get('year') else safe_album
+            
+            output_folder = os.path.join(self.download_path, safe_artist, folder_name)
+            os.makedirs(output_folder, exist_ok=True)
+            
+            # Mostrar overlay
+            self.ui.call(self.progress_overlay.show)
+            
+            cover_art = CoverArtFetcher.get_cover(album_info.get('release_id', ''))
+            if not cover_art and album_info.get('release_id') == self.current_album_info.get('release_id'):
+                cover_art = self.current_cover_art
                 
-            progress = (idx + 1) / total
-            self.progress_bar.set(progress)
-        
-        # Ocultar overlay
-        self.root.after(0, lambda: self.progress_overlay.hide())
-        self.root.after(0, lambda: self.update_status("✅ Descarga completada"))
-        self.root.after(0, lambda: messagebox.showinfo("Info", "Descarga completada"))
+            # FFmpeg incrusta la caratula desde la cache en disco; la carpeta del
+            # album lleva ademas su cover.jpg (SPEC §2.5)
+            cover_path = CoverArtFetcher.cover_path(album_info.get('release_id', ''))
+            if cover_art:
+                ext = IMAGE_EXTENSIONS.get(detect_image_mime(cover_art), 'jpg')
+                folder_cover = os.path.join(output_folder, f"cover.{ext}")
+                try:
+                    if not os.path.exists(folder_cover):
+                        with open(folder_cover + '.tmp', 'wb') as f:
+                            f.write(cover_art)
+                        os.replace(folder_cover + '.tmp', folder_cover)
+                    cover_path = cover_path or folder_cover
+                except OSError:
+                    pass
+            
+            total = len(tracks)
+            # Estado compartido entre hilos: canciones terminadas y en curso
+            state = {'done': 0, 'active': 0}
+            state_lock = threading.Lock()
+            finished = threading.Event()
+            
+            def report(status, source=""):
+                with state_lock:
+                    done, active = state['done'], state['active']
+                self.ui.post('overlay_progress', lambda: self.progress_overlay.update_progress(done, total, status, source, active))
+                self.set_progress(done / total if total else 0)
+            
+            def fetch_track(item):
+                # Etapa de red: buscar la pista y bajar el audio original a la cache
+                track, job_track = item['track'], item['job_track']
+                track_num, job_id = item['track_num'], item['job_id']
+                self.job_state(job_id, 'resolving')
+                with state_lock:
+                    state['active'] += 1
+                self.set_track_state(track, 'downloading')
+                
+                winner = None
+                tried = set()
+                if self.source_mode == 'race':
+                    report(f"[Carrera] {track['title'][:30]}...", "Carrera")
+                    self.update_status(f"[Carrera] Buscando: {track['title']}")
+                    winner = self.download_race_winner(job_track, output_folder, track_num, cover_art)
+                    # Las fuentes ya consultadas no se repiten en el recorrido secuencial
+                    tried = set(self.race_sources)
+                    
+                if not winner:
+                    for source_id, source_name, host in DOWNLOAD_SOURCES:
+                        if source_id in tried:
+                            continue
+                        report(f"[{source_name}] {track['title'][:30]}...", source_name)
+                        self.update_status(f"[{source_name}] Buscando: {track['title']}")
+                        with self.host_limiter.slot(host):
+                            result = self.try_download_from_source(source_id, job_track, output_folder, track_num, cover_art)
+                        if result:
+                            winner = source_name
+                            break
+                            
+                if not winner:
+                    raise Exception("no encontrado")
+                item['source_name'] = winner
+                item['files'] = job_track.get('fetched_files', [])
+                return item
+                
+            def track_done(item, error):
+                track, job_id = item['track'], item['job_id']
+                if error is None:
+                    winner = item['source_name']
+                    self.job_state(job_id, 'done')
+                    self.update_status(f"✓ [{winner}] Descargado: {track['title']}")
+                    self.set_track_state(track, 'success', winner)
+                else:
+                    self.job_state(job_id, 'failed', error)
+                    self.update_status(f"❌ {track['title']}: {str(error)[:40]}")
+                    self.set_track_state(track, 'error')
+                
+                with state_lock:
+                    state['active'] = max(0, state['active'] - 1)
+                    state['done'] += 1
+                    all_done = state['done'] >= total
+                report(track['title'][:30])
+                if all_done:
+                    finished.set()
+            
+            report("Buscando...", "YouTube")
+            workers = max(1, min(self.album_workers, total))
+            transcoders = max(1, min(self.transcode_workers, total))
+            pipeline = DownloadPipeline([
+                ('Red', fetch_track, workers, 0),
+                ('FFmpeg', self.transcode_stage, transcoders, transcoders * 2),
+                ('Tags', self.tag_stage, 1, 4),
+            ], on_done=track_done, tracer=self.tracer)
+            
+            for idx, track in enumerate(tracks):
+                job_id = job_ids[idx]
+                pipeline.submit({
+                    'kind': 'album',
+                    'track': track,
+                    'job_track': dict(track, album_info=album_info, job_id=job_id),
+                    # Cada pista tiene su numero fijo => nombre de salida unico
+                    'track_num': track.get('track_num') or idx + 1,
+                    'job_id': job_id,
+                    'output_folder': output_folder,
+                    'cover_art': cover_art,
+                    'cover_path': cover_path,
+                    'quality': self.quality_var.get(),
+                    'output_format': self.output_format,
+                })
+                
+            # Mientras tanto, mostrar el uso de cada etapa y el avance por bytes
+            while total and not finished.wait(1.0):
+                self.ui.post('overlay_stages', lambda text=pipeline.describe(): self.progress_overlay.update_stages(text))
+                with state_lock:
+                    fraction = self.batch_fraction(state['done'], total)
+                self.set_progress(fraction)
+                self.ui.post('overlay_fraction', lambda: self.progress_overlay.set_fraction(fraction))
+            pipeline.close()
+            
+            self.journal.compact()
+            self.candidate_cache.flush()
+            self.metrics.report_batch(metrics_mark, f"Album: {album_info.get('artist', '')} - {album_info.get('album', '')}")
+            
+            # Ocultar overlay
+            self.ui.call(self.progress_overlay.hide)
+            self.update_status("✅ Descarga completada")
+            self.ui.call(lambda: messagebox.showinfo("Info", "Descarga completada"))
+        finally:
+            self.tracer.end(trace)
         
     def try_download_from_source(self, source, track, output_folder, track_num, cover_art=None):
+        """Un intento en una fuente (busqueda + descarga), medido como etapa 'source'"""
+        with self.metrics.stage('source', source) as stage:
+            ok = self.download_from_source(source, track, output_folder, track_num, cover_art)
+            stage['outcome'] = 'ok' if ok else 'miss'
+        return ok
+        
+    def download_from_source(self, source, track, output_folder, track_num, cover_art=None):
         try:
             if source == 'youtube':
                 return self.download_from_youtube(track, output_folder, track_num, cover_art)
@@ -1982,40 +5129,213 @@ class DUKATOR:
             return False
         return False
         
-    def download_from_any_source(self, source, track, output_folder, track_num, cover_art=None):
-        search_query = f"{self.current_album_info.get('artist', '')} {track['title']} audio"
+    def resolve_candidates(self, source, track, cancel_event=None):
+        """Busca candidatos en una fuente sin descargar nada"""
+        if cancel_event is not None and cancel_event.is_set():
+            return []
+        resolver = self.candidate_resolvers.get(source)
+        if resolver:
+            # audiomack/vimeo/bandcamp: sin buscador propio (ver download_from_*)
+            return resolver(track)
+        return self.resolve_any_source(source, track)
+            
+    def race_resolve(self, track, deadline=RACE_DEADLINE):
+        """Consulta self.race_sources en paralelo y devuelve candidatos ordenados por puntuacion"""
+        ranks = {source_id: rank for rank, (source_id, _, _) in enumerate(DOWNLOAD_SOURCES)}
+        cancel_event = threading.Event()
+        futures = {
+            self.resolve_pool.submit(self.resolve_candidates, source_id, track, cancel_event): source_id
+            for source_id in self.race_sources
+        }
+        
+        scored = []
+        pending = set(futures)
+        end_time = time.time() + deadline
+        while pending:
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                source_id = futures[future]
+                try:
+                    candidates = future.result() or []
+                except Exception:
+                    candidates = []
+                for candidate in candidates:
+                    candidate['source'] = source_id
+                    candidate['score'] = CandidateScorer.score(
+                        track, candidate, ranks.get(source_id, len(ranks)), len(ranks)
+                    )
+                    if candidate['score'] >= RACE_MIN_SCORE:
+                        scored.append(candidate)
+            if any(c['score'] >= RACE_GOOD_ENOUGH for c in scored):
+                break
+                
+        # Perdedores: los no empezados se cancelan (y ven el evento si ya iban a
+        # arrancar); los que estan en vuelo no se pueden parar, terminan solos
+        # (acotados por RACE_SEARCH_TIMEOUT/HTTP_TIMEOUT) y sus resultados se ignoran
+        cancel_event.set()
+        for future in pending:
+            future.cancel()
+            
+        scored.sort(key=lambda c: c['score'], reverse=True)
+        return scored
+        
+    def download_race_winner(self, track, output_folder, track_num, cover_art=None):
+        """Descarga el mejor candidato de la carrera. Devuelve el nombre de la fuente o None"""
+        hosts = {source_id: (name, host) for source_id, name, host in DOWNLOAD_SOURCES}
+        for candidate in self.race_resolve(track)[:RACE_MAX_ATTEMPTS]:
+            source_name, host = hosts.get(candidate['source'], (candidate['source'].capitalize(), None))
+            with self.host_limiter.slot(host):
+                try:
+                    ok = self.download_with_ytdlp(candidate['url'], output_folder, track, track_num, source_name, cover_art)
+                except Exception:
+                    ok = False
+            if ok:
+                return source_name
+        return None
+        
+    def resolve_any_source(self, source, track):
+        search_query = f"{track.get('artist', '')} {track['title']} audio"
+        return self.candidate_cache.fetch(
+            f"{source}search", search_query,
+            lambda: self.timed_search(source, lambda q: self.search_any_source(source, q), search_query)
+        )
+    
+    def search_any_source(self, source, search_query):
+        candidates = []
         try:
             ydl_opts = {
-                'format': 'bestaudio/best',
                 'quiet': True,
                 'no_warnings': True,
-                'max_downloads': 1,
+                'extract_flat': 'in_playlist',
+                'playlist_items': '1:3',
+                'socket_timeout': RACE_SEARCH_TIMEOUT,
             }
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info = ydl.extract_info(f"{source}search:{search_query}", download=False)
                 if info and 'entries' in info:
-                    entries = list(info['entries'])
-                    if entries and entries[0]:
-                        video_url = entries[0].get('webpage_url')
+                    for entry in list(info['entries']):
+                        if not entry:
+                            continue
+                        video_url = entry.get('webpage_url') or entry.get('url')
                         if video_url:
-                            return self.download_with_ytdlp(video_url, output_folder, track, track_num, source.capitalize(), cover_art)
+                            candidates.append({
+                                'url': video_url,
+                                'title': entry.get('title', '') or '',
+                                'duration': entry.get('duration', 0) or 0,
+                                'uploader': entry.get('uploader', '') or '',
+                            })
         except:
             pass
-        return False
+        return candidates
         
-    def download_from_youtube(self, track, output_folder, track_num, cover_art=None):
-        search_query = f"{self.current_album_info.get('artist', '')} {track['title']} audio"
+    def resolve_youtube(self, track):
+        return self.resolve_youtube_query(f"{track.get('artist', '')} {track['title']} audio")
+    
+    def resolve_youtube_query(self, search_query):
+        """Pagina de resultados de YouTube (cacheada): la usan preview y descargas"""
+        return self.candidate_cache.fetch('youtube', search_query, lambda: self.timed_search('youtube', self.search_youtube_page, search_query))
+    
+    def search_youtube_page(self, search_query):
         url = "https://www.youtube.com/results"
         params = {"search_query": search_query}
-        response = requests.get(url, params=params, timeout=30)
-        match = re.search(r'"videoId":"([^"]+)"', response.text)
-        if match:
-            video_url = f"https://www.youtube.com/watch?v={match.group(1)}"
-            return self.download_with_ytdlp(video_url, output_folder, track, track_num, 'YouTube', cover_art)
+        response = HTTP.get(url, params=params, browser=True)
+        return self.parse_youtube_results(response.text)
+        
+    def parse_youtube_results(self, html, limit=5):
+        """Extrae id, titulo y duracion de la pagina de resultados de YouTube"""
+        candidates = []
+        seen = set()
+        matches = list(re.finditer(r'"videoRenderer":\{"videoId":"([^"]+)"', html))
+        for idx, match in enumerate(matches):
+            video_id = match.group(1)
+            if video_id in seen:
+                continue
+            seen.add(video_id)
+            # El bloque de cada video termina donde empieza el siguiente
+            chunk_end = matches[idx + 1].start() if idx + 1 < len(matches) else match.end() + 6000
+            chunk = html[match.end():chunk_end]
+            title = ''
+            title_match = re.search(r'"title":\{"runs":\[\{"text":"((?:[^"\\]|\\.)*)"', chunk)
+            if title_match:
+                try:
+                    title = json.loads(f'"{title_match.group(1)}"')
+                except ValueError:
+                    title = title_match.group(1)
+            duration = 0
+            length_match = re.search(r'"lengthText":\{.{0,300}?"simpleText":"([\d:]+)"', chunk, re.S)
+            if length_match:
+                for part in length_match.group(1).split(':'):
+                    duration = duration * 60 + int(part)
+            candidates.append({
+                'url': f"https://www.youtube.com/watch?v={video_id}",
+                'title': title,
+                'duration': duration,
+                'uploader': '',
+            })
+            if len(candidates) >= limit:
+                break
+                
+        # Fallback: formato de pagina desconocido, primer videoId como antes
+        if not candidates:
+            match = re.search(r'"videoId":"([^"]+)"', html)
+            if match:
+                candidates.append({
+                    'url': f"https://www.youtube.com/watch?v={match.group(1)}",
+                    'title': '',
+                    'duration': 0,
+                    'uploader': '',
+                })
+        return candidates
+        
+    def resolve_soundcloud(self, track):
+        search_query = f"{track.get('artist', '')} {track['title']}"
+        return self.candidate_cache.fetch('soundcloud', search_query, lambda: self.timed_search('soundcloud', self.search_soundcloud, search_query))
+    
+    def search_soundcloud(self, search_query):
+        candidates = []
+        try:
+            ydl_opts = {
+                'quiet': True,
+                'no_warnings': True,
+                'extract_flat': True,
+                'playlist_items': '1:5',
+                'socket_timeout': RACE_SEARCH_TIMEOUT,
+            }
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(f"scsearch5:{search_query}", download=False)
+                if info and 'entries' in info:
+                    for entry in list(info['entries']):
+                        if not entry:
+                            continue
+                        track_url = entry.get('url') or entry.get('webpage_url')
+                        if track_url:
+                            candidates.append({
+                                'url': track_url,
+                                'title': entry.get('title', '') or '',
+                                'duration': entry.get('duration', 0) or 0,
+                                'uploader': entry.get('uploader', '') or '',
+                            })
+        except:
+            pass
+        return candidates
+        
+    def download_from_any_source(self, source, track, output_folder, track_num, cover_art=None):
+        candidates = self.resolve_any_source(source, track)
+        if candidates:
+            return self.download_with_ytdlp(candidates[0]['url'], output_folder, track, track_num, source.capitalize(), cover_art)
+        return False
+        
+    def download_from_youtube(self, track, output_folder, track_num, cover_art=None):
+        candidates = self.resolve_youtube(track)
+        if candidates:
+            return self.download_with_ytdlp(candidates[0]['url'], output_folder, track, track_num, 'YouTube', cover_art)
         return False
         
     def download_from_audiomack(self, track, output_folder, track_num, cover_art=None):
-        search_query = f"{self.current_album_info.get('artist', '')} {track['title']}"
+        search_query = f"{track.get('artist', '')} {track['title']}"
         try:
             import yt_dlp
             search_url = f"https://audiomack.com/search?q={url_quote(search_query)}"
@@ -2035,31 +5355,10 @@ class DUKATOR:
             return False
         
     def download_from_soundcloud(self, track, output_folder, track_num, cover_art=None):
-        search_query = f"{self.current_album_info.get('artist', '')} {track['title']}"
-        try:
-            import yt_dlp
-            search_url = f"scsearch5:{search_query}"
-            
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': True,
-                'playlist_items': '1',
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(search_url, download=False)
-                if info and 'entries' in info:
-                    entries = list(info['entries'])
-                    if entries and entries[0]:
-                        first_entry = entries[0]
-                        track_url = first_entry.get('url') or first_entry.get('webpage_url')
-                        if track_url:
-                            return self.download_with_ytdlp(track_url, output_folder, track, track_num, 'SoundCloud', cover_art)
-            return False
-        except:
-            return False
+        candidates = self.resolve_soundcloud(track)
+        if candidates:
+            return self.download_with_ytdlp(candidates[0]['url'], output_folder, track, track_num, 'SoundCloud', cover_art)
+        return False
         
     def download_from_vimeo(self, track, output_folder, track_num, cover_art=None):
         return False
@@ -2067,21 +5366,79 @@ class DUKATOR:
     def download_from_bandcamp(self, track, output_folder, track_num, cover_art=None):
         return False
         
+    def ytdlp_download(self, url, ydl_opts, output_folder, keep_in_cache=False, label=None, source=None):
+        """Descarga con yt-dlp reanudando el .part de un intento o sesion anterior.
+        
+        ydl_opts['outtmpl'] debe ser relativo: el parcial vive en la cache
+        (self.partials) y yt-dlp mueve el resultado final a output_folder.
+        Con keep_in_cache el original se queda en la cache para la etapa de
+        FFmpeg (y un reinicio no lo vuelve a bajar). El avance en bytes se
+        publica en self.transfers con el nombre label, y los tiempos de
+        extraccion, transferencia y postprocesado con FFmpeg en self.metrics
+        con la fuente source.
+        """
+        ydl_opts = dict(ydl_opts)
+        cache_dir = self.partials.dir_for(output_folder)
+        ydl_opts['paths'] = {'home': cache_dir if keep_in_cache else output_folder, 'temp': cache_dir}
+        ydl_opts['continuedl'] = True
+        ydl_opts['nopart'] = False
+        
+        source = source or SourceDetector.get_display_name(SourceDetector.detect(url))
+        transfer_stage = self.metrics.stage('transfer', source)
+        
+        def postprocessing_started(d):
+            # FFmpeg dentro de yt-dlp no es red: desde aqui es 'postprocess', aparte
+            # del 'transcode' de la etapa de FFmpeg. En listas el corte es en el primero
+            if d.get('status') == 'started' and d.get('postprocessor', '') in YTDLP_FFMPEG_POSTPROCESSORS:
+                transfer_stage.split('postprocess')
+                
+        transfer_key = uuid.uuid4().hex
+        progress_hook, postprocessor_hook = self.transfers.hooks(transfer_key, label or url)
+        ydl_opts['progress_hooks'] = list(ydl_opts.get('progress_hooks') or []) + [progress_hook]
+        ydl_opts['postprocessor_hooks'] = list(ydl_opts.get('postprocessor_hooks') or []) + [postprocessor_hook, postprocessing_started]
+        
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                with self.metrics.stage('extract', source):
+                    info = ydl.extract_info(url, download=False)
+                    if info is None:
+                        raise Exception("No se pudo extraer informacion")
+                with transfer_stage as stage:
+                    if info.get('_type') in ('playlist', 'multi_video'):
+                        # Listas (sets de SoundCloud, albumes...): sin validacion por entrada
+                        result = ydl.process_ie_result(info, download=True)
+                    else:
+                        part_path = self.partials.prepare(ydl, info)
+                        result = ydl.process_ie_result(info, download=True)
+                        self.partials.finish(part_path)
+                    stage['bytes'] = sum(os.path.getsize(f) for f in self.downloaded_files(result))
+                return result
+        finally:
+            self.transfers.finish(transfer_key)
+            
+    def downloaded_files(self, info):
+        """Rutas de los ficheros que yt-dlp ha dejado en disco (incluye listas)"""
+        if not info:
+            return []
+        if info.get('entries') is not None:
+            files = []
+            for entry in info['entries']:
+                files.extend(self.downloaded_files(entry))
+            return files
+        files = [d.get('filepath') for d in info.get('requested_downloads') or [] if d.get('filepath')]
+        if not files and info.get('filepath'):
+            files = [info['filepath']]
+        return [f for f in files if os.path.exists(f)]
+        
     def download_with_ytdlp(self, url, output_folder, track, track_num, source='YouTube', cover_art=None):
+        """Etapa de red: baja el audio original a la cache (FFmpeg y etiquetas van despues)"""
         try:
             safe_title = self.sanitize_filename(track['title'])
-            output_template = os.path.join(output_folder, f"{track_num:02d} - {safe_title}.%(ext)s")
-            
-            quality = self.quality_var.get()
-            
-            # Obtener ubicación de ffmpeg
-            ffmpeg_dir = os.path.dirname(self.ffmpeg_path) if self.ffmpeg_path and os.path.dirname(self.ffmpeg_path) else None
+            output_name = f"{track_num:02d} - {safe_title}.%(ext)s"
             
             ydl_opts = {
-                # Priorizar m4a/webm nativos para evitar re-encode innecesario
-                'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
-                'outtmpl': output_template,
-                'ffmpeg_location': ffmpeg_dir,
+                'format': FETCH_FORMATS.get(self.output_format, FETCH_FORMATS['mp3']),
+                'outtmpl': output_name,
                 # Headers para evitar bloqueos
                 'http_headers': {
                     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -2100,60 +5457,294 @@ class DUKATOR:
                         'player_client': ['web', 'android_vr'],
                     }
                 },
-                # Convertir a MP3
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': quality,
-                }],
+                # Sin postprocesado: la conversion la hace la etapa de FFmpeg
                 'quiet': True,
                 'no_warnings': True,
                 'ignoreerrors': False,
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                
-                downloaded_file = output_template.replace('.%(ext)s', '.mp3')
-                
-                if os.path.exists(downloaded_file):
-                    self.add_metadata(downloaded_file, track, track_num, cover_art, source)
-                    return True
+            self.job_state(track.get('job_id'), 'downloading')
+            info = self.ytdlp_download(url, ydl_opts, output_folder, keep_in_cache=True, label=track['title'], source=source)
+            
+            files = self.downloaded_files(info)
+            if files:
+                track['fetched_files'] = files
+                return True
                     
         except Exception as e:
-            self.root.after(0, lambda err=str(e): self.update_status(f"✗ Error descarga: {err[:40]}"))
+            self.update_status(f"✗ Error descarga: {str(e)[:40]}")
             
         return False
         
-    def add_metadata(self, filepath, track, track_num, cover_art=None, source='YouTube'):
-        try:
-            audio = MP3(filepath)
+    def run_ffmpeg(self, args):
+        """Ejecuta FFmpeg sin ventana de consola; lanza excepcion si falla"""
+        cmd = [self.ffmpeg_path or 'ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y'] + args
+        kwargs = {}
+        if sys.platform == 'win32':
+            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **kwargs)
+        if proc.returncode != 0:
+            raise Exception(f"FFmpeg: {proc.stderr.decode('utf-8', 'replace').strip()[-200:]}")
             
-            if audio.tags is None:
-                audio.add_tags()
-                
-            audio.tags['TIT2'] = TIT2(encoding=3, text=track['title'])
-            audio.tags['TPE1'] = TPE1(encoding=3, text=self.current_album_info.get('artist', 'Unknown'))
-            audio.tags['TALB'] = TALB(encoding=3, text=self.current_album_info.get('album', 'Unknown'))
-            audio.tags['TDRC'] = TDRC(encoding=3, text=self.current_album_info.get('year', ''))
-            audio.tags['TRCK'] = TRCK(encoding=3, text=str(track_num))
+    def probe_audio_codec(self, path):
+        """Codec de la primera pista de audio segun FFmpeg (p. ej. 'opus', 'aac')"""
+        cmd = [self.ffmpeg_path or 'ffmpeg', '-hide_banner', '-nostdin', '-i', path]
+        kwargs = {}
+        if sys.platform == 'win32':
+            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **kwargs)
+        match = re.search(r'Audio: ([A-Za-z0-9_]+)', proc.stderr.decode('utf-8', 'replace'))
+        return match.group(1).lower() if match else None
+        
+    def ffmpeg_tag_args(self, ext, tags, cover_path=None):
+        """Etiquetas (y caratula si el contenedor la admite) para el mismo pase de FFmpeg"""
+        args = ['-map_metadata', '-1']
+        for key, value in (
+            ('title', tags['title']),
+            ('artist', tags['artist']),
+            ('album', tags['album']),
+            ('date', tags['year']),
+            ('track', tags['track']),
+            # MP3: TXXX:SOURCE / FLAC y Ogg: comentario SOURCE
+            ('SOURCE', tags['source']),
+        ):
+            if value:
+                args += ['-metadata', f"{key}={value}"]
+        if cover_path and ext in FFMPEG_COVER_CONTAINERS:
+            args += [
+                '-map', '1:v:0', '-c:v', 'copy',
+                '-disposition:v:0', 'attached_pic',
+                '-metadata:s:v', 'title=Cover',
+                '-metadata:s:v', 'comment=Cover (front)',
+            ]
+        return args
+        
+    def encode_output(self, src, ext, codec_args, tags=None, cover_path=None):
+        """Un solo pase de FFmpeg: audio + etiquetas + caratula -> fichero en la cache.
+        
+        Devuelve (ruta, necesita_mutagen): mutagen solo hace falta si el
+        contenedor no admite las etiquetas o la caratula desde FFmpeg.
+        """
+        work_path = os.path.join(os.path.dirname(src), f"{os.path.splitext(os.path.basename(src))[0]}.out.{ext}")
+        embeds_tags = tags is not None and ext in FFMPEG_TAG_CONTAINERS
+        embeds_cover = bool(cover_path) and ext in FFMPEG_COVER_CONTAINERS
+        
+        args = ['-i', src]
+        if embeds_cover:
+            args += ['-i', cover_path]
+        args += ['-map', '0:a:0'] + codec_args
+        if embeds_tags:
+            args += self.ffmpeg_tag_args(ext, tags, cover_path if embeds_cover else None)
+        args += ['-f', CONTAINER_MUXERS[ext], work_path]
+        self.run_ffmpeg(args)
+        
+        needs_mutagen = tags is not None and (not embeds_tags or (bool(cover_path) and not embeds_cover))
+        return work_path, needs_mutagen
+        
+    def keep_native(self, src, tags=None, cover_path=None):
+        """Modo "Original": remux al contenedor del codec, sin recodificar.
+        
+        Devuelve (ruta, extension, necesita_mutagen) o None si el codec no
+        tiene contenedor nativo (entonces se convierte a MP3 como siempre).
+        """
+        codec = self.probe_audio_codec(src)
+        ext = NATIVE_CONTAINERS.get(codec)
+        codec_args = ['-c:a', 'copy']
+        if ext is None and codec and codec.startswith('pcm_'):
+            # PCM sin comprimir: FLAC es sin perdidas y ocupa la mitad
+            ext, codec_args = 'flac', ['-c:a', 'flac']
+        if ext is None:
+            return None
             
-            if cover_art:
-                audio.tags['APIC'] = APIC(
-                    encoding=3,
-                    mime='image/jpeg',
-                    type=3,
-                    desc='Cover',
-                    data=cover_art
-                )
+        if os.path.splitext(src)[1].lower() == f".{ext}" and (tags is None or ext not in FFMPEG_TAG_CONTAINERS):
+            # Ya esta en su contenedor: ni FFmpeg hace falta (mutagen etiqueta si toca)
+            return src, ext, tags is not None
             
-            audio.tags['TXXX:SOURCE'] = TXXX(encoding=3, desc='SOURCE', text=source)
+        work_path, needs_mutagen = self.encode_output(src, ext, codec_args, tags, cover_path)
+        return work_path, ext, needs_mutagen
+        
+    def transcode_stage(self, item):
+        """Etapa de CPU: convierte (o solo remuxa) y etiqueta en un unico pase de FFmpeg"""
+        with self.metrics.stage('transcode', item.get('source_name', '')) as stage:
+            self.transcode_files(item)
+            stage['bytes'] = sum(os.path.getsize(o['work_path']) for o in item['outputs'])
+        return item
+        
+    def transcode_files(self, item):
+        self.job_state(item.get('job_id'), 'transcoding')
+        tags = None
+        if item.get('kind') == 'album':
+            tags = self.metadata_for(item['job_track'], item['track_num'], item.get('source_name', 'YouTube'))
+        cover_path = item.get('cover_path')
+        # Caratula solo en memoria (no se pudo guardar en disco): FFmpeg no
+        # la ve, asi que la incrusta mutagen
+        cover_in_memory = tags is not None and bool(item.get('cover_art')) and not cover_path
+        
+        outputs = []
+        for src in item.get('files', []):
+            name = os.path.splitext(os.path.basename(src))[0]
+            result = None
+            if item.get('output_format') == 'original':
+                result = self.keep_native(src, tags, cover_path)
+            if result is None:
+                if src.lower().endswith('.mp3') and tags is None:
+                    # Ya es MP3: mover sin recodificar (como hace FFmpegExtractAudio)
+                    result = (src, 'mp3', False)
+                else:
+                    codec_args = ['-c:a', 'copy'] if src.lower().endswith('.mp3') else \
+                        ['-c:a', 'libmp3lame', '-b:a', f"{item['quality']}k"]
+                    work_path, needs_mutagen = self.encode_output(src, 'mp3', codec_args, tags, cover_path)
+                    result = (work_path, 'mp3', needs_mutagen)
+                    
+            work_path, ext, needs_mutagen = result
+            needs_mutagen = needs_mutagen or cover_in_memory
+            if work_path != src:
+                os.remove(src)
+            outputs.append({
+                'work_path': work_path,
+                'dst': os.path.join(item['output_folder'], f"{name}.{ext}"),
+                'needs_mutagen': needs_mutagen,
+            })
+        if not outputs:
+            raise Exception("sin audio descargado")
+        item['outputs'] = outputs
+        return item
+        
+    def publish_file(self, work_path, dst):
+        """Copia al destino con nombre temporal y un unico rename atomico al final"""
+        tmp_path = dst + '.tmp'
+        try:
+            shutil.move(work_path, tmp_path)
+            os.replace(tmp_path, dst)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+                
+    def tag_stage(self, item):
+        """Etapa final: mutagen solo donde FFmpeg no pudo etiquetar, y publicar en destino"""
+        published = []
+        for output in item['outputs']:
+            if output['needs_mutagen']:
+                self.job_state(item.get('job_id'), 'tagging')
+                self.add_metadata(output['work_path'], item['job_track'], item['track_num'], item.get('cover_art'), item.get('source_name', 'YouTube'))
+            self.publish_file(output['work_path'], output['dst'])
+            self.library_file_added(output['dst'])
+            published.append(output['dst'])
+        item['outputs'] = published
+        return item
+        
+    def metadata_for(self, track, track_num, source='YouTube'):
+        # Las descargas en paralelo llevan su propia copia del album
+        album_info = track.get('album_info') or self.current_album_info
+        return {
+            'title': track['title'],
+            'artist': album_info.get('artist', 'Unknown'),
+            'album': album_info.get('album', 'Unknown'),
+            'year': album_info.get('year', ''),
+            'track': str(track_num),
+            'source': source,
+        }
+        
+    def add_metadata(self, filepath, track, track_num, cover_art=None, source='YouTube'):
+        """Escribe etiquetas y caratula con la clase de mutagen del contenedor"""
+        tags = self.metadata_for(track, track_num, source)
+        ext = os.path.splitext(filepath)[1].lower()
+        with self.metrics.stage('tag', source) as stage:
+            try:
+                if ext == '.mp3':
+                    self.tag_mp3(filepath, tags, cover_art)
+                elif ext == '.m4a':
+                    self.tag_mp4(filepath, tags, cover_art)
+                elif ext == '.flac':
+                    self.tag_flac(filepath, tags, cover_art)
+                elif ext in ('.opus', '.ogg'):
+                    self.tag_ogg(filepath, tags, cover_art)
+            except Exception as e:
+                stage['outcome'] = 'error'
+                stage['error'] = str(e)[:200]
+                self.update_status(f"⚠️ Error metadatos: {e}")
             
-            audio.save()
+    def tag_mp3(self, filepath, tags, cover_art=None):
+        audio = MP3(filepath)
+        
+        if audio.tags is None:
+            audio.add_tags()
             
-        except Exception as e:
-            self.update_status(f"⚠️ Error metadatos: {str(e)}")
+        audio.tags['TIT2'] = TIT2(encoding=3, text=tags['title'])
+        audio.tags['TPE1'] = TPE1(encoding=3, text=tags['artist'])
+        audio.tags['TALB'] = TALB(encoding=3, text=tags['album'])
+        audio.tags['TDRC'] = TDRC(encoding=3, text=tags['year'])
+        audio.tags['TRCK'] = TRCK(encoding=3, text=tags['track'])
+        
+        if cover_art:
+            audio.tags['APIC'] = APIC(
+                encoding=3,
+                mime=detect_image_mime(cover_art),
+                type=3,
+                desc='Cover',
+                data=cover_art
+            )
+        
+        audio.tags['TXXX:SOURCE'] = TXXX(encoding=3, desc='SOURCE', text=tags['source'])
+        
+        audio.save()
+        
+    def tag_mp4(self, filepath, tags, cover_art=None):
+        audio = MP4(filepath)
+        if audio.tags is None:
+            audio.add_tags()
             
+        audio.tags['\xa9nam'] = [tags['title']]
+        audio.tags['\xa9ART'] = [tags['artist']]
+        audio.tags['\xa9alb'] = [tags['album']]
+        if tags['year']:
+            audio.tags['\xa9day'] = [tags['year']]
+        audio.tags['trkn'] = [(int(tags['track']), 0)]
+        if cover_art:
+            image_format = MP4Cover.FORMAT_PNG if detect_image_mime(cover_art) == 'image/png' else MP4Cover.FORMAT_JPEG
+            audio.tags['covr'] = [MP4Cover(cover_art, imageformat=image_format)]
+        audio.tags['----:com.apple.iTunes:SOURCE'] = [MP4FreeForm(tags['source'].encode('utf-8'))]
+        
+        audio.save()
+        
+    def vorbis_comments(self, tags):
+        comments = {
+            'title': tags['title'],
+            'artist': tags['artist'],
+            'album': tags['album'],
+            'tracknumber': tags['track'],
+            'source': tags['source'],
+        }
+        if tags['year']:
+            comments['date'] = tags['year']
+        return comments
+        
+    def cover_picture(self, cover_art):
+        picture = Picture()
+        picture.type = 3
+        picture.mime = detect_image_mime(cover_art)
+        picture.desc = 'Cover'
+        picture.data = cover_art
+        return picture
+        
+    def tag_flac(self, filepath, tags, cover_art=None):
+        audio = FLAC(filepath)
+        for key, value in self.vorbis_comments(tags).items():
+            audio[key] = value
+        if cover_art:
+            audio.clear_pictures()
+            audio.add_picture(self.cover_picture(cover_art))
+        audio.save()
+        
+    def tag_ogg(self, filepath, tags, cover_art=None):
+        audio = OggOpus(filepath) if filepath.lower().endswith('.opus') else OggVorbis(filepath)
+        for key, value in self.vorbis_comments(tags).items():
+            audio[key] = value
+        if cover_art:
+            # Ogg no tiene bloque de imagen: la caratula va en base64 como comentario
+            audio['metadata_block_picture'] = base64.b64encode(self.cover_picture(cover_art).write()).decode('ascii')
+        audio.save()
+        
     def download_direct(self):
         links = self.direct_text.get("1.0", "end").strip().split('\n')
         links = [l.strip() for l in links if l.strip()]
@@ -2162,7 +5753,7 @@ class DUKATOR:
             messagebox.showwarning("Aviso", "No hay enlaces")
             return
             
-        threading.Thread(target=self.download_bulk, args=(links,), daemon=True).start()
+        threading.Thread(target=self.download_bulk, args=(links,), name="bulk", daemon=True).start()
         
     def clean_youtube_url(self, url):
         """Limpia URLs de YouTube: extrae solo ?v=VIDEO_ID eliminando list=, start_radio=, pp=, etc."""
@@ -2184,93 +5775,137 @@ class DUKATOR:
             pass
         return url  # Si no es YouTube o no tiene v=, devolver sin tocar
 
-    def download_bulk(self, links):
-        total = len(links)
-        quality = self.quality_var.get()
-        successful = 0
-        failed = 0
-        
-        for idx, link in enumerate(links):
-            # Limpiar URLs de YouTube (eliminar list=, start_radio=, pp=, etc.)
-            link = self.clean_youtube_url(link)
-            source = SourceDetector.detect(link)
-            source_name = SourceDetector.get_display_name(source)
+    def download_bulk(self, links, job_ids=None):
+        metrics_mark = self.metrics.mark()
+        trace = self.tracer.begin('bulk')
+        try:
+            total = len(links)
+            quality = self.quality_var.get()
+            counts = {'successful': 0, 'failed': 0}
+            counts_lock = threading.Lock()
+            finished = threading.Event()
+            hosts = {source_id: host for source_id, _, host in DOWNLOAD_SOURCES}
             
-            self.root.after(0, lambda s=source_name, i=idx, t=total: self.update_status(f"[{s}] Descargando {i+1}/{t}..."))
-            self.root.after(0, lambda i=idx, t=total: self.progress_bar.set(i / t))
+            if job_ids is None:
+                job_ids = [self.journal.add('bulk', {'url': link}) for link in links]
             
-            # Intentar hasta 3 veces
-            success = False
-            for attempt in range(3):
-                try:
-                    output_template = os.path.join(self.download_path, "%(title)s.%(ext)s")
-                    
-                    # Obtener ubicación de ffmpeg
-                    ffmpeg_dir = os.path.dirname(self.ffmpeg_path) if self.ffmpeg_path and os.path.dirname(self.ffmpeg_path) else None
-                    
-                    ydl_opts = {
-                        # Priorizar m4a/webm nativos para evitar re-encode innecesario
-                        'format': 'bestaudio[ext=m4a]/bestaudio[ext=webm]/bestaudio/best',
-                        'outtmpl': output_template,
-                        'quiet': True,
-                        'no_warnings': True,
-                        'noprogress': True,
-                        # FFmpeg location para conversión MP3
-                        'ffmpeg_location': ffmpeg_dir,
-                        # Headers para evitar bloqueos
-                        'http_headers': {
-                            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                            'Accept-Language': 'en-us,en;q=0.5',
-                        },
-                        # Reintentos razonables
-                        'retries': 3,
-                        'fragment_retries': 3,
-                        'skip_unavailable_fragments': True,
-                        # Timeout ajustado
-                        'socket_timeout': 30,
-                        # Descargar fragmentos en paralelo (DASH/HLS mas rapido)
-                        'concurrent_fragment_downloads': 4,
-                        # Detectar throttling y reintentar con otro cliente
-                        'throttledratelimit': 100000,
-                        # Clientes web estables con acceso a todos los formatos de audio
-                        'extractor_args': {
-                            'youtube': {
-                                'player_client': ['web', 'android_vr'],
-                            }
-                        },
-                        # Convertir siempre a MP3
-                        'postprocessors': [{
-                            'key': 'FFmpegExtractAudio',
-                            'preferredcodec': 'mp3',
-                            'preferredquality': quality,
-                        }],
-                        # Mantener mejor calidad de audio
-                        'audio_quality': 0,
-                    }
-                    
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                        ydl.download([link])
-                        
-                    self.root.after(0, lambda s=source_name, i=idx, t=total: self.update_status(f"✓ [{s}] Completado {i+1}/{t}"))
-                    success = True
-                    successful += 1
-                    break
+            # Obtener ubicación de ffmpeg
+            ffmpeg_dir = os.path.dirname(self.ffmpeg_path) if self.ffmpeg_path and os.path.dirname(self.ffmpeg_path) else None
+            
+            def fetch_link(item):
+                # Etapa de red: bajar el original a la cache (hasta 3 intentos)
+                link, job_id = item['url'], item['job_id']
+                source = SourceDetector.detect(link)
+                source_name = SourceDetector.get_display_name(source)
+                item['source_name'] = source_name
+                self.update_status(f"[{source_name}] Descargando {item['index'] + 1}/{total}...")
+                
+                for attempt in range(3):
+                    try:
+                        ydl_opts = {
+                            'format': FETCH_FORMATS[item['output_format']],
+                            'outtmpl': "%(title)s.%(ext)s",
+                            'quiet': True,
+                            'no_warnings': True,
+                            'noprogress': True,
+                            'ffmpeg_location': ffmpeg_dir,
+                            # Headers para evitar bloqueos
+                            'http_headers': {
+                                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                                'Accept-Language': 'en-us,en;q=0.5',
+                            },
+                            # Reintentos razonables
+                            'retries': 3,
+                            'fragment_retries': 3,
+                            'skip_unavailable_fragments': True,
+                            # Timeout ajustado
+                            'socket_timeout': 30,
+                            # Descargar fragmentos en paralelo (DASH/HLS mas rapido)
+                            'concurrent_fragment_downloads': 4,
+                            # Detectar throttling y reintentar con otro cliente
+                            'throttledratelimit': 100000,
+                            # Clientes web estables con acceso a todos los formatos de audio
+                            'extractor_args': {
+                                'youtube': {
+                                    'player_client': ['web', 'android_vr'],
+                                }
+                            },
+                            # Sin postprocesado: la conversion la hace la etapa de FFmpeg
+                        }
                         
-                except Exception as e:
-                    error_msg = str(e)
-                    if attempt < 2:
-                        self.root.after(0, lambda s=source_name, a=attempt: self.update_status(f"[{s}] Reintentando... ({a+2}/3)"))
-                        time.sleep(2 + attempt)  # Espera incremental
+                        self.job_state(job_id, 'downloading')
+                        # Los reintentos continuan el .part del intento anterior
+                        with self.host_limiter.slot(hosts.get(source)):
+                            info = self.ytdlp_download(link, ydl_opts, self.download_path, keep_in_cache=True, label=link)
+                        item['files'] = self.downloaded_files(info)
+                        if not item['files']:
+                            raise Exception("sin audio descargado")
+                        return item
+                            
+                    except Exception as e:
+                        if attempt < 2:
+                            self.update_status(f"[{source_name}] Reintentando... ({attempt + 2}/3)")
+                            with self.tracer.span('retry_wait', 'retry', attempt=attempt, source=source_name):
+                                time.sleep(2 + attempt)  # Espera incremental
+                        else:
+                            raise
+                            
+            def link_done(item, error):
+                source_name = item.get('source_name', '')
+                with counts_lock:
+                    if error is None:
+                        counts['successful'] += 1
                     else:
-                        self.root.after(0, lambda s=source_name, err=error_msg: self.update_status(f"✗ [{s}] Error: {err[:40]}"))
-                        failed += 1
+                        counts['failed'] += 1
+                    done = counts['successful'] + counts['failed']
+                if error is None:
+                    self.job_state(item['job_id'], 'done')
+                    self.update_status(f"✓ [{source_name}] Completado {done}/{total}")
+                else:
+                    self.job_state(item['job_id'], 'failed', error)
+                    self.update_status(f"✗ [{source_name}] Error: {str(error)[:40]}")
+                self.set_progress(done / total)
+                if done >= total:
+                    finished.set()
+                    
+            workers = max(1, min(self.album_workers, total))
+            transcoders = max(1, min(self.transcode_workers, total))
+            pipeline = DownloadPipeline([
+                ('Red', fetch_link, workers, 0),
+                ('FFmpeg', self.transcode_stage, transcoders, transcoders * 2),
+                ('Tags', self.tag_stage, 1, 4),
+            ], on_done=link_done, tracer=self.tracer)
+            
+            for idx, link in enumerate(links):
+                pipeline.submit({
+                    'kind': 'bulk',
+                    'index': idx,
+                    # Limpiar URLs de YouTube (eliminar list=, start_radio=, pp=, etc.)
+                    'url': self.clean_youtube_url(link),
+                    'job_id': job_ids[idx],
+                    'output_folder': self.download_path,
+                    'quality': quality,
+                    'output_format': self.output_format,
+                })
                 
-            self.root.after(0, lambda i=idx, t=total: self.progress_bar.set((i + 1) / t))
+            # Mientras tanto, mostrar el uso de cada etapa en la barra de estado
+            while total and not finished.wait(1.0):
+                with counts_lock:
+                    done = counts['successful'] + counts['failed']
+                self.update_status(f"{done}/{total}  •  {pipeline.describe()}")
+                self.set_progress(self.batch_fraction(done, total))
+            pipeline.close()
 
-        self.root.after(0, lambda: self.update_status(f"Descarga completada: {successful} OK, {failed} errores"))
-        self.root.after(0, lambda: self.progress_bar.set(1))
-        self.root.after(0, lambda s=successful, f=failed: messagebox.showinfo("Info", f"Descarga completada\n\n✓ Exitosas: {s}\n✗ Fallidas: {f}"))
+            successful, failed = counts['successful'], counts['failed']
+            self.journal.compact()
+            self.candidate_cache.flush()
+            self.metrics.report_batch(metrics_mark, f"Lote: {total} enlaces ({successful} OK, {failed} errores)")
+            self.update_status(f"Descarga completada: {successful} OK, {failed} errores")
+            self.set_progress(1)
+            self.ui.call(lambda s=successful, f=failed: messagebox.showinfo("Info", f"Descarga completada\n\n✓ Exitosas: {s}\n✗ Fallidas: {f}"))
+        finally:
+            self.tracer.end(trace)
         
     def sanitize_filename(self, name):
         invalid = '<>:"/\\|?*'
@@ -2279,11 +5914,36 @@ class DUKATOR:
         return name.strip()[:100]
         
     def update_status(self, text):
-        self.status_label.configure(text=text)
-        self.root.update_idletasks()
+        """Seguro desde cualquier hilo: se pinta en el siguiente vaciado del bus"""
+        self.ui.post('status', lambda: self.status_label.configure(text=text))
+        
+    def set_progress(self, value):
+        self.ui.post('progress', lambda: self.progress_bar.set(value))
+        
+    def show_transfers(self):
+        """Pinta bytes/velocidad/ETA en la barra de estado y el overlay (hilo de Tk)"""
+        snap = self.transfers.snapshot()
+        summary = TransferProgress.describe(snap)
+        self.transfer_status_label.configure(text=summary)
+        self.progress_overlay.update_transfers(summary, [TransferProgress.describe_job(job) for job in snap['jobs'][:3]])
+        # Una descarga atascada no dispara hooks: repintar cada segundo mientras haya alguna
+        if snap['jobs'] and not self.transfers_tick:
+            self.transfers_tick = self.root.after(1000, self.tick_transfers)
+            
+    def tick_transfers(self):
+        self.transfers_tick = None
+        self.show_transfers()
+        
+    def batch_fraction(self, done, total):
+        """Avance de un lote contando las pistas a medias por bytes"""
+        return min(1.0, (done + self.transfers.fraction_sum()) / total) if total else 0
         
     def run(self):
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.audio_player.close()
+            self.candidate_cache.flush()
 
 
 if __name__ == "__main__":
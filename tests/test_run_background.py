@@ -0,0 +1,71 @@
+"""run_background: el resultado o el error del hilo llega a su callback por el bus de la UI"""
+
+import os
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dukator  # noqa: E402
+
+
+class QueuedBus:
+    """UIEventBus sin Tk: guarda los callbacks y drain() los ejecuta despues,
+    como el bus real (fuera del bloque donde se crearon)"""
+
+    def __init__(self):
+        self.pending = []
+
+    def post(self, key, fn):
+        self.call(fn)
+
+    def call(self, fn):
+        self.pending.append(fn)
+
+    def drain(self):
+        while self.pending:
+            self.pending.pop(0)()
+
+
+class RunBackgroundTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = dukator.DUKATOR.__new__(dukator.DUKATOR)
+        self.app.ui = QueuedBus()
+        self.app.metadata_pool = ThreadPoolExecutor(max_workers=1)
+        self.app.task_generation = {}
+        self.app.task_futures = {}
+
+    def tearDown(self):
+        self.app.metadata_pool.shutdown(wait=True)
+
+    def run_and_wait(self, work):
+        received = {}
+
+        def on_result(value):
+            received['result'] = value
+
+        def on_error(error):
+            received['error'] = error
+
+        self.app.run_background('test', work, on_result, on_error)
+        # Como en Tk: el bus se vacia cuando la tarea ya ha terminado
+        self.app.task_futures['test'].result(timeout=5)
+        self.app.ui.drain()
+        return received
+
+    def test_result_reaches_on_result(self):
+        self.assertEqual(self.run_and_wait(lambda: 42), {'result': 42})
+
+    def test_error_reaches_on_error(self):
+        def work():
+            raise ConnectionError("MusicBrainz offline")
+
+        received = self.run_and_wait(work)
+        self.assertIsInstance(received.get('error'), ConnectionError)
+        self.assertEqual(str(received['error']), "MusicBrainz offline")
+
+
+if __name__ == '__main__':
+    unittest.main()